@@ -0,0 +1,62 @@
+"""Compare the in-memory footprint of tracked transfers as pydantic models and as StateManager views.
+
+The decoded payloads stay alive during both runs, so hash and path strings are not counted and
+the figures show the per-record overhead each representation adds on top of them.
+
+Usage: python benchmarks/bench_state_memory.py [count]
+"""
+
+import gc
+import hashlib
+import sys
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from transfer.torrent_transfer import TorrentTransfer, TorrentTransferView  # noqa: E402
+
+
+def make_transfer_data(index: int) -> dict:
+    info_hash = hashlib.sha1(f"origin-{index}".encode()).hexdigest()
+    bt_hash = hashlib.sha1(f"bt-{index}".encode()).hexdigest()
+    return {
+        "hash": info_hash,
+        "bt_hash": bt_hash,
+        "origin_torrent_file_path": f"/data/downloads/{info_hash}.torrent",
+        "bt_torrent_file_path": f"/data/bt/[BT].[{bt_hash[:6].upper()}].Some.Release.Name.{index}.torrent",
+        "is_bt_in_seed_box": True,
+        "is_bt_in_home_dl": True,
+        "is_torrent_in_home_dl": index % 10 != 0,
+        # Status values arrive as separate string objects when decoded from JSON.
+        "seedbox_bt_health": "".join(["rea", "dy"]),
+        "seedbox_origin_data_status": "".join(["o", "k"]),
+    }
+
+
+def measure(count: int, build) -> int:
+    payloads = [make_transfer_data(index) for index in range(count)]
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    records = {payload["hash"]: build(payload) for payload in payloads}
+    gc.collect()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del records
+    return after - before
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    pydantic_bytes = measure(count, lambda payload: TorrentTransfer(**payload))
+    view_bytes = measure(count, lambda payload: TorrentTransferView.from_transfer(TorrentTransfer(**payload)))
+
+    print(f"transfers: {count}")
+    print(f"pydantic TorrentTransfer: {pydantic_bytes / count:8.1f} bytes/transfer")
+    print(f"TorrentTransferView:      {view_bytes / count:8.1f} bytes/transfer")
+    print(f"saved:                    {(1 - view_bytes / pydantic_bytes) * 100:8.1f}%")
+
+
+if __name__ == "__main__":
+    main()
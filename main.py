@@ -13,6 +13,8 @@ from managers.local_manager import LocalManager
 from managers.seedbox_manager import SeedBoxManager
 from managers.state_manager import StateManager
 from utils.config import Config, YAMLConfigHandler
+from utils.torrent_utils import TorrentFileCache
+from utils.work_queue import WorkQueue
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
@@ -35,16 +37,30 @@ def wait_for_next_run(interval, shutdown_event, trigger_event=None, poll_interva
 
 
 def run_manager_loop(manager, name, interval, shutdown_event, trigger_event=None):
-    """Run a manager's run method safely in a loop."""
+    """Run a manager's run method safely in a loop.
+
+    A full pass runs every `interval` seconds. In between, hashes queued on a WorkQueue trigger get a
+    targeted pass right away, so each stage only looks at the transfers that an upstream stage changed.
+    """
     logger.info(f"Starting {name} loop with interval {interval}s")
+    changed_hashes = None
+    next_full_run = 0.0
     while not shutdown_event.is_set():
         try:
-            manager.run()
+            if changed_hashes is None:
+                next_full_run = time.monotonic() + interval
+                manager.run()
+            elif changed_hashes:
+                manager.run(changed_hashes=changed_hashes)
         except Exception as e:
             logger.error(f"Error in {name}: {e}")
 
-        if wait_for_next_run(interval, shutdown_event, trigger_event):
+        if wait_for_next_run(max(0.0, next_full_run - time.monotonic()), shutdown_event, trigger_event):
             break
+
+        changed_hashes = trigger_event.drain() if isinstance(trigger_event, WorkQueue) else None
+        if time.monotonic() >= next_full_run:
+            changed_hashes = None
     logger.info(f"{name} loop stopped.")
 
 
@@ -93,14 +109,19 @@ def release_lock(lock_file):
 
 
 def run_once_cycle(local_manager, seedbox_manager, home_manager, shutdown_event=None):
-    """Run a bounded single-process workflow suitable for cron."""
+    """Run a bounded single-process workflow suitable for cron.
+
+    `seedbox_manager` and `home_manager` may also be lists, one manager per seedbox.
+    """
+    seedbox_managers = seedbox_manager if isinstance(seedbox_manager, list) else [seedbox_manager]
+    home_managers = home_manager if isinstance(home_manager, list) else [home_manager]
     cycle = [
         local_manager,
-        seedbox_manager,
+        *seedbox_managers,
         local_manager,
-        seedbox_manager,
-        home_manager,
-        seedbox_manager,
+        *seedbox_managers,
+        *home_managers,
+        *seedbox_managers,
     ]
     for manager in cycle:
         if shutdown_event and shutdown_event.is_set():
@@ -108,9 +129,39 @@ def run_once_cycle(local_manager, seedbox_manager, home_manager, shutdown_event=
         manager.run()
 
 
+def resolve_seed_box_pairs(config, seed_box_name=None, home_dl_name=None):
+    """Return the (seedbox, home downloader) name pairs to run.
+
+    Without `seed_box_name` every configured seedbox runs. A seedbox's own `home_dl_name` takes precedence over
+    the `home_dl_name` given on the command line.
+    """
+    seed_boxes = [seed_box for seed_box in config.seed_box if seed_box_name is None or seed_box.name == seed_box_name]
+    if not seed_boxes:
+        raise ValueError(f"Seedbox config not found: {seed_box_name}")
+
+    pairs = []
+    for seed_box in seed_boxes:
+        paired_home_dl_name = seed_box.home_dl_name or home_dl_name
+        if not paired_home_dl_name:
+            raise ValueError(f"No home downloader configured for seedbox: {seed_box.name}")
+        pairs.append((seed_box.name, paired_home_dl_name))
+    return pairs
+
+
+def watch_finished_seed_boxes(finish_events, shutdown_event, poll_interval=1.0):
+    """Shut down once every seedbox has reported it is finished (transfer.exit_on_finish)."""
+    while not shutdown_event.is_set():
+        if all(finish_event.is_set() for finish_event in finish_events):
+            logger.info("All seedboxes finished. Shutting down...")
+            shutdown_event.set()
+            return
+        shutdown_event.wait(poll_interval)
+
+
 def main(config_path, seed_box_name, home_dl_name, target_download_dir, run_once=False):
     # Load configuration
     config: Config = YAMLConfigHandler.load(config_path)
+    seed_box_pairs = resolve_seed_box_pairs(config, seed_box_name, home_dl_name)
 
     # Validate and create directories
     ensure_directory_exists(config.transfer.original_torrent_path)
@@ -122,6 +173,9 @@ def main(config_path, seed_box_name, home_dl_name, target_download_dir, run_once
         ensure_directory_exists(str(torrent_info_path.parent))
 
     lock_file = None
+    state_manager = None
+    local_manager = None
+    seedbox_managers = []
     if run_once:
         lock_path = f"{config.transfer.torrent_info_path}.lock"
         lock_file = try_acquire_lock(lock_path)
@@ -131,79 +185,100 @@ def main(config_path, seed_box_name, home_dl_name, target_download_dir, run_once
 
     try:
         # Initialize State Manager after lock acquisition, so run_once never loads stale state.
-        state_manager = StateManager(config.transfer.torrent_info_path)
+        # Every seedbox shares this one in-memory state and its state file.
+        state_manager = StateManager(
+            config.transfer.torrent_info_path,
+            flush_interval=config.transfer.state_flush_interval,
+            backend=config.transfer.state_backend,
+            shard_by=config.transfer.state_shard_by,
+            # Every configured seedbox's shard is read, so processes running other seedboxes stay visible
+            shard_names=[seed_box.name for seed_box in config.seed_box],
+        )
 
         shutdown_event = threading.Event()
+        multiple_seed_boxes = len(seed_box_pairs) > 1
 
-        # Trigger events for cross-thread communication
-        trigger_local = threading.Event()
-        trigger_seedbox = threading.Event()
-        trigger_home = threading.Event()
+        # Work queues between pipeline stages: each stage hands the hashes it changed to the next one.
+        # Seedbox and home stages get one queue per seedbox; LocalManager fans its hashes out to all of them.
+        trigger_local = WorkQueue()
+        seedbox_triggers = [WorkQueue() for _ in seed_box_pairs]
+        home_triggers = [WorkQueue() for _ in seed_box_pairs]
+
+        # Origin torrents parsed while downloading them from the seedbox, handed to LocalManager
+        torrent_cache = TorrentFileCache()
 
         # Initialize Business Logic Managers
         local_manager = LocalManager(
             config,
             state_manager,
-            trigger_seedbox=trigger_seedbox,
-            trigger_home=trigger_home,
-        )
-        seedbox_manager = SeedBoxManager(
-            config,
-            state_manager,
-            seed_box_name,
-            home_dl_name,
-            shutdown_event,
+            trigger_seedbox=seedbox_triggers,
+            trigger_home=home_triggers,
+            torrent_cache=torrent_cache,
             trigger_local=trigger_local,
-            trigger_home=trigger_home,
-            async_downloads=not run_once,
-        )
-        home_manager = HomeManager(
-            config,
-            state_manager,
-            seed_box_name,
-            home_dl_name,
-            target_download_dir,
-            trigger_seedbox=trigger_seedbox,
         )
+        home_managers = []
+        finish_events = []
+        for (pair_seed_box_name, pair_home_dl_name), trigger_seedbox, trigger_home in zip(
+            seed_box_pairs, seedbox_triggers, home_triggers
+        ):
+            # With several seedboxes, exit_on_finish only stops the process once all of them are finished
+            finish_event = threading.Event() if multiple_seed_boxes else shutdown_event
+            finish_events.append(finish_event)
+            seedbox_managers.append(
+                SeedBoxManager(
+                    config,
+                    state_manager,
+                    pair_seed_box_name,
+                    pair_home_dl_name,
+                    finish_event,
+                    trigger_local=trigger_local,
+                    trigger_home=trigger_home,
+                    async_downloads=not run_once,
+                    trigger_seedbox=None if run_once else trigger_seedbox,
+                    torrent_cache=torrent_cache,
+                )
+            )
+            home_managers.append(
+                HomeManager(
+                    config,
+                    state_manager,
+                    pair_seed_box_name,
+                    pair_home_dl_name,
+                    target_download_dir,
+                    trigger_seedbox=trigger_seedbox,
+                )
+            )
 
         logger.info("Starting Seedbox Transfer Helper...")
-        logger.info(f"Seedbox: {seed_box_name}")
-        logger.info(f"Home Downloader: {home_dl_name}")
+        for pair_seed_box_name, pair_home_dl_name in seed_box_pairs:
+            logger.info(f"Seedbox: {pair_seed_box_name}")
+            logger.info(f"Home Downloader: {pair_home_dl_name}")
 
         if run_once:
             logger.info("Run-once mode enabled. Processing one bounded cycle and exiting.")
-            run_once_cycle(local_manager, seedbox_manager, home_manager, shutdown_event=shutdown_event)
+            run_once_cycle(local_manager, seedbox_managers, home_managers, shutdown_event=shutdown_event)
             return
 
-        with ThreadPoolExecutor(max_workers=3) as executor:
-            # Submit tasks with independent intervals
-            # Local manager
-            executor.submit(
-                run_manager_loop,
-                local_manager,
-                "LocalManager",
-                config.transfer.local_interval,
-                shutdown_event,
-                trigger_local,
-            )
-            # Seedbox manager (Remote interactions)
-            executor.submit(
-                run_manager_loop,
-                seedbox_manager,
-                "SeedBoxManager",
-                config.transfer.seedbox_interval,
-                shutdown_event,
-                trigger_seedbox,
-            )
-            # Home manager
-            executor.submit(
-                run_manager_loop,
-                home_manager,
-                "HomeManager",
-                config.transfer.home_interval,
-                shutdown_event,
-                trigger_home,
+        local_manager.start_watching()
+        manager_specs = [(local_manager, "LocalManager", config.transfer.local_interval, trigger_local)]
+        for (pair_seed_box_name, _), seedbox_manager, home_manager, trigger_seedbox, trigger_home in zip(
+            seed_box_pairs, seedbox_managers, home_managers, seedbox_triggers, home_triggers
+        ):
+            suffix = f"[{pair_seed_box_name}]" if multiple_seed_boxes else ""
+            manager_specs.append(
+                (seedbox_manager, f"SeedBoxManager{suffix}", config.transfer.seedbox_interval, trigger_seedbox)
             )
+            manager_specs.append((home_manager, f"HomeManager{suffix}", config.transfer.home_interval, trigger_home))
+
+        if multiple_seed_boxes:
+            threading.Thread(
+                target=watch_finished_seed_boxes, args=(finish_events, shutdown_event), daemon=True
+            ).start()
+
+        with ThreadPoolExecutor(max_workers=len(manager_specs)) as executor:
+            # Submit tasks with independent intervals
+            for manager, name, interval, trigger_event in manager_specs:
+                executor.submit(run_manager_loop, manager, name, interval, shutdown_event, trigger_event)
 
             try:
                 while not shutdown_event.is_set():
@@ -212,14 +287,22 @@ def main(config_path, seed_box_name, home_dl_name, target_download_dir, run_once
                 logger.info("Shutdown signal received (Ctrl+C). Stopping threads...")
                 shutdown_event.set()
     finally:
+        if local_manager is not None:
+            local_manager.close()
+        for seedbox_manager in seedbox_managers:
+            seedbox_manager.close()
+        if state_manager is not None:
+            state_manager.flush()
         release_lock(lock_file)
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--config_path", type=str, default="config.yaml", help="配置文件路径")
-    parser.add_argument("--seed_box_name", type=str, required=True, help="种子盒子名称")
-    parser.add_argument("--home_dl_name", type=str, required=True, help="目标的家宽下载器名称")
+    parser.add_argument("--seed_box_name", type=str, help="种子盒子名称，不指定时同时运行配置中的所有盒子")
+    parser.add_argument(
+        "--home_dl_name", type=str, help="目标的家宽下载器名称，盒子配置了 home_dl_name 时以盒子配置为准"
+    )
     parser.add_argument("--target_download_dir", type=str, help="目标下载目录")
     parser.add_argument(
         "--run_once",
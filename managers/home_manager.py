@@ -14,10 +14,12 @@ from transfer.torrent_transfer import (
     ORIGIN_DATA_STATUS_WAITING_FOR_REDOWNLOAD,
     SEEDBOX_BT_HEALTH_MISSING_FILES,
     SEEDBOX_BT_HEALTH_MISSING_TORRENT,
+    is_owned_by,
 )
 from utils.config import Config, SeedBox, SeedboxOriginDataMissingPolicy
 from utils.downloader_utils import DownloaderHelper, get_downloader_client
-from utils.qbittorrent_snapshot import QbittorrentSnapshot
+from utils.qbittorrent_snapshot import QbittorrentSnapshot, get_shared_snapshot
+from utils.work_queue import notify
 
 logger = logging.getLogger(__name__)
 
@@ -45,7 +47,7 @@ class HomeManager:
             username=self.home_dl_config.username,
             password=self.home_dl_config.password,
         )
-        self.home_snapshot = QbittorrentSnapshot(self.home_helper.client)
+        self.home_snapshot = get_shared_snapshot(self.home_helper.client)
 
     def _init_configs(self):
         """Initialize configurations."""
@@ -152,14 +154,15 @@ class HomeManager:
         self.state_manager.update(state)
         return True
 
-    def run(self):
-        """Run home management tasks."""
+    def run(self, changed_hashes=None):
+        """Run home management tasks. With `changed_hashes`, only those transfers are checked."""
         try:
-            self._process_home_torrents()
+            with self.state_manager.batch():
+                self._process_home_torrents(changed_hashes)
         except Exception as e:
             logger.error(f"Error in HomeManager: {e}")
 
-    def _process_home_torrents(self):
+    def _process_home_torrents(self, changed_hashes=None):
         home_dl: Client = self.home_helper.client
         self.home_snapshot.refresh()
 
@@ -174,14 +177,29 @@ class HomeManager:
         add_torrent_count = 0
         max_once_add = self.config.transfer.max_once_add
 
-        all_transfers = self.state_manager.get_all()
-
-        for info_hash, state in all_transfers.items():
+        # Read-only views; each scenario takes a mutable copy only when it may change the transfer.
+        sole_seed_box = len(self.config.seed_box) == 1
+        if changed_hashes is None:
+            active_transfers = self.state_manager.query_views(is_skipped=False)
+        else:
+            active_transfers = {}
+            for info_hash in changed_hashes:
+                state = self.state_manager.get_view(info_hash)
+                if state is not None and not state.is_skipped:
+                    active_transfers[info_hash] = state
+        # Transfers of other seedboxes are handled by their own HomeManager, which adds them with their peers
+        active_transfers = {
+            info_hash: state
+            for info_hash, state in active_transfers.items()
+            if is_owned_by(state, self.seed_box_name, sole_seed_box)
+        }
+
+        for info_hash, state in active_transfers.items():
             try:
                 if add_torrent_count >= max_once_add:
                     break
 
-                if state.is_skipped or not state.has_bt_torrent():
+                if not state.has_bt_torrent():
                     continue
 
                 # Scenario 1: Add BT torrent to home if it's on seedbox but not at home
@@ -191,6 +209,7 @@ class HomeManager:
                     and not state.is_bt_in_home_dl
                     and not state.is_torrent_in_home_dl
                 ):
+                    state = state.mutable()
                     if not os.path.exists(state.bt_torrent_file_path):
                         self._record_home_failure(
                             state,
@@ -224,6 +243,7 @@ class HomeManager:
                     and state.hash not in home_dl_hashes
                     and not state.is_torrent_in_home_dl
                 ):
+                    state = state.mutable()
                     bt_torrent = self.home_snapshot.torrent(state.bt_hash)
                     if bt_torrent is not None:
                         self._start_home_bt_if_needed(home_dl, bt_torrent)
@@ -267,6 +287,7 @@ class HomeManager:
                 # Scenario 3: Origin is at home (Temporary),
                 # BT is also at home -> verify Origin completed, then delete BT
                 if state.hash in home_dl_hashes and state.bt_hash in home_dl_hashes:
+                    state = state.mutable()
                     if not self._is_torrent_completed(home_dl, state.hash, self.home_snapshot):
                         self._request_origin_recheck_if_needed(
                             home_dl,
@@ -290,9 +311,8 @@ class HomeManager:
                     state.reset_failures("home_add_retry_count")
                     self.state_manager.update(state)
 
-                    # Trigger SeedBoxManager so it can delete the seedbox copy immediately
-                    if self.trigger_seedbox:
-                        self.trigger_seedbox.set()
+                    # Hand the transfer to SeedBoxManager so it can delete the seedbox copy immediately
+                    notify(self.trigger_seedbox, [state.hash])
                     continue
 
                 # Scenario 4: Origin at home, BT not at home
@@ -304,14 +324,14 @@ class HomeManager:
                     # Only mark as synced after Origin is fully downloaded
                     # Note: Origin is a PT torrent, do not add peers or modify category
                     if self._is_torrent_completed(home_dl, state.hash, self.home_snapshot):
+                        state = state.mutable()
                         state.is_torrent_in_home_dl = True
                         state.home_origin_recheck_count = 0
                         state.reset_failures("home_add_retry_count")
                         self.state_manager.update(state)
 
-                        # Trigger SeedBoxManager so it can delete the seedbox copy immediately
-                        if self.trigger_seedbox:
-                            self.trigger_seedbox.set()
+                        # Hand the transfer to SeedBoxManager so it can delete the seedbox copy immediately
+                        notify(self.trigger_seedbox, [state.hash])
                     continue
 
                 if (
@@ -320,13 +340,14 @@ class HomeManager:
                     and not state.is_torrent_in_home_dl
                 ):
                     logger.warning(f"Home BT torrent missing, resetting state so it can be re-added: {state.bt_hash}")
+                    state = state.mutable()
                     state.is_bt_in_home_dl = False
                     self.state_manager.update(state)
                     continue
             except Exception as e:
                 if not state.is_torrent_in_home_dl:
                     self._record_home_failure(
-                        state,
+                        state.mutable(),
                         f"Error processing torrent {info_hash} in HomeManager: {e}",
                         "Repeated errors while processing home downloader transfer",
                     )
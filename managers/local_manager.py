@@ -1,17 +1,71 @@
 from __future__ import annotations
 
+import itertools
 import logging
+import multiprocessing
 import os
 import shutil
+import tempfile
+import time
+from concurrent.futures import BrokenExecutor, ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
 
 from managers.state_manager import StateManager
 from transfer.torrent_transfer import TorrentTransfer
 from utils.config import Config
-from utils.torrent_utils import TorrentFile, TorrentTrailingDataError, export_as_torrent
+from utils.inotify_watcher import InotifyWatcher
+from utils.torrent_utils import TorrentFile, TorrentFileCache, TorrentTrailingDataError, export_as_torrent
+from utils.work_queue import notify
 
 logger = logging.getLogger(__name__)
 
 
+def export_bt_torrent(torrent_file_info: TorrentFile, bt_path: str, bt_trackers: list[str]) -> tuple[str, str]:
+    """Export the BT torrent for an origin torrent into `bt_path`. Returns its path and info hash."""
+    # Saved straight into bt_path: a file name in the working directory would be shared by every scan worker
+    result, bt_file_name, bt_torrent_file = export_as_torrent(torrent_file_info.torrent_data, bt_trackers, path=bt_path)
+
+    if not result:
+        raise RuntimeError(f"Failed to export BT torrent: {torrent_file_info.file_path}")
+
+    return os.path.join(bt_path, bt_file_name), bt_torrent_file.info_hash
+
+
+@dataclass
+class ScanResult:
+    """Outcome of parsing and exporting one origin torrent in a scan worker; only plain values cross processes."""
+
+    torrent_file_path: str
+    info_hash: str = ""
+    bt_hash: str = ""
+    bt_file_path: str = ""
+    error: str = ""
+    trailing_size: int = 0
+
+
+def _scan_worker(torrent_file_path: str, bt_path: str, bt_trackers: list[str], export: bool) -> ScanResult:
+    """Parse an origin torrent and, with `export`, export its BT torrent in the same task.
+
+    The BT torrent is staged in a private directory under `bt_path`, so copies of the same origin torrent exported
+    by different workers never write the same file. The manager moves the file it keeps into `bt_path`.
+    """
+    try:
+        torrent_file_info = TorrentFile(torrent_file_path)
+        if not export:
+            return ScanResult(torrent_file_path, info_hash=torrent_file_info.info_hash)
+        staging_path = tempfile.mkdtemp(prefix=".scan-", dir=bt_path)
+        try:
+            bt_file_path, bt_hash = export_bt_torrent(torrent_file_info, staging_path, bt_trackers)
+        except Exception:
+            shutil.rmtree(staging_path, ignore_errors=True)
+            raise
+        return ScanResult(torrent_file_path, torrent_file_info.info_hash, bt_hash, bt_file_path)
+    except TorrentTrailingDataError as e:
+        return ScanResult(torrent_file_path, error=str(e), trailing_size=e.trailing_size)
+    except Exception as e:
+        return ScanResult(torrent_file_path, error=str(e))
+
+
 class LocalManager:
     def __init__(
         self,
@@ -19,6 +73,8 @@ class LocalManager:
         state_manager: StateManager,
         trigger_seedbox=None,
         trigger_home=None,
+        torrent_cache: TorrentFileCache | None = None,
+        trigger_local=None,
     ):
         self.config = config
         self.state_manager = state_manager
@@ -27,17 +83,92 @@ class LocalManager:
         self._torrent_file_cache: dict[str, tuple[int, int, str]] = {}
         self.trigger_seedbox = trigger_seedbox
         self.trigger_home = trigger_home
+        # Torrents SeedBoxManager already parsed while downloading them
+        self.torrent_cache = torrent_cache if torrent_cache is not None else TorrentFileCache()
+        # Worker processes for bulk scans; 1 keeps scanning on the manager thread
+        self.scan_workers = max(1, config.transfer.local_scan_workers)
+        self.scan_batch_size = max(1, config.transfer.local_scan_batch_size)
+        # Started on the first bulk scan and kept until close(), so spawned workers are not recreated every pass
+        self._scan_pool = None
+        # Woken up by the inotify watcher, if one is running (transfer.local_watch)
+        self.trigger_local = trigger_local
+        self.watcher: InotifyWatcher | None = None
+        self._next_rescan = 0.0
+
+    def start_watching(self):
+        """Watch original_torrent_path with inotify, so passes only look at changed files.
+
+        Falls back to polling scans when inotify is unavailable.
+        """
+        if not self.config.transfer.local_watch or self.watcher is not None:
+            return
+        watcher = InotifyWatcher(self.config.transfer.original_torrent_path, on_change=self._on_watched_change)
+        if watcher.start():
+            self.watcher = watcher
+
+    def close(self):
+        if self.watcher is not None:
+            self.watcher.close()
+            self.watcher = None
+        if self._scan_pool is not None:
+            self._scan_pool.shutdown(wait=True, cancel_futures=True)
+            self._scan_pool = None
+
+    def _on_watched_change(self):
+        if self.trigger_local is not None:
+            self.trigger_local.set()
 
-    def run(self):
-        """Run local management tasks."""
+    def run(self, changed_hashes=None):
+        """Run local management tasks.
+
+        With `changed_hashes`, only the origin torrents the seedbox just downloaded for those hashes are converted.
+        While watching, a pass only handles the files the watcher saw change, with a full scan every
+        `local_rescan_interval` seconds as a safety net.
+        """
         try:
-            self._scan_and_convert()
-            self._cleanup_deleted_torrents()
+            if changed_hashes is not None:
+                with self.state_manager.batch():
+                    self._convert_downloaded_torrents(changed_hashes)
+                return
+
+            torrent_file_paths, removed_paths = self._watched_changes()
+            if torrent_file_paths is None:
+                torrent_file_paths = self._walk_torrent_files()
+            if self.scan_workers > 1:
+                # Parallel scans commit their results in chunks, outside the batch that spans the pass
+                self._scan_and_convert_parallel(torrent_file_paths)
+            with self.state_manager.batch():
+                if self.scan_workers == 1:
+                    self._scan_and_convert(torrent_file_paths)
+                self._cleanup_deleted_torrents(removed_paths)
         except Exception as e:
             logger.error(f"Error in LocalManager: {e}")
 
-    def _scan_and_convert(self):
-        """Scan original torrents and convert to BT."""
+    def _watched_changes(self):
+        """Return the changed torrent files that still exist and the removed ones, or (None, None) for a full scan."""
+        if self.watcher is None:
+            return None, None
+        if not self.watcher.is_running():
+            logger.warning("inotify watcher stopped, falling back to polling scans")
+            self.close()
+            return None, None
+
+        changed_paths, rescan_needed = self.watcher.drain()
+        if rescan_needed or time.monotonic() >= self._next_rescan:
+            # Events drained above are covered by the full scan
+            self._next_rescan = time.monotonic() + self.config.transfer.local_rescan_interval
+            return None, None
+
+        existing_paths = [torrent_file_path for torrent_file_path in changed_paths if os.path.exists(torrent_file_path)]
+        removed_paths = changed_paths.difference(existing_paths)
+        for torrent_file_path in removed_paths:
+            self._torrent_file_cache.pop(torrent_file_path, None)
+        if changed_paths:
+            logger.debug(f"Watcher reported {len(existing_paths)} changed and {len(removed_paths)} removed torrents")
+        return sorted(existing_paths), removed_paths
+
+    def _walk_torrent_files(self):
+        """Yield origin torrent paths and forget cached entries of files that are gone."""
         original_torrent_path = self.config.transfer.original_torrent_path
         logger.debug(f"Scanning {original_torrent_path} for torrents")
         seen_files = set()
@@ -47,52 +178,7 @@ class LocalManager:
                 if file.endswith(".torrent"):
                     torrent_file_path = os.path.join(root, file)
                     seen_files.add(torrent_file_path)
-
-                    if self.failed_counts.get(torrent_file_path, 0) >= 3:
-                        continue
-
-                    try:
-                        file_stat = os.stat(torrent_file_path)
-                        cached_entry = self._torrent_file_cache.get(torrent_file_path)
-                        if cached_entry and cached_entry[0] == file_stat.st_mtime_ns and cached_entry[1] == file_stat.st_size:
-                            cached_state = self.state_manager.get(cached_entry[2])
-                            if cached_state and (cached_state.is_skipped or cached_state.has_bt_torrent()):
-                                continue
-
-                        torrent_file_info = TorrentFile(str(torrent_file_path))
-                        self._torrent_file_cache[torrent_file_path] = (
-                            file_stat.st_mtime_ns,
-                            file_stat.st_size,
-                            torrent_file_info.info_hash,
-                        )
-
-                        # Check if already processed
-                        state = self.state_manager.get(torrent_file_info.info_hash)
-                        if state and (state.is_skipped or state.has_bt_torrent()):
-                            if torrent_file_path in self.failed_counts:
-                                del self.failed_counts[torrent_file_path]
-                            continue
-
-                        # Convert to BT
-                        self._convert_to_bt(torrent_file_info, state)
-                        if torrent_file_path in self.failed_counts:
-                            del self.failed_counts[torrent_file_path]
-
-                    except TorrentTrailingDataError as e:
-                        self.failed_counts[torrent_file_path] = self.failed_counts.get(torrent_file_path, 0) + 1
-                        logger.error(
-                            "Failed to process torrent %s: local file has %s bytes of trailing data after a valid "
-                            "bencode prefix. Re-download this origin torrent from seedbox.",
-                            torrent_file_path,
-                            e.trailing_size,
-                        )
-                        if self.failed_counts[torrent_file_path] >= 3:
-                            logger.warning(f"Skipping torrent {torrent_file_path} after 3 failed attempts.")
-                    except Exception as e:
-                        self.failed_counts[torrent_file_path] = self.failed_counts.get(torrent_file_path, 0) + 1
-                        logger.error(f"Failed to process torrent {torrent_file_path}: {e}")
-                        if self.failed_counts[torrent_file_path] >= 3:
-                            logger.warning(f"Skipping torrent {torrent_file_path} after 3 failed attempts.")
+                    yield torrent_file_path
 
         if self._torrent_file_cache:
             self._torrent_file_cache = {
@@ -101,26 +187,216 @@ class LocalManager:
                 if torrent_file_path in seen_files
             }
 
-    def _convert_to_bt(self, torrent_file_info: TorrentFile, existing_transfer: TorrentTransfer | None = None):
-        """Convert a single torrent to BT format."""
-        result, temp_bt_file_name, bt_torrent_file = export_as_torrent(
-            torrent_file_info.torrent_data, self.config.transfer.bt_trackers
+    def _scan_and_convert(self, torrent_file_paths):
+        """Convert scanned original torrents to BT."""
+        for torrent_file_path in torrent_file_paths:
+            self._process_torrent_file(torrent_file_path)
+
+    def _scan_and_convert_parallel(self, torrent_file_paths):
+        """Scan original torrents, parsing and exporting new ones across worker processes.
+
+        Results are committed to the state in batches of `scan_batch_size`, so a bulk import makes progress
+        visible (and survives a restart) long before the whole scan is done.
+        """
+        candidates = {}
+        sequential = []
+        for torrent_file_path in torrent_file_paths:
+            if self.failed_counts.get(torrent_file_path, 0) >= 3:
+                continue
+            try:
+                file_stat = os.stat(torrent_file_path)
+            except OSError as e:
+                logger.error(f"Failed to process torrent {torrent_file_path}: {e}")
+                continue
+            if self._is_unchanged_and_done(torrent_file_path, file_stat):
+                continue
+            if self.torrent_cache.get(torrent_file_path) is not None:
+                sequential.append(torrent_file_path)
+            else:
+                candidates[torrent_file_path] = file_stat
+
+        # Starting worker processes only pays off for more files than there are workers
+        if len(candidates) < self.scan_workers:
+            sequential.extend(candidates)
+            candidates = {}
+        if sequential:
+            with self.state_manager.batch():
+                for torrent_file_path in sequential:
+                    self._process_torrent_file(torrent_file_path)
+        if not candidates:
+            return
+
+        # Files that are the origin of an already converted transfer are only parsed, to refresh the file cache
+        done_paths = {
+            view.origin_torrent_file_path
+            for view in self.state_manager.get_all_views().values()
+            if view.is_skipped or view.has_bt_torrent()
+        }
+        logger.info(f"Converting {len(candidates)} torrents with {self.scan_workers} worker processes")
+        try:
+            pool = self._get_scan_pool()
+            futures = [
+                pool.submit(
+                    _scan_worker,
+                    torrent_file_path,
+                    self.bt_path,
+                    self.config.transfer.bt_trackers,
+                    torrent_file_path not in done_paths,
+                )
+                for torrent_file_path in candidates
+            ]
+            for results in self._chunked_results(futures):
+                with self.state_manager.batch():
+                    for result in results:
+                        self._apply_scan_result(result, candidates[result.torrent_file_path])
+        except BrokenExecutor as e:
+            # A worker died; the next bulk scan starts a fresh pool
+            logger.error(f"Scan worker pool failed: {e}")
+            self._scan_pool = None
+
+    def _chunked_results(self, futures):
+        """Yield the results of `futures` as they complete, in lists of up to `scan_batch_size`."""
+        completed = as_completed(futures)
+        while chunk := [future.result() for future in itertools.islice(completed, self.scan_batch_size)]:
+            yield chunk
+
+    def _get_scan_pool(self):
+        if self._scan_pool is None:
+            self._scan_pool = self._create_scan_pool()
+        return self._scan_pool
+
+    def _create_scan_pool(self):
+        # Spawned rather than forked workers: the daemon is multi-threaded, and a fork could copy locks
+        # held by other threads.
+        return ProcessPoolExecutor(
+            max_workers=self.scan_workers,
+            mp_context=multiprocessing.get_context("spawn"),
         )
 
-        if not result:
-            raise RuntimeError(f"Failed to export BT torrent: {torrent_file_info.file_path}")
+    def _apply_scan_result(self, result: ScanResult, file_stat: os.stat_result):
+        torrent_file_path = result.torrent_file_path
+        if result.error:
+            self._record_scan_failure(torrent_file_path, result.error, result.trailing_size)
+            return
+
+        self._torrent_file_cache[torrent_file_path] = (file_stat.st_mtime_ns, file_stat.st_size, result.info_hash)
+        self.failed_counts.pop(torrent_file_path, None)
+        state = self.state_manager.get_view(result.info_hash)
+        if state and (state.is_skipped or state.has_bt_torrent()):
+            # Converted already, or by a copy of the same origin torrent earlier in this scan
+            self._discard_staged_export(result.bt_file_path)
+            return
+        if not result.bt_hash:
+            # Only parsed because its path belonged to a converted transfer, but the file now holds another torrent
+            self._process_torrent_file(torrent_file_path)
+            return
 
-        bt_file_path = os.path.join(self.bt_path, temp_bt_file_name)
-        shutil.move(temp_bt_file_name, bt_file_path)
+        try:
+            bt_file_path = os.path.join(self.bt_path, os.path.basename(result.bt_file_path))
+            shutil.move(result.bt_file_path, bt_file_path)
+        except OSError as e:
+            self._record_scan_failure(torrent_file_path, str(e))
+            return
+        finally:
+            self._discard_staged_export(result.bt_file_path)
+        logger.info(f"Exported BT torrent: {bt_file_path}, hash: {result.bt_hash}")
+        self._record_conversion(
+            result.info_hash, torrent_file_path, result.bt_hash, bt_file_path, state.mutable() if state else None
+        )
+
+    @staticmethod
+    def _discard_staged_export(staged_file_path: str):
+        """Remove a scan worker's staging directory, along with the BT torrent in it unless it was moved out."""
+        if staged_file_path:
+            shutil.rmtree(os.path.dirname(staged_file_path), ignore_errors=True)
+
+    def _is_unchanged_and_done(self, torrent_file_path: str, file_stat: os.stat_result) -> bool:
+        """Whether the file is unchanged since it was last parsed and its transfer needs no conversion."""
+        cached_entry = self._torrent_file_cache.get(torrent_file_path)
+        if cached_entry and cached_entry[0] == file_stat.st_mtime_ns and cached_entry[1] == file_stat.st_size:
+            cached_state = self.state_manager.get_view(cached_entry[2])
+            if cached_state and (cached_state.is_skipped or cached_state.has_bt_torrent()):
+                return True
+        return False
+
+    def _record_scan_failure(self, torrent_file_path: str, error: str, trailing_size: int = 0):
+        self.failed_counts[torrent_file_path] = self.failed_counts.get(torrent_file_path, 0) + 1
+        if trailing_size:
+            logger.error(
+                "Failed to process torrent %s: local file has %s bytes of trailing data after a valid "
+                "bencode prefix. Re-download this origin torrent from seedbox.",
+                torrent_file_path,
+                trailing_size,
+            )
+        else:
+            logger.error(f"Failed to process torrent {torrent_file_path}: {error}")
+        if self.failed_counts[torrent_file_path] >= 3:
+            logger.warning(f"Skipping torrent {torrent_file_path} after 3 failed attempts.")
+
+    def _convert_downloaded_torrents(self, changed_hashes):
+        """Convert the origin torrents SeedBoxManager saved as `<hash>.torrent`."""
+        for info_hash in changed_hashes:
+            torrent_file_path = os.path.join(self.config.transfer.original_torrent_path, f"{info_hash}.torrent")
+            if os.path.exists(torrent_file_path):
+                self._process_torrent_file(torrent_file_path)
+
+    def _process_torrent_file(self, torrent_file_path: str):
+        if self.failed_counts.get(torrent_file_path, 0) >= 3:
+            return
+
+        try:
+            file_stat = os.stat(torrent_file_path)
+            if self._is_unchanged_and_done(torrent_file_path, file_stat):
+                return
 
-        logger.info(f"Exported BT torrent: {bt_file_path}, hash: {bt_torrent_file.info_hash}")
+            torrent_file_info = self.torrent_cache.pop(torrent_file_path) or TorrentFile(str(torrent_file_path))
+            self._torrent_file_cache[torrent_file_path] = (
+                file_stat.st_mtime_ns,
+                file_stat.st_size,
+                torrent_file_info.info_hash,
+            )
 
+            # Check if already processed
+            state = self.state_manager.get_view(torrent_file_info.info_hash)
+            if state and (state.is_skipped or state.has_bt_torrent()):
+                if torrent_file_path in self.failed_counts:
+                    del self.failed_counts[torrent_file_path]
+                return
+
+            # Convert to BT
+            self._convert_to_bt(torrent_file_info, state.mutable() if state else None)
+            if torrent_file_path in self.failed_counts:
+                del self.failed_counts[torrent_file_path]
+
+        except TorrentTrailingDataError as e:
+            self._record_scan_failure(torrent_file_path, str(e), e.trailing_size)
+        except Exception as e:
+            self._record_scan_failure(torrent_file_path, str(e))
+
+    def _convert_to_bt(self, torrent_file_info: TorrentFile, existing_transfer: TorrentTransfer | None = None):
+        """Convert a single torrent to BT format."""
+        bt_file_path, bt_hash = export_bt_torrent(torrent_file_info, self.bt_path, self.config.transfer.bt_trackers)
+
+        logger.info(f"Exported BT torrent: {bt_file_path}, hash: {bt_hash}")
+
+        self._record_conversion(
+            torrent_file_info.info_hash, torrent_file_info.file_path, bt_hash, bt_file_path, existing_transfer
+        )
+
+    def _record_conversion(
+        self,
+        info_hash: str,
+        origin_torrent_file_path: str,
+        bt_hash: str,
+        bt_file_path: str,
+        existing_transfer: TorrentTransfer | None = None,
+    ):
         transfer = existing_transfer or TorrentTransfer(
-            hash=torrent_file_info.info_hash,
-            origin_torrent_file_path=torrent_file_info.file_path,
+            hash=info_hash,
+            origin_torrent_file_path=origin_torrent_file_path,
         )
-        transfer.origin_torrent_file_path = torrent_file_info.file_path
-        transfer.bt_hash = bt_torrent_file.info_hash
+        transfer.origin_torrent_file_path = origin_torrent_file_path
+        transfer.bt_hash = bt_hash
         transfer.bt_torrent_file_path = bt_file_path
         transfer.reset_failures(
             "download_retry_count",
@@ -130,16 +406,21 @@ class LocalManager:
         )
         self.state_manager.update(transfer)
 
-        # Trigger other managers to start working on this new BT torrent
-        if self.trigger_seedbox:
-            self.trigger_seedbox.set()
-        if self.trigger_home:
-            self.trigger_home.set()
+        # Hand the new BT torrent to the other managers
+        notify(self.trigger_seedbox, [transfer.hash])
+        notify(self.trigger_home, [transfer.hash])
+
+    def _cleanup_deleted_torrents(self, removed_paths=None):
+        """Remove entries from state if original file no longer exists.
 
-    def _cleanup_deleted_torrents(self):
-        """Remove entries from state if original file no longer exists."""
-        all_transfers = self.state_manager.get_all()
+        With `removed_paths`, only the transfers of those files are checked.
+        """
+        if removed_paths is not None and not removed_paths:
+            return
+        all_transfers = self.state_manager.get_all_views()
         for info_hash, transfer in all_transfers.items():
+            if removed_paths is not None and transfer.origin_torrent_file_path not in removed_paths:
+                continue
             if os.path.exists(transfer.origin_torrent_file_path):
                 continue
 
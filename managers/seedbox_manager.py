@@ -1,13 +1,16 @@
 from __future__ import annotations
 
+import heapq
+import itertools
 import logging
 import os
 import re
 import threading
 import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 from pathlib import Path
 
-from qbittorrentapi import Client, TorrentInfoList
+from qbittorrentapi import Client
 
 from managers.state_manager import StateManager
 from transfer.torrent_transfer import (
@@ -21,12 +24,15 @@ from transfer.torrent_transfer import (
     SEEDBOX_BT_HEALTH_MISSING_TORRENT,
     SEEDBOX_BT_HEALTH_READY,
     TorrentTransfer,
+    is_owned_by,
 )
 from utils.config import Config, SeedboxOriginDataMissingPolicy
 from utils.downloader_utils import DownloaderHelper, get_downloader_client
-from utils.qbittorrent_snapshot import QbittorrentSnapshot
-from utils.sftp_utils import SFTPClient
-from utils.torrent_utils import TorrentFile, TorrentTrailingDataError
+from utils.qbittorrent_snapshot import get_shared_snapshot
+from utils.sftp_utils import PartialTransferError, SFTPClient, SFTPSessionManager
+from utils.torrent_utils import TorrentFile, TorrentFileCache, TorrentTrailingDataError
+from utils.transfer_scheduler import PRIORITY_HIGH, PRIORITY_NORMAL, TransferScheduler
+from utils.work_queue import notify
 
 logger = logging.getLogger(__name__)
 
@@ -42,6 +48,8 @@ class SeedBoxManager:
         trigger_local=None,
         trigger_home=None,
         async_downloads=True,
+        trigger_seedbox=None,
+        torrent_cache: TorrentFileCache | None = None,
     ):
         self.config = config
         self.state_manager = state_manager
@@ -50,10 +58,25 @@ class SeedBoxManager:
         self.shutdown_event = shutdown_event
         self.trigger_local = trigger_local
         self.trigger_home = trigger_home
+        # This manager's own work queue, fed with the transfers touched by seedbox snapshot deltas
+        self.trigger_seedbox = trigger_seedbox
+        # Last actionable condition queued per hash from snapshot deltas, and whether this thread is refreshing
+        self._delta_conditions: dict[str, str] = {}
+        self._own_refresh = threading.local()
         self.failed_counts = {}
         self._is_downloading = False
         self._download_lock = threading.Lock()
+        # Origin torrents waiting for the running batch download: hash -> (priority, sequence, trackers).
+        # The heap orders them by (priority, sequence); entries whose sequence no longer matches are stale.
+        self._queued_downloads: dict[str, tuple[int, int, list[str]]] = {}
+        self._download_heap: list[tuple[int, int, str]] = []
+        self._download_sequence = itertools.count()
+        self._fetching_hashes: set[str] = set()
+        # Remote (size, mtime) of origin torrents that failed to parse, so an unchanged bad file is not fetched again
+        self._rejected_remote_torrents: dict[str, tuple[tuple[int, int], str]] = {}
         self.async_downloads = async_downloads
+        # Parsed origin torrents, shared with LocalManager so a fetched torrent is decoded only once
+        self.torrent_cache = torrent_cache if torrent_cache is not None else TorrentFileCache()
         self._init_configs()
         self.seed_box_helper: DownloaderHelper = get_downloader_client(
             name=self.seed_box_dl_config.name,
@@ -61,7 +84,18 @@ class SeedBoxManager:
             username=self.seed_box_dl_config.username,
             password=self.seed_box_dl_config.password,
         )
-        self.seed_box_snapshot = QbittorrentSnapshot(self.seed_box_helper.client)
+        self.seed_box_snapshot = get_shared_snapshot(self.seed_box_helper.client)
+        if self.trigger_seedbox is not None:
+            self.seed_box_snapshot.subscribe(self._on_snapshot_change)
+        # Bandwidth and file-rate limits shared by every SFTP transfer from this seedbox
+        self.transfer_scheduler = TransferScheduler(
+            bytes_per_second=self.seed_box_config.sftp_bytes_per_second,
+            files_per_second=self.seed_box_config.sftp_files_per_second,
+        )
+        # Warm SFTP session reused across batch downloads
+        self.sftp_sessions = SFTPSessionManager(
+            self._create_sftp_client, idle_timeout=self.seed_box_config.sftp_idle_timeout
+        )
 
     def _init_configs(self):
         """Initialize configurations for seedbox and downloaders."""
@@ -80,19 +114,91 @@ class SeedBoxManager:
         if self.home_dl_config is None:
             raise ValueError(f"Home downloader config not found: {self.home_dl_name}")
 
-    def run(self):
-        """Run seedbox management tasks."""
+    def run(self, changed_hashes=None):
+        """Run seedbox management tasks. With `changed_hashes`, only those origin torrents are handled."""
         try:
-            self._process_seedbox_torrents()
+            with self.state_manager.batch():
+                self._process_seedbox_torrents(changed_hashes)
         except Exception as e:
             logger.error(f"Error in SeedBoxManager: {e}")
 
+    def close(self):
+        """Release the cached SFTP session and stop following the shared snapshot."""
+        if self.trigger_seedbox is not None:
+            self.seed_box_snapshot.unsubscribe(self._on_snapshot_change)
+        self.sftp_sessions.close()
+
+    def _managed_want_categories(self) -> set[str]:
+        want_cat = self.seed_box_dl_config.want_torrent_category
+        return {want_cat} if isinstance(want_cat, str) else set(want_cat or [])
+
+    def _completed_before(self) -> float | None:
+        """Completion time cut-off of seed_box_ignore_complete_time, or None when every completed torrent counts."""
+        if self.config.transfer.seed_box_ignore_complete_time > 0:
+            return time.time() - self.config.transfer.seed_box_ignore_complete_time
+        return None
+
+    def _refresh_snapshot(self, force=False):
+        """Refresh the shared snapshot; the deltas this refresh finds are not queued for this manager again."""
+        self._own_refresh.active = True
+        try:
+            self.seed_box_snapshot.refresh(force=force)
+        finally:
+            self._own_refresh.active = False
+
+    def _on_snapshot_change(self, changed_hashes, full_update):
+        """Queue the transfers a seedbox snapshot delta made actionable for a targeted pass of this manager.
+
+        The snapshot is shared, so another manager's refresh can show an origin torrent becoming eligible, or a
+        torrent being removed or losing its files, well before this manager's next full pass. Full updates and
+        this manager's own refreshes are left to its passes. A hash is queued once per change of condition, so
+        state flips of a torrent that stays eligible or missing do not queue it again.
+        """
+        if full_update or getattr(self._own_refresh, "active", False):
+            return
+        managed_want_categories = self._managed_want_categories()
+        completed_before = self._completed_before()
+        origin_hashes = []
+        for torrent_hash in changed_hashes:
+            torrent = self.seed_box_snapshot.torrent(torrent_hash)
+            view = self.state_manager.get_view(torrent_hash) or self.state_manager.get_view_by_bt_hash(torrent_hash)
+            if view is not None and (view.is_skipped or view.is_torrent_in_home_dl or not self._owns(view)):
+                self._delta_conditions.pop(torrent_hash, None)
+                continue
+            if torrent is None:
+                # Removed from the seedbox: only matters for a known transfer
+                self._delta_conditions.pop(torrent_hash, None)
+                if view is not None:
+                    origin_hashes.append(view.hash)
+                continue
+            condition = None
+            if self._is_missing_files(torrent):
+                if view is not None:
+                    condition = "missingFiles"
+            elif (
+                (view is None or view.hash == torrent_hash)
+                and getattr(torrent, "progress", 0) == 1
+                and getattr(torrent, "category", None) in managed_want_categories
+                and (completed_before is None or getattr(torrent, "completion_on", 0) <= completed_before)
+                and (view is None or not view.is_bt_in_seed_box)
+            ):
+                # A completed origin torrent past seed_box_ignore_complete_time that has not been handed over yet
+                condition = "eligible"
+            if condition is None:
+                self._delta_conditions.pop(torrent_hash, None)
+            elif self._delta_conditions.get(torrent_hash) != condition:
+                self._delta_conditions[torrent_hash] = condition
+                origin_hashes.append(view.hash if view is not None else torrent_hash)
+        notify(self.trigger_seedbox, origin_hashes)
+
     def _local_torrent_path(self, torrent_hash: str) -> str:
         return os.path.join(self.config.transfer.original_torrent_path, f"{torrent_hash}.torrent")
 
     def _local_torrent_is_usable(self, torrent_path: str) -> bool:
         if not os.path.exists(torrent_path):
             return False
+        if self.torrent_cache.get(torrent_path) is not None:
+            return True
         try:
             TorrentFile(torrent_path)
             return True
@@ -103,9 +209,23 @@ class SeedBoxManager:
             )
             return False
         except Exception as e:
-            logger.warning(f"Local origin torrent is unreadable and will be re-downloaded from seedbox: {torrent_path}: {e}")
+            logger.warning(
+                f"Local origin torrent is unreadable and will be re-downloaded from seedbox: {torrent_path}: {e}"
+            )
             return False
 
+    def _owns(self, state) -> bool:
+        return is_owned_by(state, self.seed_box_name, len(self.config.seed_box) == 1)
+
+    def _claim_transfers(self, seed_box_torrent_hashes: set[str]):
+        """Assign unassigned transfers whose origin or BT torrent is on this seedbox to it."""
+        for torrent_hash in seed_box_torrent_hashes:
+            view = self.state_manager.get_view(torrent_hash) or self.state_manager.get_view_by_bt_hash(torrent_hash)
+            if view is not None and not view.seed_box_name:
+                state = view.mutable()
+                state.seed_box_name = self.seed_box_name
+                self.state_manager.update(state)
+
     def _get_or_create_transfer(self, torrent_hash: str) -> TorrentTransfer:
         state = self.state_manager.get(torrent_hash)
         if state:
@@ -113,12 +233,15 @@ class SeedBoxManager:
 
         state = TorrentTransfer(
             hash=torrent_hash,
+            seed_box_name=self.seed_box_name,
             origin_torrent_file_path=self._local_torrent_path(torrent_hash),
         )
         self.state_manager.update(state)
         return state
 
-    def _record_transfer_failure(self, state: TorrentTransfer, counter_field: str, error_message: str, skip_reason: str):
+    def _record_transfer_failure(
+        self, state: TorrentTransfer, counter_field: str, error_message: str, skip_reason: str
+    ):
         attempts = state.record_failure(
             counter_field,
             error_message,
@@ -197,18 +320,32 @@ class SeedBoxManager:
             updated = True
         return updated
 
-    def _sync_existing_transfer_state(self, seed_box_torrent_hashes: set[str], seed_box_dl: Client):
-        for info_hash, state in self.state_manager.get_all().items():
-            if state.is_skipped or state.is_torrent_in_home_dl:
-                continue
-
+    def _sync_existing_transfer_state(
+        self, seed_box_torrent_hashes: set[str], seed_box_dl: Client, changed_hashes: set[str] | None = None
+    ):
+        # Filter the read-only views first so only the transfers this pass handles are copied
+        if changed_hashes is None:
+            active_views = self.state_manager.query_views(is_skipped=False, is_torrent_in_home_dl=False)
+        else:
+            # Targeted passes look up only the changed transfers instead of scanning the whole state
+            active_views = {}
+            for info_hash in changed_hashes:
+                view = self.state_manager.get_view(info_hash)
+                if view is not None and not view.is_skipped and not view.is_torrent_in_home_dl:
+                    active_views[info_hash] = view
+        active_transfers = {
+            info_hash: state.mutable() for info_hash, state in active_views.items() if self._owns(state)
+        }
+        # One index lookup instead of checking the state of every transfer's origin and BT torrent
+        missing_files_hashes = {torrent.hash for torrent in self.seed_box_snapshot.by_state("missingFiles")}
+        for info_hash, state in active_transfers.items():
             updated = False
             origin_torrent = self.seed_box_snapshot.torrent(state.hash)
             bt_torrent = self.seed_box_snapshot.torrent(state.bt_hash) if state.bt_hash else None
             source_missing_detected = False
 
             if state.bt_hash and state.bt_hash in seed_box_torrent_hashes and bt_torrent is not None:
-                if self._is_missing_files(bt_torrent):
+                if state.bt_hash in missing_files_hashes:
                     logger.warning(f"BT torrent has missing files on seedbox, resetting state: {state.bt_hash}")
                     state.is_bt_in_seed_box = False
                     state.seedbox_bt_health = SEEDBOX_BT_HEALTH_MISSING_FILES
@@ -231,7 +368,7 @@ class SeedBoxManager:
                 state.seedbox_bt_health = SEEDBOX_BT_HEALTH_MISSING_TORRENT
                 updated = True
 
-            if origin_torrent is not None and self._is_missing_files(origin_torrent):
+            if origin_torrent is not None and state.hash in missing_files_hashes:
                 source_missing_detected = True
                 updated |= self._apply_origin_data_missing_policy(
                     state,
@@ -273,42 +410,43 @@ class SeedBoxManager:
             if updated:
                 self.state_manager.update(state)
 
-    def _process_seedbox_torrents(self):
+    def _process_seedbox_torrents(self, changed_hashes: set[str] | None = None):
         seed_box_dl: Client = self.seed_box_helper.client
 
         # Refresh the cached snapshot once per run. It will use sync/maindata when available.
-        self.seed_box_snapshot.refresh()
-        all_torrents: TorrentInfoList = self.seed_box_snapshot.torrents()
+        self._refresh_snapshot()
         seed_box_torrent_hashes = self.seed_box_snapshot.hashes()
-        self._sync_existing_transfer_state(seed_box_torrent_hashes, seed_box_dl)
-
-        torrents = [torrent for torrent in all_torrents if getattr(torrent, "progress", 0) == 1]
+        if changed_hashes is None:
+            self._claim_transfers(seed_box_torrent_hashes)
+        else:
+            claim_hashes = set()
+            for torrent_hash in changed_hashes:
+                view = self.state_manager.get_view(torrent_hash)
+                bt_hash = view.bt_hash if view is not None else None
+                claim_hashes.update(h for h in (torrent_hash, bt_hash) if h in seed_box_torrent_hashes)
+            self._claim_transfers(claim_hashes)
+        self._sync_existing_transfer_state(seed_box_torrent_hashes, seed_box_dl, changed_hashes)
 
         # Determine the set of managed categories for this run
-        want_cat = self.seed_box_dl_config.want_torrent_category
-        managed_want_categories = {want_cat} if isinstance(want_cat, str) else set(want_cat or [])
-
-        # Filter torrents by category first to check if we are truly "done" for these category
-        torrents = [t for t in torrents if t.category in managed_want_categories]
+        managed_want_categories = self._managed_want_categories()
 
+        # Completed torrents in the managed categories, oldest first, from the snapshot's completion index.
         # Filter by completion time if requested
-        if self.config.transfer.seed_box_ignore_complete_time > 0:
-            current_time = time.time()
-            threshold = self.config.transfer.seed_box_ignore_complete_time
-            torrents = [t for t in torrents if (current_time - t.completion_on) >= threshold]
+        torrents = self.seed_box_snapshot.completed(
+            managed_want_categories, completed_before=self._completed_before(), hashes=changed_hashes
+        )
 
         def check_exit_on_finish():
             if self.config.transfer.exit_on_finish:
-                all_states = self.state_manager.get_all()
-                skipped_origin_hashes = {info_hash for info_hash, state in all_states.items() if state.is_skipped}
-                skipped_bt_hashes = {state.bt_hash for state in all_states.values() if state.is_skipped and state.bt_hash}
+                skipped_origin_hashes = self.state_manager.flagged_hashes("is_skipped")
+                skipped_bt_hashes = self.state_manager.skipped_bt_hashes()
 
                 # Check all managed origin categories and the BT category
                 managed_categories = list(managed_want_categories) + [
                     self.config.transfer.seed_box_bt_category,
                 ]
                 for cat in managed_categories:
-                    cat_torrents = [t for t in all_torrents if t.category == cat]
+                    cat_torrents = self.seed_box_snapshot.by_category(cat)
                     if not cat_torrents:
                         continue
 
@@ -353,13 +491,15 @@ class SeedBoxManager:
 
         add_torrent_count = 0
         max_once_add = self.config.transfer.max_once_add
+        # (origin torrent, transfer) pairs whose BT torrent was added in this pass and still needs verifying
+        added_torrents = []
 
         # Collect torrents that need downloading (hash -> trackers list)
         torrents_to_download = {}
         if self.config.transfer.auto_dl_torrent_from_seedbox:
             for torrent in torrents:
-                state = self.state_manager.get(torrent.hash)
-                if state and state.is_skipped:
+                state = self.state_manager.get_view(torrent.hash)
+                if state and (state.is_skipped or not self._owns(state)):
                     continue
 
                 # Check if exists in local state
@@ -412,6 +552,10 @@ class SeedBoxManager:
                     # logger.debug(f"Torrent not in local state: {torrent.name}")
                     continue
 
+                # Another seedbox in this process owns the transfer, even if the same torrent is seeded here too
+                if not self._owns(state):
+                    continue
+
                 # Check progress (double check completion)
                 if torrent.progress != 1:
                     continue
@@ -496,46 +640,9 @@ class SeedBoxManager:
                     save_path=torrent.save_path,
                 )
                 if "Ok." in str(result):
-                    self.seed_box_snapshot.refresh()
-                    added_bt_torrent = self.seed_box_snapshot.torrent(state.bt_hash)
-                    if added_bt_torrent is None:
-                        logger.warning(f"BT torrent add returned success but is not visible yet: {state.bt_hash}")
-                        state.is_bt_in_seed_box = False
-                        state.seedbox_bt_health = SEEDBOX_BT_HEALTH_MISSING_TORRENT
-                        self.state_manager.update(state)
-                        continue
-
-                    if self._is_missing_files(added_bt_torrent):
-                        logger.warning(f"BT torrent add returned success but reports missingFiles: {state.bt_hash}")
-                        state.is_bt_in_seed_box = False
-                        state.seedbox_bt_health = SEEDBOX_BT_HEALTH_MISSING_FILES
-                        self._apply_origin_data_missing_policy(
-                            state,
-                            seed_box_dl,
-                            origin_torrent=torrent,
-                            bt_torrent=added_bt_torrent,
-                            reason="Seedbox BT torrent is unusable after add",
-                        )
-                        self.state_manager.update(state)
-                        continue
-
-                    logger.info(f"Successfully added BT torrent: {state.bt_hash}")
-                    state.is_bt_in_seed_box = True
-                    state.seedbox_bt_health = SEEDBOX_BT_HEALTH_READY
-                    state.reset_failures("seedbox_add_retry_count")
-                    if state.hash in seed_box_torrent_hashes or os.path.exists(state.origin_torrent_file_path):
-                        state.reset_failures("missing_origin_retry_count")
-                        self._mark_origin_data_healthy(state)
-                    self.state_manager.update(state)
+                    # Verified together with the other adds of this pass, in one call after the loop
+                    added_torrents.append((torrent, state))
                     add_torrent_count += 1
-
-                    # Reset failure count on success
-                    if torrent.hash in self.failed_counts:
-                        del self.failed_counts[torrent.hash]
-
-                    # Trigger home manager to check for this new torrent
-                    if self.trigger_home:
-                        self.trigger_home.set()
                 else:
                     self._record_transfer_failure(
                         state,
@@ -554,133 +661,404 @@ class SeedBoxManager:
                 else:
                     logger.error(f"Error processing torrent {torrent.hash} ({torrent.name}) in SeedBoxManager: {e}")
 
+        self._verify_added_bt_torrents(added_torrents, seed_box_dl, seed_box_torrent_hashes)
+
         # After processing all torrents, check if we should exit on finish
         check_exit_on_finish()
 
+    def _query_added_bt_torrents(self, seed_box_dl: Client, bt_hashes: list[str]) -> dict:
+        """Look up freshly added BT torrents with a single torrents_info call.
+
+        The results go into the snapshot as well, so a pass starting before its next refresh already sees them.
+        Falls back to one forced snapshot refresh when the batch query fails.
+        """
+        try:
+            return self.seed_box_snapshot.merge(seed_box_dl.torrents_info(torrent_hashes="|".join(bt_hashes)) or [])
+        except Exception as e:
+            logger.warning(f"Failed to query added BT torrents, refreshing snapshot instead: {e}")
+        self._refresh_snapshot(force=True)
+        added_bt_torrents = {}
+        for bt_hash in bt_hashes:
+            torrent = self.seed_box_snapshot.torrent(bt_hash)
+            if torrent is not None:
+                added_bt_torrents[bt_hash] = torrent
+        return added_bt_torrents
+
+    def _verify_added_bt_torrents(self, added_torrents: list, seed_box_dl: Client, seed_box_torrent_hashes):
+        """Check that the BT torrents added in this pass are visible and usable on the seedbox."""
+        if not added_torrents:
+            return
+        added_bt_torrents = self._query_added_bt_torrents(seed_box_dl, [state.bt_hash for _, state in added_torrents])
+        for torrent, state in added_torrents:
+            try:
+                added_bt_torrent = added_bt_torrents.get(state.bt_hash)
+                if added_bt_torrent is None:
+                    logger.warning(f"BT torrent add returned success but is not visible yet: {state.bt_hash}")
+                    state.is_bt_in_seed_box = False
+                    state.seedbox_bt_health = SEEDBOX_BT_HEALTH_MISSING_TORRENT
+                    self.state_manager.update(state)
+                    continue
+
+                if self._is_missing_files(added_bt_torrent):
+                    logger.warning(f"BT torrent add returned success but reports missingFiles: {state.bt_hash}")
+                    state.is_bt_in_seed_box = False
+                    state.seedbox_bt_health = SEEDBOX_BT_HEALTH_MISSING_FILES
+                    self._apply_origin_data_missing_policy(
+                        state,
+                        seed_box_dl,
+                        origin_torrent=torrent,
+                        bt_torrent=added_bt_torrent,
+                        reason="Seedbox BT torrent is unusable after add",
+                    )
+                    self.state_manager.update(state)
+                    continue
+
+                logger.info(f"Successfully added BT torrent: {state.bt_hash}")
+                state.is_bt_in_seed_box = True
+                state.seedbox_bt_health = SEEDBOX_BT_HEALTH_READY
+                state.reset_failures("seedbox_add_retry_count")
+                if state.hash in seed_box_torrent_hashes or os.path.exists(state.origin_torrent_file_path):
+                    state.reset_failures("missing_origin_retry_count")
+                    self._mark_origin_data_healthy(state)
+                self.state_manager.update(state)
+
+                # Reset failure count on success
+                if torrent.hash in self.failed_counts:
+                    del self.failed_counts[torrent.hash]
+
+                # Hand the new BT torrent to the home manager
+                notify(self.trigger_home, [state.hash])
+            except Exception as e:
+                self._record_transfer_failure(
+                    state,
+                    "seedbox_add_retry_count",
+                    f"Error verifying BT torrent {state.bt_hash} ({torrent.name}) in SeedBoxManager: {e}",
+                    "Repeated errors while processing seedbox transfer",
+                )
+
+    def _create_sftp_client(self) -> SFTPClient:
+        return SFTPClient(
+            hostname=self.seed_box_config.ssh_host,
+            username=self.seed_box_config.ssh_user,
+            password=self.seed_box_config.ssh_password,
+            port=self.seed_box_config.ssh_port,
+            max_channels=self.seed_box_config.sftp_concurrency,
+            keepalive_interval=self.seed_box_config.sftp_keepalive_interval,
+            scheduler=self.transfer_scheduler,
+        )
+
+    def _load_partial_fetch(self, part_path: str, remote_attrs: tuple[int, int] | None) -> bytes:
+        """Return the bytes kept from an interrupted fetch if they still belong to the listed remote file."""
+        if not os.path.exists(part_path):
+            return b""
+        try:
+            part_stat = os.stat(part_path)
+            # The partial file carries the remote mtime, so a replaced remote torrent is never spliced onto it
+            if (
+                remote_attrs is not None
+                and int(part_stat.st_mtime) == remote_attrs[1]
+                and (part_stat.st_size < remote_attrs[0])
+            ):
+                with open(part_path, "rb") as f:
+                    return f.read()
+            os.remove(part_path)
+        except OSError as e:
+            logger.warning(f"Failed to read partial download {part_path}: {e}")
+        return b""
+
+    def _save_partial_fetch(self, part_path: str, data: bytes, remote_attrs: tuple[int, int] | None):
+        """Keep the received prefix of an interrupted fetch so the next attempt only transfers the rest."""
+        if remote_attrs is None or not data:
+            return
+        try:
+            with open(part_path, "wb") as f:
+                f.write(data)
+            os.utime(part_path, (remote_attrs[1], remote_attrs[1]))
+            logger.info(f"Kept {len(data)} bytes of interrupted download in {part_path}")
+        except OSError as e:
+            logger.warning(f"Failed to keep partial download {part_path}: {e}")
+
+    def _fetch_origin_torrent(
+        self,
+        sftp_client: SFTPClient,
+        torrent_hash: str,
+        trackers: list[str],
+        priority: int = PRIORITY_NORMAL,
+        remote_attrs: tuple[int, int] | None = None,
+    ):
+        """Fetch one origin torrent into memory, inject trackers and write the final file once.
+
+        The parsed torrent goes into the shared cache so later steps don't decode it again. When the remote
+        (size, mtime) from the directory listing is known, the fetch skips its own stat and an interrupted transfer
+        resumes from the bytes kept in `<hash>.torrent.part`.
+        """
+        remote_path = Path(self.seed_box_config.torrents_path) / f"{torrent_hash}.torrent"
+        final_local_path = self._local_torrent_path(torrent_hash)
+        temp_local_path = os.path.join(self.config.transfer.original_torrent_path, f"{torrent_hash}.torrent.tmp")
+        part_path = os.path.join(self.config.transfer.original_torrent_path, f"{torrent_hash}.torrent.part")
+
+        logger.info(f"Downloading torrent {torrent_hash} from seedbox...")
+        resume_data = self._load_partial_fetch(part_path, remote_attrs)
+        try:
+            data = sftp_client.fetch(
+                remote_path.as_posix(),
+                priority=priority,
+                resume_data=resume_data,
+                remote_size=remote_attrs[0] if remote_attrs is not None else None,
+            )
+        except PartialTransferError as e:
+            self._save_partial_fetch(part_path, e.data, remote_attrs)
+            raise
+        if resume_data:
+            self._remove_partial_fetch(part_path)
+
+        # Inject trackers
+        try:
+            t_file = TorrentFile.from_bytes(data, final_local_path)
+            if trackers:
+                logger.info(f"Injecting {len(trackers)} trackers into {torrent_hash}")
+                t_file.add_trackers(trackers)
+                data = t_file.to_bytes()
+        except TorrentTrailingDataError as e:
+            raise RuntimeError(
+                f"Downloaded seedbox torrent has trailing bencode data: {torrent_hash} "
+                f"({e.trailing_size} trailing bytes)"
+            ) from e
+        except Exception as e:
+            raise RuntimeError(f"Downloaded seedbox torrent is not readable: {torrent_hash}: {e}") from e
+
+        # Write under a temporary name and rename, so a partial file is never picked up
+        try:
+            with open(temp_local_path, "wb") as f:
+                f.write(data)
+            os.replace(temp_local_path, final_local_path)
+        except Exception:
+            # Cleanup temp file if exists
+            if os.path.exists(temp_local_path):
+                try:
+                    os.remove(temp_local_path)
+                except Exception as e:
+                    logger.error(f"Failed to remove temp file {temp_local_path}: {e}")
+            raise
+        self.torrent_cache.put(final_local_path, t_file)
+        logger.info(f"Successfully downloaded and processed: {final_local_path}")
+
+    def _remove_partial_fetch(self, part_path: str):
+        try:
+            os.remove(part_path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Failed to remove partial download {part_path}: {e}")
+
+    def _record_download_failure(self, state: TorrentTransfer, torrent_hash: str, error: Exception):
+        if isinstance(error, FileNotFoundError):
+            self._record_transfer_failure(
+                state,
+                "download_retry_count",
+                f"Seedbox torrent file missing for {torrent_hash}: {error}",
+                "Seedbox origin torrent file disappeared before it could be downloaded",
+            )
+            return
+        logger.error(f"Failed to download/process torrent {torrent_hash}: {error}")
+        self._record_transfer_failure(
+            state,
+            "download_retry_count",
+            f"Failed to download/process torrent {torrent_hash}: {error}",
+            "Repeatedly failed to download origin torrent file from seedbox",
+        )
+
     def _batch_download_torrents_from_seedbox(self, torrents_map: dict):
-        """Batch download torrent files from seedbox via SFTP."""
+        """Batch download torrent files from seedbox via SFTP.
+
+        While a batch download is running, later passes only queue their torrents on it and the running batch
+        picks them up by priority.
+        """
         if not torrents_map:
             return
 
         with self._download_lock:
+            self._queue_downloads(torrents_map)
             if self._is_downloading:
-                logger.info("A batch download is already in progress, skipping this run.")
+                logger.info(f"A batch download is in progress, queued {len(torrents_map)} torrents on it.")
                 return
             self._is_downloading = True
         try:
-            logger.info(f"Starting batch download for {len(torrents_map)} torrents from seedbox...")
-            sftp_client = None
-            try:
-                sftp_client = SFTPClient(
-                    hostname=self.seed_box_config.ssh_host,
-                    username=self.seed_box_config.ssh_user,
-                    password=self.seed_box_config.ssh_password,
-                    port=self.seed_box_config.ssh_port,
-                )
-                max_retries = 3
-                for attempt in range(1, max_retries + 1):
-                    try:
-                        sftp_client.connect()
-                        break
-                    except Exception as e:
-                        if attempt == max_retries:
-                            logger.error(f"SFTP connection failed after {max_retries} attempts, giving up.")
-                            raise
-                        wait = 5 * (2 ** (attempt - 1))
-                        logger.warning(
-                            f"SFTP connection attempt {attempt}/{max_retries} failed: {e}. Retrying in {wait}s..."
+            while True:
+                logger.info(f"Starting batch download for {len(self._queued_downloads)} torrents from seedbox...")
+                try:
+                    with self.sftp_sessions.session() as sftp_client:
+                        self._download_batch(sftp_client)
+                except Exception as e:
+                    logger.error(f"SFTP connection error: {e}")
+                    with self._download_lock:
+                        failed_hashes = list(self._queued_downloads)
+                        self._queued_downloads.clear()
+                        self._download_heap.clear()
+                        # The batch's workers have stopped, so nothing is being fetched any more
+                        self._fetching_hashes.clear()
+                    for torrent_hash in failed_hashes:
+                        state = self._get_or_create_transfer(torrent_hash)
+                        self._record_transfer_failure(
+                            state,
+                            "download_retry_count",
+                            f"SFTP connection error for {torrent_hash}: {e}",
+                            "Repeatedly failed to download origin torrent file from seedbox",
                         )
-                        time.sleep(wait)
+                with self._download_lock:
+                    # Torrents queued after the last worker went idle start another round
+                    if not self._queued_downloads:
+                        self._is_downloading = False
+                        return
+        finally:
+            with self._download_lock:
+                self._is_downloading = False
 
-                for torrent_hash, trackers in torrents_map.items():
-                    temp_local_path = None
-                    state = self._get_or_create_transfer(torrent_hash)
-                    try:
-                        remote_path = Path(self.seed_box_config.torrents_path) / f"{torrent_hash}.torrent"
-                        final_local_path = self._local_torrent_path(torrent_hash)
-                        temp_local_path = os.path.join(
-                            self.config.transfer.original_torrent_path,
-                            f"{torrent_hash}.torrent.tmp",
-                        )
+    def _queue_downloads(self, torrents_map: dict):
+        """Queue origin torrents for the batch download. Call with `_download_lock` held.
+
+        `torrents_map` is in seedbox add order, so its first `max_once_add` torrents are the ones the next pass
+        hands to the home downloader; they are queued at high priority. Each pass re-ranks the torrents that are
+        still waiting, so torrents about to be added overtake the normal ones left over from earlier passes.
+        """
+        for position, (torrent_hash, trackers) in enumerate(torrents_map.items()):
+            if torrent_hash in self._fetching_hashes:
+                continue
+            priority = PRIORITY_HIGH if position < self.config.transfer.max_once_add else PRIORITY_NORMAL
+            queued = self._queued_downloads.get(torrent_hash)
+            if queued is not None and queued[0] == priority:
+                self._queued_downloads[torrent_hash] = (priority, queued[1], trackers)
+                continue
+            sequence = next(self._download_sequence)
+            self._queued_downloads[torrent_hash] = (priority, sequence, trackers)
+            heapq.heappush(self._download_heap, (priority, sequence, torrent_hash))
+
+    def _next_queued_download(self):
+        """Take the waiting torrent with the highest priority, oldest first.
 
-                        if self._local_torrent_is_usable(final_local_path):
-                            state.origin_torrent_file_path = final_local_path
+        Returns (hash, priority, sequence, trackers), or None when nothing is waiting.
+        """
+        with self._download_lock:
+            while self._download_heap:
+                priority, sequence, torrent_hash = heapq.heappop(self._download_heap)
+                queued = self._queued_downloads.get(torrent_hash)
+                if queued is None or queued[1] != sequence:
+                    continue
+                del self._queued_downloads[torrent_hash]
+                self._fetching_hashes.add(torrent_hash)
+                return torrent_hash, priority, sequence, queued[2]
+        return None
+
+    def _finish_queued_download(self, torrent_hash: str):
+        with self._download_lock:
+            self._fetching_hashes.discard(torrent_hash)
+
+    def _list_remote_torrents(self, sftp_client: SFTPClient):
+        """List the seedbox torrents directory once, or return None to fall back to per-hash gets."""
+        try:
+            return sftp_client.listdir_attr(self.seed_box_config.torrents_path)
+        except Exception as e:
+            logger.warning(f"Failed to list seedbox torrents directory, fetching each torrent blindly: {e}")
+            return None
+
+    def _download_batch(self, sftp_client: SFTPClient):
+        """Fetch the queued origin torrents over a connected SFTP client and record the outcome per hash.
+
+        Whenever a worker is free it gets the waiting torrent with the highest priority, including torrents that a
+        later pass queued while this batch was running.
+        """
+        remote_listing = self._list_remote_torrents(sftp_client)
+        # Torrents queued after this point may be missing from the listing, which is then refreshed once for them
+        listed_before = next(self._download_sequence)
+        remote_attrs = {}
+        fetched = skipped_missing = skipped_rejected = 0
+        concurrency = max(1, self.seed_box_config.sftp_concurrency)
+        # Workers only move bytes; state changes stay on this thread
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="sftp") as pool:
+            pending_downloads = {}
+            done = ()
+            while True:
+                downloaded_hashes = []
+                # One state batch per round of finished fetches, so a long download is written as it goes
+                with self.state_manager.batch():
+                    for future in done:
+                        torrent_hash = pending_downloads.pop(future)
+                        # Re-read the transfer: other managers may have changed it while it was being fetched
+                        state = self._get_or_create_transfer(torrent_hash)
+                        try:
+                            future.result()
+                            fetched += 1
+                            self._rejected_remote_torrents.pop(torrent_hash, None)
+                            state.origin_torrent_file_path = self._local_torrent_path(torrent_hash)
                             state.reset_failures("download_retry_count", "missing_origin_retry_count")
                             self.state_manager.update(state)
+                            downloaded_hashes.append(torrent_hash)
+                        except Exception as e:
+                            # Parse failures are tied to the remote file content; transport errors are worth retrying
+                            if isinstance(e, RuntimeError) and torrent_hash in remote_attrs:
+                                self._rejected_remote_torrents[torrent_hash] = (remote_attrs[torrent_hash], str(e))
+                            self._record_download_failure(state, torrent_hash, e)
+                        finally:
+                            self._finish_queued_download(torrent_hash)
+
+                    while len(pending_downloads) < concurrency and (queued := self._next_queued_download()) is not None:
+                        torrent_hash, priority, sequence, trackers = queued
+                        state = self._get_or_create_transfer(torrent_hash)
+                        final_local_path = self._local_torrent_path(torrent_hash)
+                        try:
+                            if self._local_torrent_is_usable(final_local_path):
+                                state.origin_torrent_file_path = final_local_path
+                                state.reset_failures("download_retry_count", "missing_origin_retry_count")
+                                self.state_manager.update(state)
+                                downloaded_hashes.append(torrent_hash)
+                                self._finish_queued_download(torrent_hash)
+                                continue
+                        except Exception as e:
+                            self._record_download_failure(state, torrent_hash, e)
+                            self._finish_queued_download(torrent_hash)
                             continue
 
-                        logger.info(f"Downloading torrent {torrent_hash} from seedbox...")
-                        sftp_client.download(remote_path.as_posix(), temp_local_path)
-
-                        # Inject trackers
-                        if os.path.exists(temp_local_path):
-                            try:
-                                t_file = TorrentFile(temp_local_path)
-                                if trackers:
-                                    logger.info(f"Injecting {len(trackers)} trackers into {torrent_hash}")
-                                    t_file.add_trackers(trackers)
-                                    if not t_file.save(temp_local_path):
-                                        raise RuntimeError(f"Failed to save torrent after tracker injection: {torrent_hash}")
-                            except TorrentTrailingDataError as e:
-                                raise RuntimeError(
-                                    f"Downloaded seedbox torrent has trailing bencode data: {torrent_hash} "
-                                    f"({e.trailing_size} trailing bytes)"
-                                ) from e
-                            except Exception as e:
-                                raise RuntimeError(f"Downloaded seedbox torrent is not readable: {torrent_hash}: {e}") from e
-
-                            # Rename to final name
-                            os.replace(temp_local_path, final_local_path)
-                            state.origin_torrent_file_path = final_local_path
-                            state.reset_failures("download_retry_count", "missing_origin_retry_count")
-                            self.state_manager.update(state)
-                            logger.info(f"Successfully downloaded and processed: {final_local_path}")
-                        else:
-                            self._record_transfer_failure(
-                                state,
-                                "download_retry_count",
-                                f"Downloaded torrent file missing after transfer: {torrent_hash}",
-                                "Seedbox origin torrent file disappeared before it could be downloaded",
-                            )
-                    except FileNotFoundError as e:
-                        self._record_transfer_failure(
-                            state,
-                            "download_retry_count",
-                            f"Seedbox torrent file missing for {torrent_hash}: {e}",
-                            "Seedbox origin torrent file disappeared before it could be downloaded",
-                        )
-                    except Exception as e:
-                        logger.error(f"Failed to download/process torrent {torrent_hash}: {e}")
-                        self._record_transfer_failure(
-                            state,
-                            "download_retry_count",
-                            f"Failed to download/process torrent {torrent_hash}: {e}",
-                            "Repeatedly failed to download origin torrent file from seedbox",
+                        if remote_listing is not None:
+                            attrs = remote_listing.get(f"{torrent_hash}.torrent")
+                            if attrs is None and sequence > listed_before:
+                                remote_listing = self._list_remote_torrents(sftp_client)
+                                listed_before = next(self._download_sequence)
+                                if remote_listing is not None:
+                                    attrs = remote_listing.get(f"{torrent_hash}.torrent")
+                            if remote_listing is not None and attrs is None:
+                                skipped_missing += 1
+                                self._rejected_remote_torrents.pop(torrent_hash, None)
+                                self._record_download_failure(
+                                    state, torrent_hash, FileNotFoundError("not present in seedbox torrents directory")
+                                )
+                                self._finish_queued_download(torrent_hash)
+                                continue
+                            rejected = self._rejected_remote_torrents.get(torrent_hash)
+                            if rejected and rejected[0] == attrs:
+                                skipped_rejected += 1
+                                self._record_download_failure(state, torrent_hash, RuntimeError(rejected[1]))
+                                self._finish_queued_download(torrent_hash)
+                                continue
+                            if attrs is not None:
+                                remote_attrs[torrent_hash] = attrs
+
+                        future = pool.submit(
+                            self._fetch_origin_torrent,
+                            sftp_client,
+                            torrent_hash,
+                            trackers,
+                            priority,
+                            remote_attrs.get(torrent_hash),
                         )
-                        # Cleanup temp file if exists
-                        if temp_local_path and os.path.exists(temp_local_path):
-                            try:
-                                os.remove(temp_local_path)
-                            except Exception as e:
-                                logger.error(f"Failed to remove temp file {temp_local_path}: {e}")
+                        pending_downloads[future] = torrent_hash
 
-                # After finishing a batch, trigger LocalManager to scan
-                if self.trigger_local:
-                    self.trigger_local.set()
+                # Hand the origin torrents committed in this round to LocalManager
+                notify(self.trigger_local, downloaded_hashes)
+                if not pending_downloads:
+                    break
+                done, _ = wait(pending_downloads, return_when=FIRST_COMPLETED)
 
-            except Exception as e:
-                logger.error(f"SFTP connection error: {e}")
-                for torrent_hash in torrents_map:
-                    state = self._get_or_create_transfer(torrent_hash)
-                    self._record_transfer_failure(
-                        state,
-                        "download_retry_count",
-                        f"SFTP connection error for {torrent_hash}: {e}",
-                        "Repeatedly failed to download origin torrent file from seedbox",
-                    )
-            finally:
-                if sftp_client:
-                    sftp_client.close()
-        finally:
-            with self._download_lock:
-                self._is_downloading = False
+        logger.info(
+            f"Batch done: {fetched} fetched, {skipped_missing} missing on seedbox, "
+            f"{skipped_rejected} unchanged since a rejected fetch"
+        )
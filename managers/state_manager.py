@@ -1,100 +1,308 @@
-import fcntl
-import json
 import logging
-import os
 import threading
-from typing import Dict, List, Optional
+from contextlib import contextmanager
+from types import MappingProxyType
+from typing import Dict, Iterable, Mapping, Optional, Set
 
-from transfer.torrent_transfer import TorrentTransfer
+from managers.state_storage import (
+    DEFAULT_JOURNAL_COMPACT_THRESHOLD,
+    INDEXED_FIELDS,
+    Mutations,
+    create_state_storage,
+)
+from transfer.torrent_transfer import TorrentTransfer, TorrentTransferView
 
 logger = logging.getLogger(__name__)
 
+# Boolean fields whose set members StateManager tracks incrementally.
+FLAG_INDEX_FIELDS = ("is_skipped", "is_torrent_in_home_dl", "is_bt_in_seed_box")
+
 
 class StateManager:
-    def __init__(self, transfer_file_path: str):
+    def __init__(
+        self,
+        transfer_file_path: str,
+        journal_compact_threshold: int = DEFAULT_JOURNAL_COMPACT_THRESHOLD,
+        flush_interval: float = 0,
+        backend: str = "json",
+        shard_by: Optional[str] = None,
+        shard_names: Iterable[str] = (),
+    ):
         self.transfer_file_path = transfer_file_path
-        self.transfer_file_lock_path = f"{transfer_file_path}.state.lock"
-        self.transfer_status_dict: Dict[str, TorrentTransfer] = {}
+        self.flush_interval = flush_interval
+        self._storage = create_state_storage(
+            backend, transfer_file_path, journal_compact_threshold, shard_by=shard_by, shard_names=shard_names
+        )
+        # Stored transfers are frozen and replaced on update, so they can be shared with readers as-is.
+        self.transfer_status_dict: Dict[str, TorrentTransferView] = {}
+        self._bt_hash_index: Dict[str, str] = {}
+        # Dicts used as insertion-ordered sets, so indexed queries keep a stable order.
+        self._flag_indexes: Dict[str, Dict[str, None]] = {field: {} for field in FLAG_INDEX_FIELDS}
+        # Hashes waiting for the debounced flusher, in mutation order; their current value is written when it runs.
+        self._pending: Dict[str, None] = {}
+        # Hashes changed in memory but not yet written to storage; storage queries must double-check them.
+        self._dirty: Set[str] = set()
+        self._flush_timer: Optional[threading.Timer] = None
+        self._batch_local = threading.local()
         self.lock = threading.Lock()
         self.load()
 
-    def _acquire_file_lock(self, lock_type: int):
-        os.makedirs(os.path.dirname(self.transfer_file_lock_path) or ".", exist_ok=True)
-        lock_file = open(self.transfer_file_lock_path, "a+", encoding="utf-8")
-        fcntl.flock(lock_file.fileno(), lock_type)
-        return lock_file
+    def load(self):
+        """Load transfer status from storage."""
+        with self.lock:
+            self.transfer_status_dict = {
+                info_hash: TorrentTransferView.from_transfer(transfer)
+                for info_hash, transfer in self._storage.load().items()
+            }
+            self._dirty = set()
+            self._rebuild_indexes()
 
-    @staticmethod
-    def _release_file_lock(lock_file):
-        try:
-            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
-        finally:
-            lock_file.close()
+    def refresh(self) -> bool:
+        """Pick up transfers that other processes sharing the state file changed since the last read.
 
-    def load(self):
-        """Load transfer status from file."""
+        Only the changed records are re-read. Hashes this process changed but has not written yet keep
+        their local value. Returns True if anything changed.
+        """
         with self.lock:
-            lock_file = self._acquire_file_lock(fcntl.LOCK_SH)
-            try:
-                self.transfer_status_dict = {}
-                if os.path.exists(self.transfer_file_path):
-                    try:
-                        with open(self.transfer_file_path, "r", encoding="utf-8") as f:
-                            transfer_status_list: List[dict] = json.load(f)
-
-                        for transfer_data in transfer_status_list:
-                            try:
-                                transfer = TorrentTransfer(**transfer_data)
-                                self.transfer_status_dict[transfer.hash] = transfer
-                            except Exception as e:
-                                logger.error(f"Error creating TorrentTransfer from data: {transfer_data} - {e}")
-                    except Exception as e:
-                        logger.error(f"Failed to load transfer file: {self.transfer_file_path} - {e}")
+            return self._apply_external_changes()
+
+    def _apply_external_changes(self) -> bool:
+        try:
+            changes = self._storage.read_changes()
+        except Exception as e:
+            logger.error(f"Failed to read external state changes: {e}")
+            return False
+        if changes is None:
+            return False
+
+        full_reload, transfers = changes
+        if full_reload:
+            local = {info_hash: self.transfer_status_dict.get(info_hash) for info_hash in self._dirty}
+            self.transfer_status_dict = {
+                info_hash: TorrentTransferView.from_transfer(transfer) for info_hash, transfer in transfers.items()
+            }
+            for info_hash, transfer in local.items():
+                if transfer is None:
+                    self.transfer_status_dict.pop(info_hash, None)
                 else:
-                    logger.warning(f"Transfer file does not exist: {self.transfer_file_path}")
-            finally:
-                self._release_file_lock(lock_file)
+                    self.transfer_status_dict[info_hash] = transfer
+            self._rebuild_indexes()
+            return True
+
+        for info_hash, transfer in transfers.items():
+            if info_hash in self._dirty:
+                continue
+            previous = self.transfer_status_dict.pop(info_hash, None)
+            if previous is not None:
+                self._unindex(previous)
+            if transfer is not None:
+                stored = TorrentTransferView.from_transfer(transfer)
+                self.transfer_status_dict[info_hash] = stored
+                self._index(stored)
+        return True
+
+    def _rebuild_indexes(self):
+        self._bt_hash_index = {}
+        self._flag_indexes = {field: {} for field in FLAG_INDEX_FIELDS}
+        for transfer in self.transfer_status_dict.values():
+            self._index(transfer)
+
+    def _index(self, transfer: TorrentTransferView):
+        if transfer.bt_hash:
+            self._bt_hash_index[transfer.bt_hash] = transfer.hash
+        for field, members in self._flag_indexes.items():
+            if getattr(transfer, field):
+                members[transfer.hash] = None
+
+    def _unindex(self, transfer: TorrentTransferView):
+        if transfer.bt_hash and self._bt_hash_index.get(transfer.bt_hash) == transfer.hash:
+            del self._bt_hash_index[transfer.bt_hash]
+        for members in self._flag_indexes.values():
+            members.pop(transfer.hash, None)
 
     def save(self):
-        """Save transfer status to file."""
+        """Write the full transfer status to storage, compacting any journal."""
+        with self.lock, self._storage.locked():
+            self._apply_external_changes()
+            self._storage.compact(self.transfer_status_dict)
+
+    def _write_mutations(self, mutations: Mutations):
+        # Catch up under the same cross-process lock, so a compaction never drops another process's changes.
+        # Sharded storage only locks the shards these mutations touch.
+        with self._storage.locked_for(mutations):
+            self._apply_external_changes()
+            self._storage.write(mutations, self.transfer_status_dict)
+        for info_hash, transfer in mutations.items():
+            # Another thread may have changed the hash again in the meantime; then it stays dirty.
+            if self.transfer_status_dict.get(info_hash) is transfer:
+                self._dirty.discard(info_hash)
+
+    def _current_mutations(self, hashes: Iterable[str]) -> Mutations:
+        """The current value of each hash, None for a deleted one. Call with `lock` held.
+
+        Batches and the debounced flusher only remember which hashes changed: writing the value captured at
+        mutation time could overwrite a newer change another thread made to the same hash in the meantime.
+        """
+        return {info_hash: self.transfer_status_dict.get(info_hash) for info_hash in hashes}
+
+    def _record_mutation(self, info_hash: str):
+        """Route a mutation to the current batch, the debounced flusher or straight to storage."""
+        self._dirty.add(info_hash)
+        batch_pending = getattr(self._batch_local, "pending", None)
+        if batch_pending is not None:
+            batch_pending[info_hash] = None
+        elif self.flush_interval > 0:
+            self._pending[info_hash] = None
+            self._schedule_flush()
+        else:
+            self._write_mutations(self._current_mutations((info_hash,)))
+
+    def _schedule_flush(self):
+        if self._flush_timer is not None:
+            return
+        self._flush_timer = threading.Timer(self.flush_interval, self.flush)
+        self._flush_timer.daemon = True
+        self._flush_timer.start()
+
+    def flush(self):
+        """Write mutations held back by the debounced flusher."""
         with self.lock:
-            lock_file = self._acquire_file_lock(fcntl.LOCK_EX)
-            try:
-                transfer_status_list = [transfer.model_dump() for transfer in self.transfer_status_dict.values()]
-                temp_path = f"{self.transfer_file_path}.tmp.{os.getpid()}.{threading.get_ident()}"
-                with open(temp_path, "w", encoding="utf-8") as f:
-                    json.dump(transfer_status_list, f)
-                os.replace(temp_path, self.transfer_file_path)
-            except Exception as e:
-                logger.error(f"Failed to save transfer file: {self.transfer_file_path} - {e}")
-            finally:
-                self._release_file_lock(lock_file)
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, {}
+            self._write_mutations(self._current_mutations(pending))
+
+    @contextmanager
+    def batch(self):
+        """Collect updates and deletes made by this thread and commit them in a single storage write.
+
+        Repeated mutations of the same hash are coalesced so only the final state is written.
+        Nested batches join the outermost one, which starts by picking up changes made by other processes.
+        """
+        if getattr(self._batch_local, "pending", None) is not None:
+            yield self
+            return
+
+        self.refresh()
+        self._batch_local.pending = {}
+        try:
+            yield self
+        finally:
+            pending = self._batch_local.pending
+            self._batch_local.pending = None
+            if pending:
+                with self.lock:
+                    if self.flush_interval > 0:
+                        self._pending.update(pending)
+                        self._schedule_flush()
+                    else:
+                        self._write_mutations(self._current_mutations(pending))
 
     def get(self, info_hash: str) -> Optional[TorrentTransfer]:
-        """Get transfer status by hash."""
+        """Get a modifiable copy of the transfer status by hash."""
+        transfer = self.get_view(info_hash)
+        return transfer.mutable() if transfer is not None else None
+
+    def get_view(self, info_hash: str) -> Optional[TorrentTransferView]:
+        """Get the read-only transfer status by hash without copying it."""
         with self.lock:
-            transfer = self.transfer_status_dict.get(info_hash)
-            if transfer is None:
-                return None
-            return transfer.model_copy(deep=True)
+            return self.transfer_status_dict.get(info_hash)
 
     def update(self, transfer: TorrentTransfer):
         """Update transfer status."""
         with self.lock:
-            self.transfer_status_dict[transfer.hash] = transfer.model_copy(deep=True)
-        self.save()
+            stored = TorrentTransferView.from_transfer(transfer)
+            previous = self.transfer_status_dict.get(transfer.hash)
+            if previous is not None:
+                self._unindex(previous)
+            self.transfer_status_dict[transfer.hash] = stored
+            self._index(stored)
+            self._record_mutation(transfer.hash)
 
     def delete(self, info_hash: str):
         """Delete transfer status by hash."""
         with self.lock:
-            if info_hash in self.transfer_status_dict:
-                del self.transfer_status_dict[info_hash]
-        self.save()
+            previous = self.transfer_status_dict.pop(info_hash, None)
+            if previous is None:
+                return
+            self._unindex(previous)
+            self._record_mutation(info_hash)
 
     def get_all(self) -> Dict[str, TorrentTransfer]:
-        """Get copy of all transfer statuses."""
+        """Get modifiable copies of all transfer statuses."""
+        return {info_hash: transfer.mutable() for info_hash, transfer in self.get_all_views().items()}
+
+    def get_all_views(self) -> Mapping[str, TorrentTransferView]:
+        """Get a read-only mapping of all transfer statuses without copying them.
+
+        Call ``mutable()`` on a transfer before changing it.
+        """
+        with self.lock:
+            return MappingProxyType(dict(self.transfer_status_dict))
+
+    def query(self, **filters) -> Dict[str, TorrentTransfer]:
+        """Get modifiable copies of the transfers whose indexed fields equal the given values.
+
+        Example: ``query(is_skipped=False, is_torrent_in_home_dl=False)``.
+        """
+        return {info_hash: transfer.mutable() for info_hash, transfer in self.query_views(**filters).items()}
+
+    def query_views(self, **filters) -> Dict[str, TorrentTransferView]:
+        """Like query(), but returns the read-only transfers without copying them."""
+        unknown_fields = set(filters) - set(INDEXED_FIELDS)
+        if unknown_fields:
+            raise ValueError(f"Unsupported state query fields: {sorted(unknown_fields)}")
+
+        with self.lock:
+            candidates = self._candidate_hashes(filters)
+            result = {}
+            for info_hash in candidates:
+                transfer = self.transfer_status_dict.get(info_hash)
+                if transfer is None:
+                    continue
+                if all(getattr(transfer, field) == value for field, value in filters.items()):
+                    result[info_hash] = transfer
+            return result
+
+    def _candidate_hashes(self, filters: dict):
+        """Narrow a query down using the in-memory indexes, then the storage index, before scanning."""
+        if "hash" in filters:
+            return [filters["hash"]]
+        if "bt_hash" in filters:
+            info_hash = self._bt_hash_index.get(filters["bt_hash"])
+            return [info_hash] if info_hash else []
+        for field, value in filters.items():
+            if field in self._flag_indexes and value is True:
+                return list(self._flag_indexes[field])
+
+        if self._storage.supports_query:
+            try:
+                indexed_hashes = self._storage.query_hashes(filters)
+                indexed_hash_set = set(indexed_hashes)
+                return indexed_hashes + [info_hash for info_hash in self._dirty if info_hash not in indexed_hash_set]
+            except Exception as e:
+                logger.error(f"State storage query failed, scanning in memory instead: {e}")
+        return self.transfer_status_dict.keys()
+
+    def get_view_by_bt_hash(self, bt_hash: str) -> Optional[TorrentTransferView]:
+        """Get the read-only transfer that owns a BT hash."""
+        with self.lock:
+            info_hash = self._bt_hash_index.get(bt_hash)
+            return self.transfer_status_dict.get(info_hash) if info_hash else None
+
+    def flagged_hashes(self, field: str) -> Set[str]:
+        """Get the origin hashes of transfers whose boolean `field` is set, e.g. ``is_skipped``."""
+        with self.lock:
+            return set(self._flag_indexes[field])
+
+    def skipped_bt_hashes(self) -> Set[str]:
+        """Get the BT hashes of skipped transfers."""
         with self.lock:
             return {
-                info_hash: transfer.model_copy(deep=True)
-                for info_hash, transfer in self.transfer_status_dict.items()
+                self.transfer_status_dict[info_hash].bt_hash
+                for info_hash in self._flag_indexes["is_skipped"]
+                if self.transfer_status_dict[info_hash].bt_hash
             }
@@ -0,0 +1,626 @@
+import fcntl
+import logging
+import os
+import re
+import sqlite3
+import threading
+from collections.abc import Mapping
+from contextlib import ExitStack, contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from transfer.torrent_transfer import TorrentTransfer, TorrentTransferView
+from utils import json_codec
+
+logger = logging.getLogger(__name__)
+
+JOURNAL_OP_UPDATE = "update"
+JOURNAL_OP_DELETE = "delete"
+DEFAULT_JOURNAL_COMPACT_THRESHOLD = 1000
+
+# Fields that StateManager.query() accepts; the SQLite backend keeps an index for each of them.
+INDEXED_FIELDS = ("hash", "bt_hash", "is_skipped", "is_torrent_in_home_dl", "seedbox_origin_data_status")
+
+# Pending mutations keyed by hash; None marks a delete.
+Mutations = Dict[str, Optional[TorrentTransferView]]
+
+# Transfers changed by other processes, keyed by hash; None marks a delete.
+ExternalChanges = Dict[str, Optional[TorrentTransfer]]
+
+
+class StateStorage:
+    """Persistence backend for StateManager. The manager's in-memory dict stays authoritative in-process."""
+
+    supports_query = False
+
+    def __init__(self, transfer_file_path: str):
+        self.transfer_file_path = transfer_file_path
+        self.transfer_file_lock_path = f"{transfer_file_path}.state.lock"
+        self._held_lock_file = None
+
+    def _acquire_file_lock(self, lock_type: int):
+        os.makedirs(os.path.dirname(self.transfer_file_lock_path) or ".", exist_ok=True)
+        lock_file = open(self.transfer_file_lock_path, "a+", encoding="utf-8")
+        fcntl.flock(lock_file.fileno(), lock_type)
+        return lock_file
+
+    @staticmethod
+    def _release_file_lock(lock_file):
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+        finally:
+            lock_file.close()
+
+    @contextmanager
+    def locked(self, lock_type: int = fcntl.LOCK_EX):
+        """Hold the cross-process state lock. Nested calls reuse the lock that is already held.
+
+        Callers serialize access to a storage instance (StateManager does so with its own lock).
+        """
+        if self._held_lock_file is not None:
+            yield
+            return
+        lock_file = self._acquire_file_lock(lock_type)
+        self._held_lock_file = lock_file
+        try:
+            yield
+        finally:
+            self._held_lock_file = None
+            self._release_file_lock(lock_file)
+
+    def locked_for(self, mutations: Mutations):
+        """Hold the cross-process lock needed to write `mutations`. Unsharded storage has a single lock."""
+        return self.locked()
+
+    def load(self) -> Dict[str, TorrentTransfer]:
+        """Load and validate the persisted transfers."""
+        raise NotImplementedError
+
+    def write(self, mutations: Mutations, transfers: Dict[str, TorrentTransferView]):
+        """Persist mutations. `transfers` is the full current state, for backends that compact."""
+        raise NotImplementedError
+
+    def compact(self, transfers: Dict[str, TorrentTransferView]):
+        """Persist the full current state in one go."""
+        raise NotImplementedError
+
+    def read_changes(self) -> Optional[Tuple[bool, ExternalChanges]]:
+        """Return the transfers changed by other processes since the last read, or None if nothing changed.
+
+        The flag is True when the changes are a full reload that replaces the current state.
+        """
+        raise NotImplementedError
+
+    def query_hashes(self, filters: dict) -> List[str]:
+        raise NotImplementedError
+
+
+class JsonStateStorage(StateStorage):
+    """torrent_info.json snapshot plus an append-only journal of mutations."""
+
+    def __init__(self, transfer_file_path: str, journal_compact_threshold: int = DEFAULT_JOURNAL_COMPACT_THRESHOLD):
+        super().__init__(transfer_file_path)
+        self.transfer_journal_path = f"{transfer_file_path}.journal"
+        self.journal_compact_threshold = journal_compact_threshold
+        self._journal_entries = 0
+        # How far this instance has read the state files, so changes by other processes can be picked up
+        # incrementally. Compaction replaces the snapshot, which changes its signature and forces a full reload.
+        self._snapshot_signature: Optional[tuple] = None
+        self._journal_offset = 0
+
+    def load(self) -> Dict[str, TorrentTransfer]:
+        """Load transfer status from the snapshot file and replay the journal on top of it."""
+        with self.locked(fcntl.LOCK_SH):
+            return self._read()
+
+    @staticmethod
+    def _file_signature(path: str) -> Optional[tuple]:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+    def _journal_size(self) -> int:
+        try:
+            return os.path.getsize(self.transfer_journal_path)
+        except FileNotFoundError:
+            return 0
+
+    def _is_up_to_date(self) -> bool:
+        return (
+            self._file_signature(self.transfer_file_path) == self._snapshot_signature
+            and self._journal_size() == self._journal_offset
+        )
+
+    def _read(self) -> Dict[str, TorrentTransfer]:
+        transfer_status_dict: Dict[str, TorrentTransfer] = {}
+        self._journal_entries = 0
+        self._journal_offset = 0
+        self._snapshot_signature = self._file_signature(self.transfer_file_path)
+        if os.path.exists(self.transfer_file_path):
+            try:
+                with open(self.transfer_file_path, "rb") as f:
+                    transfer_status_list: List[dict] = json_codec.loads(f.read())
+
+                for transfer_data in transfer_status_list:
+                    try:
+                        transfer = TorrentTransfer(**transfer_data)
+                        transfer_status_dict[transfer.hash] = transfer
+                    except Exception as e:
+                        logger.error(f"Error creating TorrentTransfer from data: {transfer_data} - {e}")
+            except Exception as e:
+                logger.error(f"Failed to load transfer file: {self.transfer_file_path} - {e}")
+        elif not os.path.exists(self.transfer_journal_path):
+            logger.warning(f"Transfer file does not exist: {self.transfer_file_path}")
+
+        self._replay_journal(transfer_status_dict)
+        return transfer_status_dict
+
+    def _replay_journal(self, transfer_status_dict: Dict[str, Optional[TorrentTransfer]], tombstones: bool = False):
+        """Apply journal entries past the current offset. With `tombstones`, deletes are recorded as None."""
+        if not os.path.exists(self.transfer_journal_path):
+            return
+        try:
+            with open(self.transfer_journal_path, "rb") as f:
+                f.seek(self._journal_offset)
+                for line in f:
+                    line_offset = self._journal_offset
+                    self._journal_offset += len(line)
+                    if not line.strip():
+                        continue
+                    try:
+                        self._apply_journal_entry(transfer_status_dict, json_codec.loads(line), tombstones)
+                        self._journal_entries += 1
+                    except Exception as e:
+                        # A torn trailing line is expected after a crash mid-append; skip it.
+                        logger.error(
+                            f"Skipping invalid journal entry {self.transfer_journal_path} at byte {line_offset} - {e}"
+                        )
+        except Exception as e:
+            logger.error(f"Failed to replay transfer journal: {self.transfer_journal_path} - {e}")
+
+    @staticmethod
+    def _apply_journal_entry(
+        transfer_status_dict: Dict[str, Optional[TorrentTransfer]], entry: dict, tombstones: bool = False
+    ):
+        op = entry.get("op")
+        if op == JOURNAL_OP_UPDATE:
+            transfer = TorrentTransfer(**entry["transfer"])
+            transfer_status_dict[transfer.hash] = transfer
+        elif op == JOURNAL_OP_DELETE:
+            if tombstones:
+                transfer_status_dict[entry["hash"]] = None
+            else:
+                transfer_status_dict.pop(entry["hash"], None)
+        else:
+            raise ValueError(f"unknown journal op: {op}")
+
+    @staticmethod
+    def _journal_entry(info_hash: str, transfer: Optional[TorrentTransferView]) -> dict:
+        if transfer is None:
+            return {"op": JOURNAL_OP_DELETE, "hash": info_hash}
+        return {"op": JOURNAL_OP_UPDATE, "transfer": transfer.to_dict()}
+
+    def read_changes(self) -> Optional[Tuple[bool, ExternalChanges]]:
+        """Replay only the journal tail appended by other processes; reload fully after a foreign compaction."""
+        # Two stat calls settle the common case without taking the lock.
+        if self._is_up_to_date():
+            return None
+        with self.locked(fcntl.LOCK_SH):
+            snapshot_replaced = self._file_signature(self.transfer_file_path) != self._snapshot_signature
+            if snapshot_replaced or self._journal_size() < self._journal_offset:
+                return True, self._read()
+            changes: ExternalChanges = {}
+            self._replay_journal(changes, tombstones=True)
+            return (False, changes) if changes else None
+
+    def write(self, mutations: Mutations, transfers: Dict[str, TorrentTransferView]):
+        """Append mutations to the journal, compacting into the snapshot once it grows too long.
+
+        `transfers` is only compacted when this instance has read everything other processes wrote,
+        so their changes are never dropped from the snapshot.
+        """
+        with self.locked():
+            try:
+                up_to_date = self._is_up_to_date()
+                with open(self.transfer_journal_path, "a+b") as f:
+                    # After a crash mid-append the journal ends in a torn line; start on a fresh line so the first
+                    # new entry is not glued onto it and dropped with it on replay.
+                    separator = b"\n" if self._ends_with_torn_line(f) else b""
+                    f.write(
+                        separator
+                        + b"".join(
+                            json_codec.dumps(self._journal_entry(info_hash, transfer)) + b"\n"
+                            for info_hash, transfer in mutations.items()
+                        )
+                    )
+                    if up_to_date:
+                        self._journal_offset = f.tell()
+                self._journal_entries += len(mutations)
+                if up_to_date and self._journal_entries >= self.journal_compact_threshold:
+                    self._write_snapshot(transfers)
+            except Exception as e:
+                logger.error(f"Failed to append transfer journal: {self.transfer_journal_path} - {e}")
+
+    @staticmethod
+    def _ends_with_torn_line(f) -> bool:
+        size = f.seek(0, os.SEEK_END)
+        if size == 0:
+            return False
+        f.seek(size - 1)
+        return f.read(1) != b"\n"
+
+    def _write_snapshot(self, transfers: Dict[str, TorrentTransferView]):
+        transfer_status_list = [transfer.to_dict() for transfer in transfers.values()]
+        temp_path = f"{self.transfer_file_path}.tmp.{os.getpid()}.{threading.get_ident()}"
+        with open(temp_path, "wb") as f:
+            f.write(json_codec.dumps(transfer_status_list))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.transfer_file_path)
+        # The snapshot now covers every journaled mutation, so the journal can start over.
+        with open(self.transfer_journal_path, "w", encoding="utf-8"):
+            pass
+        self._journal_entries = 0
+        self._journal_offset = 0
+        self._snapshot_signature = self._file_signature(self.transfer_file_path)
+
+    def compact(self, transfers: Dict[str, TorrentTransferView]):
+        """Compact transfer status into the snapshot file and truncate the journal."""
+        with self.locked():
+            try:
+                self._write_snapshot(transfers)
+            except Exception as e:
+                logger.error(f"Failed to save transfer file: {self.transfer_file_path} - {e}")
+
+
+class SqliteStateStorage(StateStorage):
+    """SQLite database next to torrent_info.json, with indexes on the fields managers filter by."""
+
+    supports_query = True
+
+    def __init__(self, transfer_file_path: str):
+        super().__init__(transfer_file_path)
+        self.database_path = f"{transfer_file_path}.sqlite3"
+        self._connection: Optional[sqlite3.Connection] = None
+        # SQLite bumps data_version whenever another connection commits, which makes external changes cheap to spot.
+        self._data_version: Optional[int] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is not None:
+            return self._connection
+
+        os.makedirs(os.path.dirname(self.database_path) or ".", exist_ok=True)
+        # StateManager serializes access with its own lock, so the connection may be shared across threads.
+        connection = sqlite3.connect(self.database_path, timeout=30, isolation_level=None, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute(
+            "CREATE TABLE IF NOT EXISTS transfers ("
+            "hash TEXT PRIMARY KEY, "
+            "bt_hash TEXT NOT NULL DEFAULT '', "
+            "is_skipped INTEGER NOT NULL DEFAULT 0, "
+            "is_torrent_in_home_dl INTEGER NOT NULL DEFAULT 0, "
+            "seedbox_origin_data_status TEXT NOT NULL DEFAULT '', "
+            "data TEXT NOT NULL)"
+        )
+        for field in INDEXED_FIELDS:
+            if field == "hash":
+                continue
+            connection.execute(f"CREATE INDEX IF NOT EXISTS idx_transfers_{field} ON transfers ({field})")
+        connection.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._connection = connection
+        return connection
+
+    @staticmethod
+    def _row(transfer: TorrentTransferView) -> tuple:
+        return (
+            transfer.hash,
+            transfer.bt_hash,
+            int(transfer.is_skipped),
+            int(transfer.is_torrent_in_home_dl),
+            transfer.seedbox_origin_data_status,
+            json_codec.dumps(transfer.to_dict()).decode("utf-8"),
+        )
+
+    def _upsert(self, connection: sqlite3.Connection, transfers) -> int:
+        rows = [self._row(transfer) for transfer in transfers]
+        connection.executemany("INSERT OR REPLACE INTO transfers VALUES (?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def load(self) -> Dict[str, TorrentTransfer]:
+        """Load transfer status from the database, migrating torrent_info.json on first use."""
+        with self.locked():
+            try:
+                connection = self._connect()
+                self._migrate_from_json(connection)
+                return self._read(connection)
+            except Exception as e:
+                logger.error(f"Failed to load transfer database: {self.database_path} - {e}")
+                return {}
+
+    def _read(self, connection: sqlite3.Connection) -> Dict[str, TorrentTransfer]:
+        self._data_version = connection.execute("PRAGMA data_version").fetchone()[0]
+        transfer_status_dict: Dict[str, TorrentTransfer] = {}
+        for info_hash, data in connection.execute("SELECT hash, data FROM transfers"):
+            try:
+                transfer_status_dict[info_hash] = TorrentTransfer(**json_codec.loads(data))
+            except Exception as e:
+                logger.error(f"Error creating TorrentTransfer from row: {info_hash} - {e}")
+        return transfer_status_dict
+
+    def read_changes(self) -> Optional[Tuple[bool, ExternalChanges]]:
+        """Reload the table once another process has committed to it."""
+        connection = self._connect()
+        if connection.execute("PRAGMA data_version").fetchone()[0] == self._data_version:
+            return None
+        with self.locked(fcntl.LOCK_SH):
+            return True, self._read(connection)
+
+    def _migrate_from_json(self, connection: sqlite3.Connection):
+        """One-shot import of an existing torrent_info.json (plus journal) into an empty database."""
+        if connection.execute("SELECT 1 FROM meta WHERE key = 'json_migrated'").fetchone():
+            return
+
+        json_storage = JsonStateStorage(self.transfer_file_path)
+        has_json_state = os.path.exists(json_storage.transfer_file_path) or os.path.exists(
+            json_storage.transfer_journal_path
+        )
+        # The caller already holds the state lock, so read without taking it again.
+        transfers = json_storage._read() if has_json_state else {}
+
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            migrated = self._upsert(connection, map(TorrentTransferView.from_transfer, transfers.values()))
+            connection.execute("INSERT OR REPLACE INTO meta VALUES ('json_migrated', ?)", (self.transfer_file_path,))
+            connection.execute("COMMIT")
+        except Exception:
+            connection.execute("ROLLBACK")
+            raise
+        if migrated:
+            logger.info(f"Migrated {migrated} transfers from {self.transfer_file_path} into {self.database_path}")
+
+    def write(self, mutations: Mutations, transfers: Dict[str, TorrentTransferView]):
+        with self.locked():
+            try:
+                connection = self._connect()
+                connection.execute("BEGIN IMMEDIATE")
+                try:
+                    self._upsert(connection, [transfer for transfer in mutations.values() if transfer is not None])
+                    connection.executemany(
+                        "DELETE FROM transfers WHERE hash = ?",
+                        [(info_hash,) for info_hash, transfer in mutations.items() if transfer is None],
+                    )
+                    connection.execute("COMMIT")
+                except Exception:
+                    connection.execute("ROLLBACK")
+                    raise
+            except Exception as e:
+                logger.error(f"Failed to write transfer database: {self.database_path} - {e}")
+
+    def compact(self, transfers: Dict[str, TorrentTransferView]):
+        with self.locked():
+            try:
+                connection = self._connect()
+                connection.execute("BEGIN IMMEDIATE")
+                try:
+                    connection.execute("DELETE FROM transfers")
+                    self._upsert(connection, transfers.values())
+                    connection.execute("COMMIT")
+                except Exception:
+                    connection.execute("ROLLBACK")
+                    raise
+            except Exception as e:
+                logger.error(f"Failed to save transfer database: {self.database_path} - {e}")
+
+    def query_hashes(self, filters: dict) -> List[str]:
+        clauses = []
+        params = []
+        for field, value in filters.items():
+            clauses.append(f"{field} = ?")
+            params.append(int(value) if isinstance(value, bool) else value)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        return [row[0] for row in self._connect().execute(f"SELECT hash FROM transfers{where}", params)]
+
+
+SHARD_BY_SEED_BOX = "seed_box"
+SHARD_BY_HASH_PREFIX = "hash_prefix"
+
+# Shard holding transfers without a shard key; it lives in the unsharded state file, so existing state is read as-is.
+DEFAULT_SHARD = ""
+
+
+def _shard_key_function(shard_by: str) -> Callable[[TorrentTransferView], str]:
+    if shard_by == SHARD_BY_SEED_BOX:
+        return lambda transfer: transfer.seed_box_name
+    if shard_by == SHARD_BY_HASH_PREFIX:
+        return lambda transfer: transfer.hash[:1].lower()
+    raise ValueError(f"Unsupported state shard key: {shard_by}")
+
+
+def shard_file_path(transfer_file_path: str, shard: str) -> str:
+    """torrent_info.json -> torrent_info.<shard>.json; the default shard keeps the original path."""
+    if shard == DEFAULT_SHARD:
+        return transfer_file_path
+    root, ext = os.path.splitext(transfer_file_path)
+    return f"{root}.{re.sub(r'[^A-Za-z0-9_.-]', '_', shard)}{ext}"
+
+
+class _ShardTransfers(Mapping):
+    """Lazy read-only view of the transfers stored in one shard, handed to a shard when it compacts."""
+
+    def __init__(self, transfers: Dict[str, TorrentTransferView], shard_of: Dict[str, str], shard: str):
+        self._transfers = transfers
+        self._shard_of = shard_of
+        self._shard = shard
+
+    def __getitem__(self, info_hash):
+        if self._shard_of.get(info_hash) != self._shard:
+            raise KeyError(info_hash)
+        return self._transfers[info_hash]
+
+    def __iter__(self):
+        return (info_hash for info_hash in self._transfers if self._shard_of.get(info_hash) == self._shard)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+
+class ShardedStateStorage(StateStorage):
+    """Transfers spread over one storage per shard (per seedbox or per hash prefix), each with its own lock.
+
+    Processes that write disjoint shards no longer serialize on one lock file. StateManager still keeps the
+    merged state in memory, so reads and queries see every shard. A transfer whose shard key changes, e.g.
+    when a seedbox claims it, moves to its new shard on the next write.
+    """
+
+    def __init__(
+        self,
+        transfer_file_path: str,
+        shard_by: str,
+        storage_factory: Callable[[str], StateStorage],
+        shard_names: Iterable[str] = (),
+    ):
+        super().__init__(transfer_file_path)
+        self.shard_by = shard_by
+        self._shard_key = _shard_key_function(shard_by)
+        self._storage_factory = storage_factory
+        self._shards: Dict[str, StateStorage] = {}
+        # Shard each stored transfer was last read from or written to.
+        self._shard_of: Dict[str, str] = {}
+        # Shards whose locks are held; while set, catching up only reads those shards.
+        self._held_shards: Optional[List[str]] = None
+        if shard_by == SHARD_BY_HASH_PREFIX:
+            shard_names = [*shard_names, *"0123456789abcdef"]
+        for shard in [DEFAULT_SHARD, *shard_names]:
+            self._shard(shard)
+        self.supports_query = self._shards[DEFAULT_SHARD].supports_query
+
+    def _shard(self, shard: str) -> StateStorage:
+        storage = self._shards.get(shard)
+        if storage is None:
+            storage = self._storage_factory(shard_file_path(self.transfer_file_path, shard))
+            self._shards[shard] = storage
+        return storage
+
+    @contextmanager
+    def _locked_shards(self, shards, lock_type: int = fcntl.LOCK_EX):
+        if self._held_shards is not None:
+            yield
+            return
+        # A fixed order keeps processes that lock overlapping shards from deadlocking.
+        shards = sorted(set(shards))
+        with ExitStack() as stack:
+            for shard in shards:
+                stack.enter_context(self._shard(shard).locked(lock_type))
+            self._held_shards = shards
+            try:
+                yield
+            finally:
+                self._held_shards = None
+
+    def locked(self, lock_type: int = fcntl.LOCK_EX):
+        return self._locked_shards(list(self._shards), lock_type)
+
+    def locked_for(self, mutations: Mutations):
+        return self._locked_shards(self._target_shards(mutations))
+
+    def _target_shards(self, mutations: Mutations) -> List[str]:
+        shards = []
+        for info_hash, transfer in mutations.items():
+            if transfer is not None:
+                shards.append(self._shard_key(transfer))
+            if info_hash in self._shard_of:
+                shards.append(self._shard_of[info_hash])
+        return shards
+
+    def load(self) -> Dict[str, TorrentTransfer]:
+        transfers: Dict[str, TorrentTransfer] = {}
+        self._shard_of = {}
+        for shard, storage in list(self._shards.items()):
+            for info_hash, transfer in storage.load().items():
+                # A crash while moving a transfer can leave it in two shards; the copy in its own shard is newer.
+                if info_hash in transfers and self._shard_key(transfer) != shard:
+                    continue
+                transfers[info_hash] = transfer
+                self._shard_of[info_hash] = shard
+        return transfers
+
+    def read_changes(self) -> Optional[Tuple[bool, ExternalChanges]]:
+        """Merge the changes of every shard, or only of the locked ones while writing them."""
+        merged: ExternalChanges = {}
+        shards = self._held_shards if self._held_shards is not None else list(self._shards)
+        for shard in shards:
+            changes = self._shards[shard].read_changes()
+            if changes is None:
+                continue
+            full_reload, transfers = changes
+            if full_reload:
+                # A full reload only replaces this shard; hashes it no longer holds were deleted or moved.
+                transfers = dict(transfers)
+                for info_hash, stored_shard in self._shard_of.items():
+                    if stored_shard == shard and info_hash not in transfers:
+                        transfers[info_hash] = None
+            for info_hash, transfer in transfers.items():
+                if transfer is not None:
+                    self._shard_of[info_hash] = shard
+                    merged[info_hash] = transfer
+                elif self._shard_of.get(info_hash) == shard:
+                    del self._shard_of[info_hash]
+                    merged.setdefault(info_hash, None)
+        return (False, merged) if merged else None
+
+    def write(self, mutations: Mutations, transfers: Dict[str, TorrentTransferView]):
+        with self.locked_for(mutations):
+            by_shard: Dict[str, Mutations] = {}
+            # Removals from the shard a transfer moved out of; written last, so an interrupted move leaves a
+            # duplicate that load() resolves rather than losing the transfer.
+            moved_out: Dict[str, Mutations] = {}
+            for info_hash, transfer in mutations.items():
+                previous_shard = self._shard_of.get(info_hash)
+                if transfer is None:
+                    if previous_shard is not None:
+                        by_shard.setdefault(previous_shard, {})[info_hash] = None
+                        del self._shard_of[info_hash]
+                    continue
+                shard = self._shard_key(transfer)
+                by_shard.setdefault(shard, {})[info_hash] = transfer
+                if previous_shard is not None and previous_shard != shard:
+                    moved_out.setdefault(previous_shard, {})[info_hash] = None
+                self._shard_of[info_hash] = shard
+            for shard_mutations in (by_shard, moved_out):
+                for shard, mutations_of_shard in shard_mutations.items():
+                    self._shard(shard).write(mutations_of_shard, _ShardTransfers(transfers, self._shard_of, shard))
+
+    def compact(self, transfers: Dict[str, TorrentTransferView]):
+        with self.locked():
+            for shard, storage in list(self._shards.items()):
+                storage.compact(_ShardTransfers(transfers, self._shard_of, shard))
+
+    def query_hashes(self, filters: dict) -> List[str]:
+        hashes = []
+        for shard, storage in list(self._shards.items()):
+            hashes.extend(
+                info_hash for info_hash in storage.query_hashes(filters) if self._shard_of.get(info_hash) == shard
+            )
+        return hashes
+
+
+def create_state_storage(
+    backend: str,
+    transfer_file_path: str,
+    journal_compact_threshold: int = DEFAULT_JOURNAL_COMPACT_THRESHOLD,
+    shard_by: Optional[str] = None,
+    shard_names: Iterable[str] = (),
+) -> StateStorage:
+    if shard_by:
+        return ShardedStateStorage(
+            transfer_file_path,
+            shard_by,
+            lambda shard_path: create_state_storage(backend, shard_path, journal_compact_threshold),
+            shard_names,
+        )
+    if backend == "json":
+        return JsonStateStorage(transfer_file_path, journal_compact_threshold)
+    if backend == "sqlite":
+        return SqliteStateStorage(transfer_file_path)
+    raise ValueError(f"Unsupported state backend: {backend}")
@@ -712,3 +712,35 @@ def test_home_force_rebuild_does_not_repeat_delete_after_state_is_reset(tmp_path
 
     assert final_state.is_bt_in_home_dl is False
     assert client.delete_calls == []
+
+
+def test_home_targeted_pass_only_checks_changed_transfers(tmp_path, monkeypatch):
+    config = make_config(tmp_path)
+    Path(config.transfer.original_torrent_path).mkdir(parents=True, exist_ok=True)
+    Path(config.transfer.bt_path).mkdir(parents=True, exist_ok=True)
+    Path(tmp_path / "origin.torrent").write_text("origin", encoding="utf-8")
+    Path(tmp_path / "bt.torrent").write_text("bt", encoding="utf-8")
+
+    state_manager = StateManager(config.transfer.torrent_info_path)
+    state_manager.update(
+        TorrentTransfer(
+            hash="origin-hash",
+            bt_hash="bt-hash",
+            origin_torrent_file_path=str(tmp_path / "origin.torrent"),
+            bt_torrent_file_path=str(tmp_path / "bt.torrent"),
+        )
+    )
+
+    client = FakeHomeClient()
+    monkeypatch.setattr(
+        home_manager_module,
+        "get_downloader_client",
+        lambda **_kwargs: SimpleNamespace(client=client),
+    )
+    manager = HomeManager(config, state_manager, "seedbox", "home", "/downloads/home")
+
+    manager.run(changed_hashes={"other-hash"})
+    assert client.add_calls == []
+
+    manager.run(changed_hashes={"origin-hash"})
+    assert len(client.add_calls) == 1
@@ -0,0 +1,85 @@
+import os
+import time
+
+import pytest
+
+from utils.inotify_watcher import InotifyWatcher
+
+
+def wait_for_changes(watcher, expected, timeout=5):
+    changed = set()
+    rescan_needed = False
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        paths, rescan = watcher.drain()
+        changed |= paths
+        rescan_needed = rescan_needed or rescan
+        if expected <= changed:
+            break
+        time.sleep(0.05)
+    return changed, rescan_needed
+
+
+@pytest.fixture
+def watcher(tmp_path):
+    watcher = InotifyWatcher(str(tmp_path))
+    if not watcher.start():
+        pytest.skip("inotify is not available")
+    yield watcher
+    watcher.close()
+
+
+def test_watcher_reports_written_moved_and_deleted_torrents(tmp_path, watcher):
+    (tmp_path / "a.torrent").write_bytes(b"a")
+    (tmp_path / "b.torrent.tmp").write_bytes(b"b")
+    os.replace(tmp_path / "b.torrent.tmp", tmp_path / "b.torrent")
+    (tmp_path / "notes.txt").write_text("ignored", encoding="utf-8")
+
+    expected = {str(tmp_path / "a.torrent"), str(tmp_path / "b.torrent")}
+    changed, rescan_needed = wait_for_changes(watcher, expected)
+    assert changed == expected
+    assert not rescan_needed
+
+    (tmp_path / "a.torrent").unlink()
+    changed, _ = wait_for_changes(watcher, {str(tmp_path / "a.torrent")})
+    assert changed == {str(tmp_path / "a.torrent")}
+
+
+def test_watcher_follows_new_subdirectories(tmp_path, watcher):
+    subdirectory = tmp_path / "sub"
+    subdirectory.mkdir()
+    time.sleep(0.2)
+    (subdirectory / "c.torrent").write_bytes(b"c")
+
+    changed, _ = wait_for_changes(watcher, {str(subdirectory / "c.torrent")})
+    assert str(subdirectory / "c.torrent") in changed
+
+
+def test_watcher_keeps_following_a_directory_renamed_inside_the_tree(tmp_path, watcher):
+    (tmp_path / "sub").mkdir()
+    time.sleep(0.2)
+    (tmp_path / "sub").rename(tmp_path / "sub2")
+    time.sleep(0.2)
+    (tmp_path / "sub2" / "x.torrent").write_bytes(b"x")
+
+    changed, _ = wait_for_changes(watcher, {str(tmp_path / "sub2" / "x.torrent")})
+    assert str(tmp_path / "sub2" / "x.torrent") in changed
+    assert str(tmp_path / "sub2") in watcher._watch_dirs.values()
+
+
+def test_watcher_stops_when_root_is_moved_away(tmp_path):
+    root = tmp_path / "torrents"
+    root.mkdir()
+    watcher = InotifyWatcher(str(root))
+    if not watcher.start():
+        pytest.skip("inotify is not available")
+    try:
+        root.rename(tmp_path / "moved")
+
+        deadline = time.monotonic() + 5
+        while watcher.is_running() and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert not watcher.is_running()
+        assert watcher.drain()[1]
+    finally:
+        watcher.close()
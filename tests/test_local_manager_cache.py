@@ -1,4 +1,5 @@
 import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import managers.local_manager as local_manager_module
@@ -6,6 +7,7 @@ from managers.local_manager import LocalManager
 from managers.state_manager import StateManager
 from transfer.torrent_transfer import TorrentTransfer
 from utils.config import Config, Downloader, SeedBox, Transfer
+from utils.torrent_utils import TorrentFileCache
 
 
 class FakeTorrentFile:
@@ -104,3 +106,166 @@ def test_local_manager_logs_actionable_message_for_trailing_torrent_data(tmp_pat
     assert manager.failed_counts[str(torrent_path)] == 1
     assert "trailing data" in caplog.text
     assert "Re-download this origin torrent from seedbox" in caplog.text
+
+
+def test_local_manager_uses_torrent_parsed_during_seedbox_download(tmp_path, monkeypatch):
+    config = make_config(tmp_path)
+    Path(config.transfer.original_torrent_path).mkdir(parents=True, exist_ok=True)
+    Path(config.transfer.bt_path).mkdir(parents=True, exist_ok=True)
+    torrent_path = Path(config.transfer.original_torrent_path) / "hash-a.torrent"
+    torrent_path.write_text("torrent-data", encoding="utf-8")
+
+    state_manager = StateManager(config.transfer.torrent_info_path)
+    state_manager.update(
+        TorrentTransfer(
+            hash="hash-a",
+            origin_torrent_file_path=str(torrent_path),
+            bt_hash="bt-a",
+            bt_torrent_file_path=str(Path(config.transfer.bt_path) / "a.bt.torrent"),
+        )
+    )
+    FakeTorrentFile.calls = 0
+    parsed = FakeTorrentFile(str(torrent_path))
+    torrent_cache = TorrentFileCache()
+    torrent_cache.put(str(torrent_path), parsed)
+
+    monkeypatch.setattr(local_manager_module, "TorrentFile", FakeTorrentFile)
+
+    manager = LocalManager(config, state_manager, torrent_cache=torrent_cache)
+    manager.run(changed_hashes={"hash-a"})
+
+    assert FakeTorrentFile.calls == 1
+    assert torrent_cache.get(str(torrent_path)) is None
+
+
+def test_local_manager_scans_with_workers_and_commits_results_in_batches(tmp_path, monkeypatch):
+    config = make_config(tmp_path)
+    config.transfer.local_scan_workers = 2
+    config.transfer.local_scan_batch_size = 2
+    Path(config.transfer.original_torrent_path).mkdir(parents=True, exist_ok=True)
+    Path(config.transfer.bt_path).mkdir(parents=True, exist_ok=True)
+    for name in ("a", "b", "c", "bad"):
+        (Path(config.transfer.original_torrent_path) / f"{name}.torrent").write_text(name, encoding="utf-8")
+    # A second copy of the same origin torrent is committed only once
+    (Path(config.transfer.original_torrent_path) / "copy-of-a.torrent").write_text("a", encoding="utf-8")
+    exports = []
+
+    class ContentTorrentFile:
+        def __init__(self, file_path):
+            content = Path(file_path).read_text(encoding="utf-8")
+            if content == "bad":
+                raise ValueError("invalid torrent")
+            self.file_path = file_path
+            self.info_hash = f"hash-{content}"
+            self.torrent_data = {}
+
+    def fake_export(torrent_file_info, bt_path, _bt_trackers):
+        exports.append(torrent_file_info.info_hash)
+        bt_file_path = Path(bt_path) / f"{torrent_file_info.info_hash}.bt.torrent"
+        bt_file_path.write_text(torrent_file_info.info_hash, encoding="utf-8")
+        return str(bt_file_path), f"bt-{torrent_file_info.info_hash}"
+
+    monkeypatch.setattr(local_manager_module, "TorrentFile", ContentTorrentFile)
+    monkeypatch.setattr(local_manager_module, "export_bt_torrent", fake_export)
+
+    state_manager = StateManager(config.transfer.torrent_info_path)
+    state_manager.update(
+        TorrentTransfer(
+            hash="hash-c",
+            origin_torrent_file_path=str(Path(config.transfer.original_torrent_path) / "c.torrent"),
+            bt_hash="bt-c",
+            bt_torrent_file_path="c.bt",
+        )
+    )
+    writes = []
+    original_write = state_manager._write_mutations
+    monkeypatch.setattr(
+        state_manager, "_write_mutations", lambda mutations: (writes.append(set(mutations)), original_write(mutations))
+    )
+    manager = LocalManager(config, state_manager)
+    pools = []
+    # Worker threads run the same worker function, and see the patched module globals
+    monkeypatch.setattr(
+        manager,
+        "_create_scan_pool",
+        lambda: pools.append(ThreadPoolExecutor(max_workers=2)) or pools[-1],
+    )
+    manager.run()
+
+    reloaded = StateManager(config.transfer.torrent_info_path)
+    assert reloaded.get_view("hash-a").bt_hash == "bt-hash-a"
+    assert reloaded.get_view("hash-b").bt_hash == "bt-hash-b"
+    assert reloaded.get_view("hash-c").bt_hash == "bt-c"
+    assert set().union(*writes) == {"hash-a", "hash-b"}
+    assert all(len(written) <= config.transfer.local_scan_batch_size for written in writes)
+    assert manager.failed_counts[str(Path(config.transfer.original_torrent_path) / "bad.torrent")] == 1
+    # Each new file is parsed and exported by one task; the converted hash-c is only parsed
+    assert sorted(exports) == ["hash-a", "hash-a", "hash-b"]
+    bt_path = Path(config.transfer.bt_path)
+    assert sorted(path.name for path in bt_path.iterdir()) == ["hash-a.bt.torrent", "hash-b.bt.torrent"]
+    assert reloaded.get_view("hash-a").bt_torrent_file_path == str(bt_path / "hash-a.bt.torrent")
+
+    # The worker pool is kept for later scans and shut down with the manager
+    for name in ("d", "e"):
+        (Path(config.transfer.original_torrent_path) / f"{name}.torrent").write_text(name, encoding="utf-8")
+    manager.run()
+    assert state_manager.get_view("hash-e").bt_hash == "bt-hash-e"
+    assert len(pools) == 1
+    manager.close()
+    assert manager._scan_pool is None
+    assert pools[0]._shutdown
+
+
+def test_local_manager_only_handles_watched_changes_between_rescans(tmp_path, monkeypatch):
+    config = make_config(tmp_path)
+    Path(config.transfer.original_torrent_path).mkdir(parents=True, exist_ok=True)
+    Path(config.transfer.bt_path).mkdir(parents=True, exist_ok=True)
+    torrent_path = Path(config.transfer.original_torrent_path) / "a.torrent"
+    torrent_path.write_text("torrent-data", encoding="utf-8")
+    removed_path = Path(config.transfer.original_torrent_path) / "done.torrent"
+    removed_path.write_text("done-data", encoding="utf-8")
+
+    state_manager = StateManager(config.transfer.torrent_info_path)
+    state_manager.update(
+        TorrentTransfer(
+            hash="hash-done",
+            origin_torrent_file_path=str(removed_path),
+            bt_hash="bt-done",
+            bt_torrent_file_path="done.bt",
+            is_torrent_in_home_dl=True,
+        )
+    )
+
+    class FakeWatcher:
+        def __init__(self):
+            self.changes = []
+
+        def is_running(self):
+            return True
+
+        def drain(self):
+            return self.changes.pop(0) if self.changes else (set(), False)
+
+    FakeTorrentFile.calls = 0
+    monkeypatch.setattr(local_manager_module, "TorrentFile", FakeTorrentFile)
+    monkeypatch.setattr(
+        local_manager_module, "export_bt_torrent", lambda info, bt_path, _trackers: (f"{bt_path}/a.bt", "bt-a")
+    )
+    manager = LocalManager(config, state_manager)
+    manager.watcher = FakeWatcher()
+    manager.run()  # The first pass is a full scan
+    assert FakeTorrentFile.calls == 2
+    assert state_manager.get_view("hash-done") is not None
+
+    def fail_walk(_path):
+        raise AssertionError("os.walk should not run between rescans")
+
+    monkeypatch.setattr(local_manager_module.os, "walk", fail_walk)
+    removed_path.unlink()
+    torrent_path.write_text("rewritten", encoding="utf-8")
+    manager.watcher.changes.append(({str(torrent_path), str(removed_path)}, False))
+    manager.run()
+
+    assert FakeTorrentFile.calls == 3
+    assert state_manager.get_view("hash-done") is None
+    assert state_manager.get_view("hash-a").bt_hash == "bt-a"
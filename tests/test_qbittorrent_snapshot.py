@@ -1,6 +1,8 @@
 from types import SimpleNamespace
 
-from utils.qbittorrent_snapshot import QbittorrentSnapshot
+import pytest
+
+from utils.qbittorrent_snapshot import QbittorrentSnapshot, get_shared_snapshot
 
 
 class SyncClient:
@@ -126,3 +128,125 @@ def test_snapshot_fetches_trackers_on_demand_after_sync_refresh():
     assert len(trackers) == 1
     assert trackers[0].url == "udp://tracker.example:80"
     assert client.tracker_calls == [{"torrent_hashes": "a", "include_trackers": True}]
+
+
+def test_snapshot_shares_read_only_records_between_refreshes():
+    client = SyncClient()
+    snapshot = QbittorrentSnapshot(client)
+    snapshot.refresh()
+
+    torrent_a = snapshot.torrent("a")
+    assert snapshot.torrent("a") is torrent_a
+    assert snapshot.torrents() is snapshot.torrents()
+    with pytest.raises(AttributeError):
+        torrent_a.progress = 1.0
+
+    snapshot.refresh()
+
+    # The update replaces the record; readers holding the old one keep a consistent view
+    assert torrent_a.progress == 0.25
+    assert snapshot.torrent("a").progress == 0.75
+
+    client.sync_maindata = lambda rid=0, **_kwargs: {"rid": rid, "torrents": {}, "torrents_removed": []}
+    torrents = snapshot.torrents()
+    hashes = snapshot.hashes()
+    snapshot.refresh()
+    assert snapshot.torrents() is torrents
+    assert snapshot.hashes() is hashes
+
+
+def test_snapshot_indexes_follow_sync_deltas():
+    class IndexedSyncClient:
+        def __init__(self):
+            self.responses = [
+                {
+                    "rid": 1,
+                    "full_update": True,
+                    "torrents": {
+                        "a": {"category": "want", "state": "uploading", "progress": 1, "completion_on": 300},
+                        "b": {"category": "want", "state": "downloading", "progress": 0.5, "completion_on": -1},
+                        "c": {"category": "want", "state": "missingFiles", "progress": 1, "completion_on": 100},
+                        "d": {"category": "other", "state": "uploading", "progress": 1, "completion_on": 200},
+                    },
+                },
+                {
+                    "rid": 2,
+                    "torrents": {
+                        "b": {"state": "uploading", "progress": 1, "completion_on": 200},
+                        "c": {"state": "uploading"},
+                        "d": {"category": "want"},
+                    },
+                    "torrents_removed": ["a"],
+                },
+            ]
+
+        def sync_maindata(self, rid=0, **_kwargs):
+            return self.responses.pop(0)
+
+    snapshot = QbittorrentSnapshot(IndexedSyncClient())
+    snapshot.refresh()
+
+    assert [torrent.hash for torrent in snapshot.completed({"want"})] == ["c", "a"]
+    assert [torrent.hash for torrent in snapshot.completed({"want", "other"}, completed_before=200)] == ["c", "d"]
+    assert [torrent.hash for torrent in snapshot.completed({"want"}, hashes={"a", "b", "d", "x"})] == ["a"]
+    assert [torrent.hash for torrent in snapshot.completed({"want", "other"}, 200, hashes={"a", "c", "d"})] == [
+        "c",
+        "d",
+    ]
+    assert [torrent.hash for torrent in snapshot.by_state("missingFiles")] == ["c"]
+    assert {torrent.hash for torrent in snapshot.by_category("want")} == {"a", "b", "c"}
+
+    snapshot.refresh()
+
+    assert [torrent.hash for torrent in snapshot.completed({"want"})] == ["c", "b", "d"]
+    assert snapshot.completed({"other"}) == []
+    assert snapshot.by_state("missingFiles") == []
+    assert {torrent.hash for torrent in snapshot.by_state("uploading")} == {"b", "c", "d"}
+    assert {torrent.hash for torrent in snapshot.by_category("want")} == {"b", "c", "d"}
+
+
+def test_snapshot_keeps_only_projected_fields():
+    class VerboseSyncClient:
+        def __init__(self):
+            self.responses = [
+                {
+                    "rid": 1,
+                    "full_update": True,
+                    "torrents": {"a": {"name": "A", "progress": 0.5, "dlspeed": 1024, "eta": 60}},
+                },
+                {"rid": 2, "torrents": {"a": {"dlspeed": 2048, "eta": 30}}},
+                {"rid": 3, "torrents": {"a": {"progress": 1, "eta": 0}}},
+            ]
+
+        def sync_maindata(self, rid=0, **_kwargs):
+            return self.responses.pop(0)
+
+    snapshot = QbittorrentSnapshot(VerboseSyncClient(), fields=("name", "progress"))
+    snapshot.refresh()
+    torrent = snapshot.torrent("a")
+    assert torrent.to_dict() == {"hash": "a", "name": "A", "progress": 0.5}
+
+    # A delta of dropped fields only leaves the record untouched
+    snapshot.refresh()
+    assert snapshot.torrent("a") is torrent
+
+    snapshot.refresh()
+    assert snapshot.torrent("a").to_dict() == {"hash": "a", "name": "A", "progress": 1}
+
+
+def test_shared_snapshot_refreshes_once_per_interval_and_fans_out_deltas():
+    client = SyncClient()
+    snapshot = get_shared_snapshot(client)
+    assert get_shared_snapshot(client) is snapshot
+
+    deltas = []
+    snapshot.subscribe(lambda changed_hashes, full_update: deltas.append((set(changed_hashes), full_update)))
+
+    snapshot.refresh()
+    snapshot.refresh()
+    assert client.calls == 1
+
+    snapshot.refresh(force=True)
+    assert client.calls == 2
+    assert deltas == [({"a", "b"}, True), ({"a", "b", "c"}, False)]
+    assert snapshot.hashes() == {"a", "c"}
@@ -3,7 +3,8 @@ import time
 from types import SimpleNamespace
 
 import main as main_module
-from main import run_once_cycle, try_acquire_lock, wait_for_next_run
+from main import run_manager_loop, run_once_cycle, try_acquire_lock, wait_for_next_run
+from utils.work_queue import WorkQueue, notify
 
 
 class Recorder:
@@ -69,13 +70,20 @@ def test_main_run_once_acquires_lock_before_state_manager_init(monkeypatch, tmp_
             local_interval=1,
             seedbox_interval=1,
             home_interval=1,
-        )
+            state_flush_interval=0,
+            state_backend="json",
+            state_shard_by=None,
+        ),
+        seed_box=[SimpleNamespace(name="seedbox", home_dl_name=None)],
     )
 
     class DummyStateManager:
-        def __init__(self, _path):
+        def __init__(self, _path, **_kwargs):
             order.append("state")
 
+        def flush(self):
+            order.append("flush")
+
     class DummyManager:
         def __init__(self, *_args, **_kwargs):
             pass
@@ -83,6 +91,9 @@ def test_main_run_once_acquires_lock_before_state_manager_init(monkeypatch, tmp_
         def run(self):
             return None
 
+        def close(self):
+            return None
+
     monkeypatch.setattr(main_module.YAMLConfigHandler, "load", staticmethod(lambda _path: config))
     monkeypatch.setattr(main_module, "ensure_directory_exists", lambda _path: None)
     monkeypatch.setattr(main_module, "try_acquire_lock", lambda _path: order.append("lock") or object())
@@ -115,14 +126,18 @@ def test_main_run_once_short_circuits_when_lock_not_acquired(monkeypatch, tmp_pa
             local_interval=1,
             seedbox_interval=1,
             home_interval=1,
-        )
+            state_flush_interval=0,
+            state_backend="json",
+            state_shard_by=None,
+        ),
+        seed_box=[SimpleNamespace(name="seedbox", home_dl_name=None)],
     )
 
     monkeypatch.setattr(main_module.YAMLConfigHandler, "load", staticmethod(lambda _path: config))
     monkeypatch.setattr(main_module, "ensure_directory_exists", lambda _path: None)
     monkeypatch.setattr(main_module, "try_acquire_lock", lambda _path: None)
     monkeypatch.setattr(main_module, "release_lock", lambda _handle: None)
-    monkeypatch.setattr(main_module, "StateManager", lambda _path: order.append("state"))
+    monkeypatch.setattr(main_module, "StateManager", lambda _path, **_kwargs: order.append("state"))
 
     main_module.main(
         "config.yaml",
@@ -152,3 +167,110 @@ def test_wait_for_next_run_returns_early_when_triggered():
     assert should_stop is False
     assert elapsed < 0.5
     assert trigger_event.is_set() is False
+
+
+def test_work_queue_drains_hashes_and_set_requests_full_pass():
+    queue = WorkQueue()
+    queue.put(["b", "a"])
+    queue.put(["a"])
+    queue.clear()
+
+    assert queue.is_set() is False
+    assert queue.drain() == {"a", "b"}
+    assert queue.drain() == set()
+
+    queue.put(["c"])
+    queue.set()
+    assert queue.is_set() is True
+    assert queue.drain() is None
+    assert queue.is_set() is False
+
+
+def test_run_manager_loop_runs_targeted_pass_for_queued_hashes():
+    shutdown_event = threading.Event()
+    queue = WorkQueue()
+    calls = []
+
+    class Manager:
+        def run(self, changed_hashes=None):
+            calls.append(changed_hashes)
+            if changed_hashes is None:
+                queue.put(["origin-hash"])
+            else:
+                shutdown_event.set()
+
+    start = time.monotonic()
+    run_manager_loop(Manager(), "Manager", 30, shutdown_event, queue)
+
+    assert calls == [None, {"origin-hash"}]
+    assert time.monotonic() - start < 5
+
+
+def test_main_run_once_drives_every_configured_seedbox_with_shared_state(monkeypatch, tmp_path):
+    created = []
+    cycles = []
+
+    config = SimpleNamespace(
+        transfer=SimpleNamespace(
+            original_torrent_path=str(tmp_path / "downloads"),
+            bt_path=str(tmp_path / "bt"),
+            torrent_info_path=str(tmp_path / "state.json"),
+            state_flush_interval=0,
+            state_backend="json",
+            state_shard_by=None,
+        ),
+        seed_box=[
+            SimpleNamespace(name="box-a", home_dl_name=None),
+            SimpleNamespace(name="box-b", home_dl_name="home-b"),
+        ],
+    )
+
+    class DummyStateManager:
+        def __init__(self, _path, **_kwargs):
+            pass
+
+        def flush(self):
+            return None
+
+    def dummy_manager(kind):
+        class DummyManager:
+            def __init__(self, *args, **kwargs):
+                self.args = args
+                self.kwargs = kwargs
+                created.append((kind, self))
+
+            def close(self):
+                return None
+
+        return DummyManager
+
+    monkeypatch.setattr(main_module.YAMLConfigHandler, "load", staticmethod(lambda _path: config))
+    monkeypatch.setattr(main_module, "ensure_directory_exists", lambda _path: None)
+    monkeypatch.setattr(main_module, "try_acquire_lock", lambda _path: object())
+    monkeypatch.setattr(main_module, "release_lock", lambda _handle: None)
+    monkeypatch.setattr(main_module, "StateManager", DummyStateManager)
+    monkeypatch.setattr(main_module, "LocalManager", dummy_manager("local"))
+    monkeypatch.setattr(main_module, "SeedBoxManager", dummy_manager("seedbox"))
+    monkeypatch.setattr(main_module, "HomeManager", dummy_manager("home"))
+    monkeypatch.setattr(main_module, "run_once_cycle", lambda *args, **_kwargs: cycles.append(args))
+
+    main_module.main("config.yaml", None, "home-a", "/downloads", run_once=True)
+
+    seedbox_managers = [manager for kind, manager in created if kind == "seedbox"]
+    home_managers = [manager for kind, manager in created if kind == "home"]
+    assert [manager.args[2:4] for manager in seedbox_managers] == [("box-a", "home-a"), ("box-b", "home-b")]
+    assert [manager.args[2:4] for manager in home_managers] == [("box-a", "home-a"), ("box-b", "home-b")]
+    assert len({id(manager.args[1]) for _kind, manager in created}) == 1
+    local_manager = created[0][1]
+    assert local_manager.kwargs["trigger_seedbox"] == [manager.kwargs["trigger_seedbox"] for manager in home_managers]
+    assert cycles == [(local_manager, seedbox_managers, home_managers)]
+
+
+def test_notify_fans_hashes_out_to_a_list_of_triggers():
+    queues = [WorkQueue(), WorkQueue()]
+    event = threading.Event()
+
+    notify(queues + [event], iter(["origin-hash"]))
+
+    assert [queue.drain() for queue in queues] == [{"origin-hash"}, {"origin-hash"}]
+    assert event.is_set()
@@ -1,4 +1,5 @@
 import threading
+import time
 from pathlib import Path
 from types import SimpleNamespace
 
@@ -7,6 +8,7 @@ from managers.seedbox_manager import SeedBoxManager
 from managers.state_manager import StateManager
 from transfer.torrent_transfer import TorrentTransfer
 from utils.config import Config, Downloader, SeedBox, Transfer
+from utils.work_queue import WorkQueue
 
 
 class FakeSeedboxClient:
@@ -22,7 +24,7 @@ class FakeSeedboxClient:
         if status == "completed":
             result = [torrent for torrent in result if getattr(torrent, "progress", 0) == 1]
         if torrent_hashes is not None:
-            result = [torrent for torrent in result if torrent.hash == torrent_hashes]
+            result = [torrent for torrent in result if torrent.hash in torrent_hashes.split("|")]
         if category is not None:
             result = [torrent for torrent in result if torrent.category == category]
         return result
@@ -50,6 +52,24 @@ class AddCreatesMissingFilesSeedboxClient(FakeSeedboxClient):
         return self.add_response
 
 
+class AddingSeedboxClient(FakeSeedboxClient):
+    """Seedbox that lists an added BT torrent, named after its .torrent file, as seeding."""
+
+    def __init__(self, torrents):
+        super().__init__(torrents, add_response="Ok.")
+        self.info_calls = []
+
+    def torrents_info(self, status=None, category=None, torrent_hashes=None):
+        self.info_calls.append(torrent_hashes)
+        return super().torrents_info(status=status, category=category, torrent_hashes=torrent_hashes)
+
+    def torrents_add(self, **kwargs):
+        self.add_calls.append(kwargs)
+        bt_hash = Path(kwargs["torrent_files"]).stem
+        self._torrents.append(make_torrent_with_state(bt_hash, "BT", 1, "uploading"))
+        return self.add_response
+
+
 class MissingTorrentSFTPClient:
     def __init__(self, **_kwargs):
         pass
@@ -57,7 +77,10 @@ class MissingTorrentSFTPClient:
     def connect(self):
         return None
 
-    def download(self, *_args, **_kwargs):
+    def listdir_attr(self, _remote_dir):
+        return {}
+
+    def fetch(self, *_args, **_kwargs):
         raise FileNotFoundError("remote torrent missing")
 
     def close(self):
@@ -65,7 +88,7 @@ class MissingTorrentSFTPClient:
 
 
 class DownloadingSFTPClient:
-    download_calls = []
+    fetch_calls = []
     payload = b"downloaded"
 
     def __init__(self, **_kwargs):
@@ -74,9 +97,15 @@ class DownloadingSFTPClient:
     def connect(self):
         return None
 
-    def download(self, remote_file, local_file):
-        type(self).download_calls.append((remote_file, local_file))
-        Path(local_file).write_bytes(type(self).payload)
+    def is_alive(self):
+        return True
+
+    def listdir_attr(self, _remote_dir):
+        return {"origin-hash.torrent": (len(type(self).payload), 1700000000)}
+
+    def fetch(self, remote_file, **_kwargs):
+        type(self).fetch_calls.append(remote_file)
+        return type(self).payload
 
     def close(self):
         return None
@@ -418,13 +447,53 @@ def test_missing_remote_torrent_file_eventually_skips_placeholder_state(tmp_path
     assert "seedbox" in final_state.skip_reason.lower()
 
 
+def test_seedbox_batch_detects_missing_remote_torrents_from_directory_listing(tmp_path, monkeypatch):
+    config = make_config(tmp_path, auto_dl_torrent_from_seedbox=True)
+    Path(config.transfer.original_torrent_path).mkdir(parents=True, exist_ok=True)
+    Path(config.transfer.bt_path).mkdir(parents=True, exist_ok=True)
+    DownloadingSFTPClient.fetch_calls = []
+    DownloadingSFTPClient.payload = b"listed"
+
+    class FakeTorrentFile:
+        def __init__(self, file_path):
+            self.file_path = file_path
+
+        @classmethod
+        def from_bytes(cls, _data, file_path):
+            return cls(file_path)
+
+    monkeypatch.setattr(
+        seedbox_manager_module,
+        "get_downloader_client",
+        lambda **_kwargs: SimpleNamespace(client=FakeSeedboxClient([])),
+    )
+    monkeypatch.setattr(seedbox_manager_module, "SFTPClient", DownloadingSFTPClient)
+    monkeypatch.setattr(seedbox_manager_module, "TorrentFile", FakeTorrentFile)
+
+    manager = SeedBoxManager(
+        config,
+        StateManager(config.transfer.torrent_info_path),
+        "seedbox",
+        "home",
+        threading.Event(),
+        async_downloads=False,
+    )
+    manager._batch_download_torrents_from_seedbox({"origin-hash": [], "unlisted-hash": []})
+
+    assert DownloadingSFTPClient.fetch_calls == ["/remote/torrents/origin-hash.torrent"]
+    final_states = StateManager(config.transfer.torrent_info_path)
+    assert final_states.get("origin-hash").download_retry_count == 0
+    assert final_states.get("unlisted-hash").download_retry_count == 1
+    assert "missing" in final_states.get("unlisted-hash").last_error
+
+
 def test_seedbox_download_replaces_corrupt_existing_local_torrent(tmp_path, monkeypatch):
     config = make_config(tmp_path, auto_dl_torrent_from_seedbox=True)
     Path(config.transfer.original_torrent_path).mkdir(parents=True, exist_ok=True)
     Path(config.transfer.bt_path).mkdir(parents=True, exist_ok=True)
     local_torrent_path = Path(config.transfer.original_torrent_path) / "origin-hash.torrent"
     local_torrent_path.write_bytes(b"corrupt-local")
-    DownloadingSFTPClient.download_calls = []
+    DownloadingSFTPClient.fetch_calls = []
     DownloadingSFTPClient.payload = b"fresh-remote"
 
     monkeypatch.setattr(
@@ -447,12 +516,19 @@ def test_seedbox_download_replaces_corrupt_existing_local_torrent(tmp_path, monk
                 )
             self.trackers = []
 
+        @classmethod
+        def from_bytes(cls, data, file_path):
+            instance = cls.__new__(cls)
+            instance.file_path = file_path
+            instance.data = data
+            instance.trackers = []
+            return instance
+
         def add_trackers(self, _trackers):
             return None
 
-        def save(self, save_path):
-            Path(save_path).write_bytes(Path(save_path).read_bytes())
-            return True
+        def to_bytes(self):
+            return self.data
 
     monkeypatch.setattr(seedbox_manager_module, "TorrentFile", FakeTorrentFile)
 
@@ -466,10 +542,11 @@ def test_seedbox_download_replaces_corrupt_existing_local_torrent(tmp_path, monk
     )
     manager.run()
 
-    assert DownloadingSFTPClient.download_calls == [
-        ("/remote/torrents/origin-hash.torrent", str(local_torrent_path) + ".tmp")
-    ]
+    assert DownloadingSFTPClient.fetch_calls == ["/remote/torrents/origin-hash.torrent"]
     assert local_torrent_path.read_bytes() == b"fresh-remote"
+    assert not Path(str(local_torrent_path) + ".tmp").exists()
+    # The parsed torrent is handed over so the file is not decoded again
+    assert manager.torrent_cache.get(str(local_torrent_path)).data == b"fresh-remote"
     final_state = StateManager(config.transfer.torrent_info_path).get("origin-hash")
     assert final_state.origin_torrent_file_path == str(local_torrent_path)
     assert final_state.download_retry_count == 0
@@ -480,7 +557,7 @@ def test_seedbox_download_rejects_invalid_remote_torrent_before_replace(tmp_path
     Path(config.transfer.original_torrent_path).mkdir(parents=True, exist_ok=True)
     Path(config.transfer.bt_path).mkdir(parents=True, exist_ok=True)
     local_torrent_path = Path(config.transfer.original_torrent_path) / "origin-hash.torrent"
-    DownloadingSFTPClient.download_calls = []
+    DownloadingSFTPClient.fetch_calls = []
     DownloadingSFTPClient.payload = b"invalid-remote"
 
     monkeypatch.setattr(
@@ -494,6 +571,10 @@ def test_seedbox_download_rejects_invalid_remote_torrent_before_replace(tmp_path
         def __init__(self, file_path):
             raise ValueError(f"cannot parse {file_path}")
 
+        @classmethod
+        def from_bytes(cls, _data, file_path):
+            return cls(file_path)
+
     monkeypatch.setattr(seedbox_manager_module, "TorrentFile", FakeTorrentFile)
 
     manager = SeedBoxManager(
@@ -511,6 +592,214 @@ def test_seedbox_download_rejects_invalid_remote_torrent_before_replace(tmp_path
     assert final_state.download_retry_count == 1
     assert "cannot parse" in final_state.last_error
 
+    # The remote file is unchanged per the directory listing, so it is not fetched again
+    manager._batch_download_torrents_from_seedbox({"origin-hash": []})
+    final_state = StateManager(config.transfer.torrent_info_path).get("origin-hash")
+    assert DownloadingSFTPClient.fetch_calls == ["/remote/torrents/origin-hash.torrent"]
+    assert final_state.download_retry_count == 2
+    assert "cannot parse" in final_state.last_error
+
+
+def test_seedbox_download_resumes_from_partial_file_after_interrupted_transfer(tmp_path, monkeypatch):
+    config = make_config(tmp_path, auto_dl_torrent_from_seedbox=True)
+    Path(config.transfer.original_torrent_path).mkdir(parents=True, exist_ok=True)
+    Path(config.transfer.bt_path).mkdir(parents=True, exist_ok=True)
+    part_path = Path(config.transfer.original_torrent_path) / "origin-hash.torrent.part"
+
+    class InterruptedSFTPClient:
+        resume_calls = []
+
+        def __init__(self, **_kwargs):
+            pass
+
+        def connect(self):
+            return None
+
+        def is_alive(self):
+            return True
+
+        def listdir_attr(self, _remote_dir):
+            return {"origin-hash.torrent": (len(b"full-torrent"), 1700000000)}
+
+        def fetch(self, remote_file, resume_data=b"", **_kwargs):
+            type(self).resume_calls.append(resume_data)
+            if not resume_data:
+                raise seedbox_manager_module.PartialTransferError(remote_file, b"full-", EOFError("dropped"))
+            return resume_data + b"torrent"
+
+        def close(self):
+            return None
+
+    class FakeTorrentFile:
+        def __init__(self, file_path):
+            self.file_path = file_path
+
+        @classmethod
+        def from_bytes(cls, _data, file_path):
+            return cls(file_path)
+
+    monkeypatch.setattr(
+        seedbox_manager_module,
+        "get_downloader_client",
+        lambda **_kwargs: SimpleNamespace(client=FakeSeedboxClient([])),
+    )
+    monkeypatch.setattr(seedbox_manager_module, "SFTPClient", InterruptedSFTPClient)
+    monkeypatch.setattr(seedbox_manager_module, "TorrentFile", FakeTorrentFile)
+
+    manager = SeedBoxManager(
+        config,
+        StateManager(config.transfer.torrent_info_path),
+        "seedbox",
+        "home",
+        threading.Event(),
+        async_downloads=False,
+    )
+    manager._batch_download_torrents_from_seedbox({"origin-hash": []})
+
+    assert part_path.read_bytes() == b"full-"
+    assert StateManager(config.transfer.torrent_info_path).get("origin-hash").download_retry_count == 1
+
+    manager._batch_download_torrents_from_seedbox({"origin-hash": []})
+
+    assert InterruptedSFTPClient.resume_calls == [b"", b"full-"]
+    assert not part_path.exists()
+    local_torrent_path = Path(config.transfer.original_torrent_path) / "origin-hash.torrent"
+    assert local_torrent_path.read_bytes() == b"full-torrent"
+    assert StateManager(config.transfer.torrent_info_path).get("origin-hash").download_retry_count == 0
+
+
+def test_seedbox_downloads_run_concurrently_with_per_hash_failure_accounting(tmp_path, monkeypatch):
+    config = make_config(tmp_path, auto_dl_torrent_from_seedbox=True)
+    Path(config.transfer.original_torrent_path).mkdir(parents=True, exist_ok=True)
+    Path(config.transfer.bt_path).mkdir(parents=True, exist_ok=True)
+    # Both good downloads must be in flight at the same time to pass the barrier.
+    barrier = threading.Barrier(2, timeout=5)
+
+    class ConcurrentSFTPClient:
+        init_kwargs = {}
+
+        def __init__(self, **kwargs):
+            type(self).init_kwargs = kwargs
+
+        def connect(self):
+            return None
+
+        def listdir_attr(self, _remote_dir):
+            # missing-hash is absent from the listing and from the directory itself
+            return {"hash-a.torrent": (10, 1), "hash-b.torrent": (10, 1)}
+
+        def fetch(self, remote_file, **_kwargs):
+            if "missing-hash" in remote_file:
+                raise FileNotFoundError("remote torrent missing")
+            barrier.wait()
+            return b"downloaded"
+
+        def close(self):
+            return None
+
+    class FakeTorrentFile:
+        def __init__(self, file_path):
+            self.file_path = file_path
+
+        @classmethod
+        def from_bytes(cls, _data, file_path):
+            return cls(file_path)
+
+    torrents = [make_torrent(info_hash, "To", 1) for info_hash in ("hash-a", "hash-b", "missing-hash")]
+    monkeypatch.setattr(
+        seedbox_manager_module,
+        "get_downloader_client",
+        lambda **_kwargs: SimpleNamespace(client=FakeSeedboxClient(torrents)),
+    )
+    monkeypatch.setattr(seedbox_manager_module, "SFTPClient", ConcurrentSFTPClient)
+    monkeypatch.setattr(seedbox_manager_module, "TorrentFile", FakeTorrentFile)
+
+    manager = SeedBoxManager(
+        config,
+        StateManager(config.transfer.torrent_info_path),
+        "seedbox",
+        "home",
+        threading.Event(),
+        async_downloads=False,
+    )
+    manager.run()
+
+    assert ConcurrentSFTPClient.init_kwargs["max_channels"] == config.seed_box[0].sftp_concurrency
+    final_states = StateManager(config.transfer.torrent_info_path)
+    for info_hash in ("hash-a", "hash-b"):
+        assert (Path(config.transfer.original_torrent_path) / f"{info_hash}.torrent").read_bytes() == b"downloaded"
+        assert final_states.get(info_hash).download_retry_count == 0
+    assert final_states.get("missing-hash").download_retry_count == 1
+    assert "missing" in final_states.get("missing-hash").last_error
+
+
+def test_seedbox_batches_reuse_warm_sftp_session_and_reconnect_when_dead(tmp_path, monkeypatch):
+    config = make_config(tmp_path, auto_dl_torrent_from_seedbox=True)
+    Path(config.transfer.original_torrent_path).mkdir(parents=True, exist_ok=True)
+    Path(config.transfer.bt_path).mkdir(parents=True, exist_ok=True)
+
+    class SessionSFTPClient:
+        instances = []
+
+        def __init__(self, **_kwargs):
+            self.connects = 0
+            self.closed = False
+            self.alive = True
+            type(self).instances.append(self)
+
+        def connect(self):
+            self.connects += 1
+
+        def is_alive(self):
+            return self.alive
+
+        def listdir_attr(self, _remote_dir):
+            return {f"hash-{name}.torrent": (10, 1) for name in "abc"}
+
+        def fetch(self, _remote_file, **_kwargs):
+            return b"downloaded"
+
+        def close(self):
+            self.closed = True
+
+    class FakeTorrentFile:
+        def __init__(self, file_path):
+            self.file_path = file_path
+
+        @classmethod
+        def from_bytes(cls, _data, file_path):
+            return cls(file_path)
+
+    monkeypatch.setattr(
+        seedbox_manager_module,
+        "get_downloader_client",
+        lambda **_kwargs: SimpleNamespace(client=FakeSeedboxClient([])),
+    )
+    monkeypatch.setattr(seedbox_manager_module, "SFTPClient", SessionSFTPClient)
+    monkeypatch.setattr(seedbox_manager_module, "TorrentFile", FakeTorrentFile)
+
+    manager = SeedBoxManager(
+        config,
+        StateManager(config.transfer.torrent_info_path),
+        "seedbox",
+        "home",
+        threading.Event(),
+        async_downloads=False,
+    )
+    manager._batch_download_torrents_from_seedbox({"hash-a": []})
+    manager._batch_download_torrents_from_seedbox({"hash-b": []})
+
+    assert len(SessionSFTPClient.instances) == 1
+    assert SessionSFTPClient.instances[0].connects == 1
+
+    SessionSFTPClient.instances[0].alive = False
+    manager._batch_download_torrents_from_seedbox({"hash-c": []})
+
+    assert len(SessionSFTPClient.instances) == 2
+    assert SessionSFTPClient.instances[0].closed is True
+    manager.close()
+    assert SessionSFTPClient.instances[1].closed is True
+
 
 def test_seedbox_bt_in_missing_files_state_is_treated_as_unusable(tmp_path, monkeypatch):
     config = make_config(tmp_path)
@@ -828,3 +1117,308 @@ def test_skip_policy_marks_missing_seedbox_source_skipped_without_deleting(tmp_p
     assert "missingFiles" in final_state.skip_reason
     assert client.delete_calls == []
     assert client.recheck_calls == []
+
+
+def test_seedbox_manager_only_handles_transfers_of_its_own_seedbox(tmp_path, monkeypatch):
+    config = make_config(tmp_path)
+    config.seed_box.append(config.seed_box[0].model_copy(update={"name": "seedbox-b"}))
+    Path(config.transfer.original_torrent_path).mkdir(parents=True, exist_ok=True)
+    Path(config.transfer.bt_path).mkdir(parents=True, exist_ok=True)
+
+    initial_state = StateManager(config.transfer.torrent_info_path)
+    for info_hash, owner in (("other-hash", "seedbox-b"), ("stray-hash", ""), ("origin-hash", "")):
+        initial_state.update(
+            TorrentTransfer(
+                hash=info_hash,
+                seed_box_name=owner,
+                origin_torrent_file_path=str(tmp_path / f"{info_hash}.torrent"),
+                bt_hash=f"{info_hash}-bt",
+                bt_torrent_file_path=str(tmp_path / f"{info_hash}-bt.torrent"),
+                is_bt_in_seed_box=True,
+            )
+        )
+
+    monkeypatch.setattr(
+        seedbox_manager_module,
+        "get_downloader_client",
+        lambda **_kwargs: SimpleNamespace(client=FakeSeedboxClient([make_torrent("origin-hash", "Other", 1)])),
+    )
+
+    manager = SeedBoxManager(
+        config,
+        StateManager(config.transfer.torrent_info_path),
+        "seedbox",
+        "home",
+        threading.Event(),
+        async_downloads=False,
+    )
+    manager.run()
+
+    final_states = StateManager(config.transfer.torrent_info_path)
+    # The unassigned transfer found on this seedbox is claimed and synced
+    assert final_states.get("origin-hash").seed_box_name == "seedbox"
+    assert final_states.get("origin-hash").is_bt_in_seed_box is False
+    # Transfers of the other seedbox, and unassigned ones it may still claim, are left alone
+    for info_hash in ("other-hash", "stray-hash"):
+        assert final_states.get(info_hash).is_bt_in_seed_box is True
+        assert final_states.get(info_hash).missing_origin_retry_count == 0
+    assert final_states.get("stray-hash").seed_box_name == ""
+
+
+def test_torrent_completed_on_two_seedboxes_is_only_handled_by_its_owner(tmp_path, monkeypatch):
+    config = make_config(tmp_path)
+    config.seed_box.append(config.seed_box[0].model_copy(update={"name": "seedbox-b"}))
+    config.downloaders.append(config.downloaders[0].model_copy(update={"name": "seedbox-b"}))
+    Path(config.transfer.original_torrent_path).mkdir(parents=True, exist_ok=True)
+    Path(config.transfer.bt_path).mkdir(parents=True, exist_ok=True)
+    Path(tmp_path / "origin.torrent").write_text("origin", encoding="utf-8")
+    Path(tmp_path / "bt-hash.torrent").write_text("bt", encoding="utf-8")
+
+    initial_state = StateManager(config.transfer.torrent_info_path)
+    initial_state.update(
+        TorrentTransfer(
+            hash="origin-hash",
+            bt_hash="bt-hash",
+            origin_torrent_file_path=str(tmp_path / "origin.torrent"),
+            bt_torrent_file_path=str(tmp_path / "bt-hash.torrent"),
+        )
+    )
+
+    clients = {name: AddingSeedboxClient([make_completed_torrent()]) for name in ("seedbox", "seedbox-b")}
+    monkeypatch.setattr(
+        seedbox_manager_module,
+        "get_downloader_client",
+        lambda name, **_kwargs: SimpleNamespace(client=clients[name]),
+    )
+
+    state_manager = StateManager(config.transfer.torrent_info_path)
+    managers = [
+        SeedBoxManager(config, state_manager, name, "home", threading.Event(), async_downloads=False)
+        for name in ("seedbox", "seedbox-b")
+    ]
+    for _ in range(2):
+        for manager in managers:
+            manager.run()
+
+    state = state_manager.get("origin-hash")
+    assert state.seed_box_name == "seedbox"
+    assert state.is_bt_in_seed_box is True
+    assert len(clients["seedbox"].add_calls) == 1
+    assert clients["seedbox-b"].add_calls == []
+
+    state.is_torrent_in_home_dl = True
+    state_manager.update(state)
+    for manager in reversed(managers):
+        manager.run()
+
+    assert clients["seedbox-b"].delete_calls == []
+    assert {call["torrent_hashes"] for call in clients["seedbox"].delete_calls} == {"bt-hash", "origin-hash"}
+
+
+def test_seedbox_verifies_added_bt_torrents_in_one_query(tmp_path, monkeypatch):
+    config = make_config(tmp_path)
+    Path(config.transfer.original_torrent_path).mkdir(parents=True, exist_ok=True)
+    Path(config.transfer.bt_path).mkdir(parents=True, exist_ok=True)
+
+    initial_state = StateManager(config.transfer.torrent_info_path)
+    for name in ("a", "b"):
+        Path(tmp_path / f"origin-{name}.torrent").write_text("origin", encoding="utf-8")
+        Path(tmp_path / f"bt-{name}.torrent").write_text("bt", encoding="utf-8")
+        initial_state.update(
+            TorrentTransfer(
+                hash=f"origin-{name}",
+                bt_hash=f"bt-{name}",
+                origin_torrent_file_path=str(tmp_path / f"origin-{name}.torrent"),
+                bt_torrent_file_path=str(tmp_path / f"bt-{name}.torrent"),
+            )
+        )
+
+    client = AddingSeedboxClient([make_torrent("origin-a", "To", 1), make_torrent("origin-b", "To", 1)])
+    monkeypatch.setattr(
+        seedbox_manager_module,
+        "get_downloader_client",
+        lambda **_kwargs: SimpleNamespace(client=client),
+    )
+
+    manager = SeedBoxManager(
+        config,
+        StateManager(config.transfer.torrent_info_path),
+        "seedbox",
+        "home",
+        threading.Event(),
+        async_downloads=False,
+    )
+    manager.run()
+
+    final_state = StateManager(config.transfer.torrent_info_path)
+    assert len(client.add_calls) == 2
+    # One listing for the pass, then one batch query for both added BT torrents
+    assert client.info_calls == [None, "bt-a|bt-b"]
+    # The verified torrents are in the shared snapshot before its next refresh
+    assert {"bt-a", "bt-b"} <= manager.seed_box_snapshot.hashes()
+    assert final_state.get("origin-a").is_bt_in_seed_box is True
+    assert final_state.get("origin-b").is_bt_in_seed_box is True
+
+
+def test_running_batch_fetches_torrents_queued_later_at_high_priority_first(tmp_path, monkeypatch):
+    config = make_config(tmp_path, auto_dl_torrent_from_seedbox=True)
+    config.transfer.max_once_add = 1
+    config.seed_box[0].sftp_concurrency = 1
+    Path(config.transfer.original_torrent_path).mkdir(parents=True, exist_ok=True)
+    Path(config.transfer.bt_path).mkdir(parents=True, exist_ok=True)
+    fetching_first = threading.Event()
+    release_first = threading.Event()
+    fetch_calls = []
+
+    class BlockingSFTPClient(DownloadingSFTPClient):
+        def listdir_attr(self, _remote_dir):
+            return {f"{name}.torrent": (10, 1) for name in ("first", "normal-a", "normal-b", "urgent")}
+
+        def fetch(self, remote_file, **_kwargs):
+            fetch_calls.append(Path(remote_file).stem)
+            if len(fetch_calls) == 1:
+                fetching_first.set()
+                release_first.wait(5)
+            return b"downloaded"
+
+    class FakeTorrentFile:
+        def __init__(self, file_path):
+            self.file_path = file_path
+
+        @classmethod
+        def from_bytes(cls, _data, file_path):
+            return cls(file_path)
+
+    monkeypatch.setattr(
+        seedbox_manager_module,
+        "get_downloader_client",
+        lambda **_kwargs: SimpleNamespace(client=FakeSeedboxClient([])),
+    )
+    monkeypatch.setattr(seedbox_manager_module, "SFTPClient", BlockingSFTPClient)
+    monkeypatch.setattr(seedbox_manager_module, "TorrentFile", FakeTorrentFile)
+
+    manager = SeedBoxManager(
+        config,
+        StateManager(config.transfer.torrent_info_path),
+        "seedbox",
+        "home",
+        threading.Event(),
+        async_downloads=False,
+    )
+    batch = threading.Thread(
+        target=manager._batch_download_torrents_from_seedbox,
+        args=({"first": [], "normal-a": [], "normal-b": []},),
+    )
+    batch.start()
+    assert fetching_first.wait(5)
+
+    # A later pass only queues on the running batch; its next-to-add torrent overtakes the waiting normal ones
+    manager._batch_download_torrents_from_seedbox({"urgent": [], "normal-a": [], "normal-b": []})
+    release_first.set()
+    batch.join(5)
+
+    assert fetch_calls == ["first", "urgent", "normal-a", "normal-b"]
+    final_states = StateManager(config.transfer.torrent_info_path)
+    assert all(final_states.get(name).origin_torrent_file_path for name in fetch_calls)
+
+
+def test_snapshot_deltas_queue_new_completed_origin_torrents_for_the_seedbox_stage(tmp_path, monkeypatch):
+    config = make_config(tmp_path)
+    config.transfer.seed_box_ignore_complete_time = 3600
+    recent = int(time.time())
+
+    class SyncSeedboxClient(FakeSeedboxClient):
+        def __init__(self):
+            super().__init__([])
+            self.deltas = [
+                {"rid": 1, "full_update": True, "torrents": {}},
+                {
+                    "rid": 2,
+                    "torrents": {
+                        "new-origin": {"category": "To", "progress": 1, "completion_on": 0},
+                        "downloading": {"category": "To", "progress": 0.5, "completion_on": 0},
+                        "other-category": {"category": "Other", "progress": 1, "completion_on": 0},
+                        "too-recent": {"category": "To", "progress": 1, "completion_on": recent},
+                    },
+                },
+                # State flips of a torrent that stays eligible
+                {"rid": 3, "torrents": {"new-origin": {"state": "stalledUP"}}},
+                # Seen by the manager's own refresh
+                {"rid": 4, "torrents": {"own-refresh": {"category": "To", "progress": 1, "completion_on": 0}}},
+            ]
+
+        def sync_maindata(self, rid=0, **_kwargs):
+            return self.deltas.pop(0)
+
+    client = SyncSeedboxClient()
+    monkeypatch.setattr(
+        seedbox_manager_module, "get_downloader_client", lambda **_kwargs: SimpleNamespace(client=client)
+    )
+    trigger_seedbox = WorkQueue()
+    manager = SeedBoxManager(
+        config,
+        StateManager(config.transfer.torrent_info_path),
+        "seedbox",
+        "home",
+        threading.Event(),
+        async_downloads=False,
+        trigger_seedbox=trigger_seedbox,
+    )
+
+    # A full update is covered by the next full pass
+    manager.seed_box_snapshot.refresh(force=True)
+    assert trigger_seedbox.drain() == set()
+
+    manager.seed_box_snapshot.refresh(force=True)
+    assert trigger_seedbox.drain() == {"new-origin"}
+
+    manager.seed_box_snapshot.refresh(force=True)
+    assert trigger_seedbox.drain() == set()
+
+    manager._refresh_snapshot(force=True)
+    assert trigger_seedbox.drain() == set()
+
+    manager.close()
+    assert manager._on_snapshot_change not in manager.seed_box_snapshot._subscribers
+
+
+def test_targeted_pass_only_claims_syncs_and_adds_the_changed_hashes(tmp_path, monkeypatch):
+    config = make_config(tmp_path)
+    Path(config.transfer.original_torrent_path).mkdir(parents=True, exist_ok=True)
+    Path(config.transfer.bt_path).mkdir(parents=True, exist_ok=True)
+
+    initial_state = StateManager(config.transfer.torrent_info_path)
+    for info_hash in ("a", "b"):
+        Path(tmp_path / f"{info_hash}.torrent").write_text(info_hash, encoding="utf-8")
+        Path(tmp_path / f"{info_hash}-bt.torrent").write_text(info_hash, encoding="utf-8")
+        initial_state.update(
+            TorrentTransfer(
+                hash=info_hash,
+                bt_hash=f"{info_hash}-bt",
+                origin_torrent_file_path=str(tmp_path / f"{info_hash}.torrent"),
+                bt_torrent_file_path=str(tmp_path / f"{info_hash}-bt.torrent"),
+            )
+        )
+
+    seed_box_client = FakeSeedboxClient([make_torrent("a", "To", 1), make_torrent("b", "To", 1)])
+    monkeypatch.setattr(
+        seedbox_manager_module,
+        "get_downloader_client",
+        lambda **_kwargs: SimpleNamespace(client=seed_box_client),
+    )
+
+    state_manager = StateManager(config.transfer.torrent_info_path)
+    manager = SeedBoxManager(config, state_manager, "seedbox", "home", threading.Event(), async_downloads=False)
+
+    # A targeted pass must not fall back to scanning every transfer
+    def fail_query_views(**_kwargs):
+        raise AssertionError("targeted pass scanned the whole state")
+
+    monkeypatch.setattr(state_manager, "query_views", fail_query_views)
+    manager.run(changed_hashes={"a"})
+
+    assert state_manager.get_view("a").seed_box_name == "seedbox"
+    assert state_manager.get_view("a").seedbox_add_retry_count == 1
+    assert state_manager.get_view("b").seed_box_name == ""
+    assert state_manager.get_view("b").seedbox_add_retry_count == 0
+    assert len(seed_box_client.add_calls) == 1
@@ -0,0 +1,159 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import paramiko
+import pytest
+
+import utils.sftp_utils as sftp_utils_module
+from utils.sftp_utils import PartialTransferError, SFTPClient, SFTPSessionManager
+
+
+class FakeRemoteFile:
+    def __init__(self, data, fail_after=None):
+        self.data = data
+        self.fail_after = fail_after
+        self.position = 0
+        self.seeks = []
+        self.prefetches = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_exc):
+        return False
+
+    def seek(self, offset):
+        self.seeks.append(offset)
+        self.position = offset
+
+    def prefetch(self, file_size):
+        self.prefetches.append(file_size)
+
+    def read(self, size):
+        if self.fail_after is not None and self.position >= self.fail_after:
+            raise EOFError("connection dropped")
+        end = len(self.data) if self.fail_after is None else min(len(self.data), self.fail_after)
+        chunk = self.data[self.position : min(end, self.position + size)]
+        self.position += len(chunk)
+        return chunk
+
+
+class FakeChannel:
+    def __init__(self, remote_file):
+        self.remote_file = remote_file
+        self.stat_calls = 0
+        self.closed = False
+
+    def stat(self, _path):
+        self.stat_calls += 1
+        return SimpleNamespace(st_size=len(self.remote_file.data))
+
+    def open(self, _path, _mode):
+        return self.remote_file
+
+    def close(self):
+        self.closed = True
+
+
+def make_client(remote_file):
+    client = SFTPClient(hostname="seed.example", port=22, username="user", password="pass")
+    channel = FakeChannel(remote_file)
+    client._opened_channels = [channel]
+    client._idle_channels.put(channel)
+    return client
+
+
+def test_fetch_resumes_from_received_prefix_and_checks_remote_size():
+    remote_file = FakeRemoteFile(b"d8:announce0:e")
+    client = make_client(remote_file)
+
+    assert client.fetch("/remote/a.torrent", resume_data=b"d8:ann") == b"d8:announce0:e"
+    assert remote_file.seeks == [6]
+    # paramiko prefetches from the current position up to the given end offset
+    assert remote_file.prefetches == [14]
+
+
+def test_fetch_reports_received_bytes_when_transfer_drops(monkeypatch):
+    remote_file = FakeRemoteFile(b"0123456789", fail_after=4)
+    client = make_client(remote_file)
+    monkeypatch.setattr(paramiko.SFTPClient, "from_transport", lambda _transport: FakeChannel(remote_file))
+
+    with pytest.raises(PartialTransferError) as error:
+        client.fetch("/remote/a.torrent")
+    assert error.value.data == b"0123"
+
+    remote_file.fail_after = None
+    assert client.fetch("/remote/a.torrent", resume_data=error.value.data) == b"0123456789"
+    assert remote_file.seeks == [0, 4]
+
+
+def test_fetch_discards_prefix_longer_than_remote_file():
+    remote_file = FakeRemoteFile(b"short")
+    client = make_client(remote_file)
+
+    assert client.fetch("/remote/a.torrent", resume_data=b"much longer prefix") == b"short"
+    assert remote_file.seeks == [0]
+
+
+def test_fetch_uses_listed_size_without_stat():
+    remote_file = FakeRemoteFile(b"0123456789")
+    client = make_client(remote_file)
+    channel = client._opened_channels[0]
+
+    assert client.fetch("/remote/a.torrent", resume_data=b"0123", remote_size=10) == b"0123456789"
+    assert channel.stat_calls == 0
+    assert remote_file.prefetches == [10]
+
+
+def test_failed_channel_is_closed_and_replaced_for_waiting_threads(monkeypatch):
+    client = make_client(FakeRemoteFile(b"0123456789"))
+    failed_channel = client._opened_channels[0]
+    fresh_channel = FakeChannel(FakeRemoteFile(b"0123456789"))
+    monkeypatch.setattr(paramiko.SFTPClient, "from_transport", lambda _transport: fresh_channel)
+    results = []
+
+    with pytest.raises(EOFError):
+        with client._channel() as channel:
+            assert channel is failed_channel
+            # Another thread waits for the only channel while it is in use
+            waiter = threading.Thread(target=lambda: results.append(client.fetch("/remote/a.torrent")))
+            waiter.start()
+            time.sleep(0.05)
+            raise EOFError("connection dropped")
+    waiter.join(timeout=5)
+
+    assert failed_channel.closed is True
+    assert results == [b"0123456789"]
+    assert client._opened_channels == [fresh_channel]
+    assert client._idle_channels.get_nowait() is fresh_channel
+
+
+def test_session_closes_failed_connections_and_backs_off_without_holding_the_lock(monkeypatch):
+    clients = []
+
+    class FlakyClient:
+        def __init__(self):
+            self.closed = False
+            clients.append(self)
+
+        def connect(self):
+            if len(clients) < 3:
+                raise OSError("connection refused")
+
+        def is_alive(self):
+            return not self.closed
+
+        def close(self):
+            self.closed = True
+
+    manager = SFTPSessionManager(FlakyClient, idle_timeout=0, connect_retries=3, retry_backoff=1)
+    sleeps = []
+    # Sessions returned by other threads must not wait for the retry backoff
+    monkeypatch.setattr(sftp_utils_module.time, "sleep", lambda wait: sleeps.append((wait, manager._lock.locked())))
+
+    with manager.session() as client:
+        assert client is clients[-1]
+
+    assert sleeps == [(1, False), (2, False)]
+    assert [client.closed for client in clients] == [True, True, True]
@@ -1,5 +1,13 @@
+import json
+import threading
+
+import pytest
+
 from managers.state_manager import StateManager
+from managers.state_storage import StateStorage
 from transfer.torrent_transfer import TorrentTransfer
+from utils import json_codec
+from utils.transfer_utils import load_transfer_file
 
 
 def test_get_returns_detached_copy(tmp_path):
@@ -36,3 +44,359 @@ def test_get_all_returns_detached_copies(tmp_path):
     all_transfers["origin-hash"].is_skipped = True
 
     assert manager.get("origin-hash").is_skipped is False
+
+
+def make_transfer(tmp_path, info_hash, **kwargs):
+    return TorrentTransfer(
+        hash=info_hash,
+        bt_hash=f"bt-{info_hash}",
+        origin_torrent_file_path=str(tmp_path / f"{info_hash}.torrent"),
+        bt_torrent_file_path=str(tmp_path / f"bt-{info_hash}.torrent"),
+        **kwargs,
+    )
+
+
+def test_update_appends_journal_instead_of_rewriting_snapshot(tmp_path):
+    state_path = tmp_path / "state.json"
+    manager = StateManager(str(state_path))
+    manager.update(make_transfer(tmp_path, "a"))
+    manager.update(make_transfer(tmp_path, "b"))
+    manager.delete("a")
+
+    assert not state_path.exists()
+    journal_lines = (tmp_path / "state.json.journal").read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line)["op"] for line in journal_lines] == ["update", "update", "delete"]
+
+    reloaded = StateManager(str(state_path))
+    assert set(reloaded.get_all()) == {"b"}
+
+
+def test_journal_is_compacted_into_snapshot(tmp_path):
+    state_path = tmp_path / "state.json"
+    manager = StateManager(str(state_path), journal_compact_threshold=3)
+    for info_hash in ("a", "b", "c"):
+        manager.update(make_transfer(tmp_path, info_hash))
+    manager.update(make_transfer(tmp_path, "a", is_skipped=True))
+
+    snapshot = json.loads(state_path.read_text(encoding="utf-8"))
+    assert {item["hash"] for item in snapshot} == {"a", "b", "c"}
+    assert len((tmp_path / "state.json.journal").read_text(encoding="utf-8").splitlines()) == 1
+
+    reloaded = StateManager(str(state_path))
+    assert reloaded.get("a").is_skipped is True
+    assert load_transfer_file(str(state_path))["a"].is_skipped is True
+
+
+def test_torn_journal_tail_is_ignored_on_replay(tmp_path):
+    state_path = tmp_path / "state.json"
+    manager = StateManager(str(state_path))
+    manager.update(make_transfer(tmp_path, "a"))
+    with open(tmp_path / "state.json.journal", "a", encoding="utf-8") as f:
+        f.write('{"op": "update", "transfer": {"hash"')
+
+    reloaded = StateManager(str(state_path))
+    assert set(reloaded.get_all()) == {"a"}
+
+
+def test_update_after_torn_journal_tail_is_not_lost(tmp_path):
+    state_path = tmp_path / "state.json"
+    manager = StateManager(str(state_path))
+    manager.update(make_transfer(tmp_path, "a"))
+    with open(tmp_path / "state.json.journal", "a", encoding="utf-8") as f:
+        f.write('{"op": "update", "transfer": {"hash"')
+
+    StateManager(str(state_path)).update(make_transfer(tmp_path, "b"))
+
+    reloaded = StateManager(str(state_path))
+    assert set(reloaded.get_all()) == {"a", "b"}
+
+
+@pytest.mark.parametrize("fast_codec", [True, False])
+def test_state_files_match_json_dump_and_are_readable_with_either_codec(tmp_path, monkeypatch, fast_codec):
+    if not fast_codec:
+        monkeypatch.setattr(json_codec, "msgspec", None)
+        monkeypatch.setattr(json_codec, "orjson", None)
+    state_path = tmp_path / "state.json"
+    manager = StateManager(str(state_path))
+    manager.update(make_transfer(tmp_path, "a", skip_reason="种子 a"))
+    manager.save()
+    manager.update(make_transfer(tmp_path, "b", skip_reason="种子 b"))
+
+    # Byte-compatible with the json.dump output of earlier versions, whichever codec is installed
+    assert state_path.read_bytes() == json.dumps([manager.get_view("a").to_dict()]).encode("ascii")
+    assert (tmp_path / "state.json.journal").read_bytes().isascii()
+    assert StateManager(str(state_path)).get("b").skip_reason == "种子 b"
+    assert load_transfer_file(str(state_path))["a"].skip_reason == "种子 a"
+
+
+def test_batch_coalesces_mutations_into_single_journal_write(tmp_path, monkeypatch):
+    state_path = tmp_path / "state.json"
+    manager = StateManager(str(state_path))
+    writes = []
+    original_write = manager._storage.write
+    monkeypatch.setattr(
+        manager._storage,
+        "write",
+        lambda mutations, transfers: writes.append(dict(mutations)) or original_write(mutations, transfers),
+    )
+
+    with manager.batch():
+        transfer = make_transfer(tmp_path, "a")
+        manager.update(transfer)
+        transfer.download_retry_count = 2
+        manager.update(transfer)
+        manager.update(make_transfer(tmp_path, "b"))
+        manager.delete("b")
+        with manager.batch():
+            manager.update(make_transfer(tmp_path, "c"))
+        assert writes == []
+        assert manager.get("a").download_retry_count == 2
+
+    assert len(writes) == 1
+    assert list(writes[0]) == ["a", "b", "c"]
+    assert writes[0]["b"] is None
+    reloaded = StateManager(str(state_path))
+    assert set(reloaded.get_all()) == {"a", "c"}
+    assert reloaded.get("a").download_retry_count == 2
+
+
+@pytest.mark.parametrize("flush_interval", [0, 60])
+def test_batch_does_not_overwrite_newer_update_from_another_thread(tmp_path, flush_interval):
+    state_path = tmp_path / "state.json"
+    manager = StateManager(str(state_path), flush_interval=flush_interval)
+
+    with manager.batch():
+        transfer = make_transfer(tmp_path, "a")
+        transfer.bt_hash = ""
+        manager.update(transfer)
+        # Another thread converts the same transfer while the batch is still open
+        converted = make_transfer(tmp_path, "a")
+        converted.bt_hash = "bt-x"
+        worker = threading.Thread(target=manager.update, args=(converted,))
+        worker.start()
+        worker.join()
+    manager.flush()
+
+    assert manager.get("a").bt_hash == "bt-x"
+    assert StateManager(str(state_path)).get("a").bt_hash == "bt-x"
+
+
+def test_debounced_flusher_defers_journal_writes_until_flush(tmp_path):
+    state_path = tmp_path / "state.json"
+    manager = StateManager(str(state_path), flush_interval=60)
+    manager.update(make_transfer(tmp_path, "a"))
+    manager.update(make_transfer(tmp_path, "a", is_skipped=True))
+
+    assert not (tmp_path / "state.json.journal").exists()
+
+    manager.flush()
+
+    journal_lines = (tmp_path / "state.json.journal").read_text(encoding="utf-8").splitlines()
+    assert len(journal_lines) == 1
+    assert StateManager(str(state_path)).get("a").is_skipped is True
+
+
+def test_sqlite_backend_migrates_json_state_once(tmp_path):
+    state_path = tmp_path / "state.json"
+    json_manager = StateManager(str(state_path))
+    json_manager.update(make_transfer(tmp_path, "a"))
+    json_manager.update(make_transfer(tmp_path, "b", is_skipped=True))
+
+    sqlite_manager = StateManager(str(state_path), backend="sqlite")
+    assert set(sqlite_manager.get_all()) == {"a", "b"}
+    sqlite_manager.delete("a")
+
+    # A later JSON change must not be re-imported once the database has taken over.
+    json_manager.update(make_transfer(tmp_path, "c"))
+    reloaded = StateManager(str(state_path), backend="sqlite")
+    assert set(reloaded.get_all()) == {"b"}
+    assert reloaded.get("b").is_skipped is True
+
+
+def test_sqlite_query_uses_index_and_sees_unflushed_batch(tmp_path):
+    state_path = tmp_path / "state.json"
+    manager = StateManager(str(state_path), backend="sqlite")
+    manager.update(make_transfer(tmp_path, "a"))
+    manager.update(make_transfer(tmp_path, "b", is_skipped=True))
+
+    assert set(manager.query(is_skipped=True)) == {"b"}
+    assert set(manager.query(bt_hash="bt-a")) == {"a"}
+
+    with manager.batch():
+        manager.update(make_transfer(tmp_path, "a", is_skipped=True))
+        manager.update(make_transfer(tmp_path, "b"))
+        assert set(manager.query(is_skipped=True)) == {"a"}
+
+    assert set(manager.query(is_skipped=True)) == {"a"}
+    assert set(StateManager(str(state_path), backend="sqlite").query(is_skipped=True)) == {"a"}
+
+
+def test_query_rejects_unindexed_fields(tmp_path):
+    manager = StateManager(str(tmp_path / "state.json"))
+
+    with pytest.raises(ValueError):
+        manager.query(last_error="")
+
+
+def test_views_are_shared_read_only_and_materialize_detached_copies(tmp_path):
+    manager = StateManager(str(tmp_path / "state.json"))
+    manager.update(make_transfer(tmp_path, "a"))
+
+    views = manager.get_all_views()
+    assert views["a"] is manager.get_view("a")
+    assert manager.query_views(is_skipped=False)["a"] is views["a"]
+
+    with pytest.raises(AttributeError):
+        views["a"].is_skipped = True
+    with pytest.raises(TypeError):
+        views["b"] = views["a"]
+
+    transfer = views["a"].mutable()
+    transfer.record_failure("download_retry_count", "boom")
+    assert manager.get_view("a").download_retry_count == 0
+
+    manager.update(transfer)
+    assert manager.get_view("a").download_retry_count == 1
+    assert views["a"].download_retry_count == 0
+
+
+def test_secondary_indexes_follow_updates_deletes_and_reloads(tmp_path):
+    state_path = tmp_path / "state.json"
+    manager = StateManager(str(state_path))
+    manager.update(make_transfer(tmp_path, "a", is_bt_in_seed_box=True))
+    manager.update(make_transfer(tmp_path, "b", is_skipped=True))
+    manager.update(make_transfer(tmp_path, "c", is_skipped=True, is_torrent_in_home_dl=True))
+
+    assert manager.get_view_by_bt_hash("bt-a").hash == "a"
+    assert manager.flagged_hashes("is_skipped") == {"b", "c"}
+    assert manager.flagged_hashes("is_bt_in_seed_box") == {"a"}
+    assert manager.skipped_bt_hashes() == {"bt-b", "bt-c"}
+
+    moved = manager.get("a")
+    moved.bt_hash = "bt-a2"
+    moved.is_bt_in_seed_box = False
+    manager.update(moved)
+    manager.update(make_transfer(tmp_path, "b"))
+    manager.delete("c")
+
+    assert manager.get_view_by_bt_hash("bt-a") is None
+    assert manager.get_view_by_bt_hash("bt-a2").hash == "a"
+    assert manager.flagged_hashes("is_skipped") == set()
+    assert manager.flagged_hashes("is_bt_in_seed_box") == set()
+    assert set(manager.query_views(bt_hash="bt-b")) == {"b"}
+
+    reloaded = StateManager(str(state_path))
+    assert reloaded.get_view_by_bt_hash("bt-a2").hash == "a"
+    assert reloaded.flagged_hashes("is_torrent_in_home_dl") == set()
+
+
+def test_refresh_replays_only_the_journal_tail_written_by_another_process(tmp_path, monkeypatch):
+    state_path = tmp_path / "state.json"
+    first = StateManager(str(state_path))
+    second = StateManager(str(state_path))
+    first.update(make_transfer(tmp_path, "a"))
+    first.update(make_transfer(tmp_path, "b"))
+    assert second.refresh() is True
+
+    full_reads = []
+    original_read = second._storage._read
+    monkeypatch.setattr(second._storage, "_read", lambda: full_reads.append(1) or original_read())
+    first.update(make_transfer(tmp_path, "a", is_skipped=True))
+    first.delete("b")
+
+    assert second.refresh() is True
+    assert full_reads == []
+    assert set(second.get_all()) == {"a"}
+    assert second.flagged_hashes("is_skipped") == {"a"}
+    assert second.refresh() is False
+
+
+def test_writes_catch_up_so_compaction_keeps_other_process_changes(tmp_path):
+    state_path = tmp_path / "state.json"
+    first = StateManager(str(state_path), journal_compact_threshold=3)
+    second = StateManager(str(state_path), journal_compact_threshold=3)
+    first.update(make_transfer(tmp_path, "a"))
+    second.update(make_transfer(tmp_path, "b"))
+    # This write reaches the threshold and compacts first's view of the state into the snapshot.
+    first.update(make_transfer(tmp_path, "c"))
+
+    assert {item["hash"] for item in json.loads(state_path.read_text(encoding="utf-8"))} == {"a", "b", "c"}
+
+    # A foreign compaction replaces the snapshot, so second reloads fully but keeps its unwritten changes.
+    with second.batch():
+        second.update(make_transfer(tmp_path, "d"))
+        first.delete("a")
+        first.save()
+        assert set(second.get_all()) == {"a", "b", "c", "d"}
+        assert second.refresh() is True
+        assert set(second.get_all()) == {"b", "c", "d"}
+
+    assert set(StateManager(str(state_path)).get_all()) == {"b", "c", "d"}
+
+
+def test_sqlite_refresh_reloads_after_another_connection_commits(tmp_path):
+    state_path = tmp_path / "state.json"
+    first = StateManager(str(state_path), backend="sqlite")
+    second = StateManager(str(state_path), backend="sqlite")
+    assert second.refresh() is False
+
+    first.update(make_transfer(tmp_path, "a", is_skipped=True))
+
+    assert second.refresh() is True
+    assert set(second.query(is_skipped=True)) == {"a"}
+    assert second.refresh() is False
+
+
+def test_seed_box_shards_lock_separately_and_merge_on_read(tmp_path, monkeypatch):
+    state_path = tmp_path / "state.json"
+    first = StateManager(str(state_path), shard_by="seed_box", shard_names=["box-a", "box-b"])
+    second = StateManager(str(state_path), shard_by="seed_box", shard_names=["box-a", "box-b"])
+
+    locked_files = []
+    original_acquire = StateStorage._acquire_file_lock
+
+    def recording_acquire(storage, lock_type):
+        locked_files.append(storage.transfer_file_path)
+        return original_acquire(storage, lock_type)
+
+    monkeypatch.setattr(StateStorage, "_acquire_file_lock", recording_acquire)
+    first.update(make_transfer(tmp_path, "a", seed_box_name="box-a"))
+    assert set(locked_files) == {str(tmp_path / "state.box-a.json")}
+    second.update(make_transfer(tmp_path, "b", seed_box_name="box-b"))
+
+    assert second.refresh() is True
+    assert first.refresh() is True
+    assert set(first.get_all()) == set(second.get_all()) == {"a", "b"}
+    assert first.get_view_by_bt_hash("bt-b").seed_box_name == "box-b"
+
+
+def test_claimed_transfer_moves_from_default_shard_to_seed_box_shard(tmp_path):
+    state_path = tmp_path / "state.json"
+    # State written before sharding lives in the unsharded file, which is the default shard.
+    StateManager(str(state_path)).update(make_transfer(tmp_path, "a"))
+
+    manager = StateManager(str(state_path), shard_by="seed_box", shard_names=["box-a"])
+    other = StateManager(str(state_path), shard_by="seed_box", shard_names=["box-a"])
+    assert set(manager.get_all()) == {"a"}
+    manager.update(make_transfer(tmp_path, "a", seed_box_name="box-a"))
+    manager.save()
+
+    assert json.loads(state_path.read_text(encoding="utf-8")) == []
+    assert [item["hash"] for item in json.loads((tmp_path / "state.box-a.json").read_text(encoding="utf-8"))] == ["a"]
+    assert other.refresh() is True
+    assert other.get("a").seed_box_name == "box-a"
+    reloaded = StateManager(str(state_path), shard_by="seed_box", shard_names=["box-a"])
+    assert set(reloaded.get_all()) == {"a"}
+
+
+def test_hash_prefix_shards_support_sqlite_queries(tmp_path):
+    state_path = tmp_path / "state.json"
+    manager = StateManager(str(state_path), backend="sqlite", shard_by="hash_prefix")
+    manager.update(make_transfer(tmp_path, "a1", is_skipped=True))
+    manager.update(make_transfer(tmp_path, "b2"))
+
+    assert (tmp_path / "state.a.json.sqlite3").exists()
+    assert (tmp_path / "state.b.json.sqlite3").exists()
+    reloaded = StateManager(str(state_path), backend="sqlite", shard_by="hash_prefix")
+    assert set(reloaded.query(is_skipped=False)) == {"b2"}
+    assert set(reloaded.query(is_skipped=True)) == {"a1"}
@@ -0,0 +1,53 @@
+import threading
+import time
+
+import utils.transfer_scheduler as transfer_scheduler_module
+from utils.transfer_scheduler import PRIORITY_HIGH, PRIORITY_NORMAL, TokenBucket, TransferScheduler
+
+
+def test_token_bucket_waits_for_tokens_beyond_burst(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(transfer_scheduler_module.time, "sleep", sleeps.append)
+
+    bucket = TokenBucket(rate=100)
+    bucket.acquire(100)
+    bucket.acquire(50)
+
+    assert len(sleeps) == 1
+    assert 0.4 < sleeps[0] <= 0.5
+
+
+def test_unlimited_scheduler_does_not_throttle(monkeypatch):
+    monkeypatch.setattr(transfer_scheduler_module.time, "sleep", lambda _seconds: (_ for _ in ()).throw(AssertionError))
+
+    scheduler = TransferScheduler()
+    scheduler.admit()
+    scheduler.throttle(10 * 1024 * 1024)
+
+    assert scheduler.progress_callback() is None
+
+
+def test_scheduler_admits_high_priority_transfers_first():
+    release = threading.Event()
+    scheduler = TransferScheduler()
+    admitted = []
+
+    class RecordingBucket:
+        def acquire(self, _amount):
+            # Runs while the request is at the head of the queue; the first one blocks until all are queued
+            admitted.append(scheduler._waiting[0][0])
+            release.wait(5)
+
+    scheduler.files = RecordingBucket()
+    threads = []
+    for priority in (PRIORITY_NORMAL, PRIORITY_NORMAL, PRIORITY_HIGH):
+        thread = threading.Thread(target=scheduler.admit, args=(priority,))
+        thread.start()
+        threads.append(thread)
+        while len(scheduler._waiting) < len(threads):
+            time.sleep(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert admitted == [PRIORITY_NORMAL, PRIORITY_HIGH, PRIORITY_NORMAL]
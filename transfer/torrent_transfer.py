@@ -1,3 +1,5 @@
+import sys
+
 from pydantic import BaseModel
 
 DEFAULT_RETRY_LIMIT = 3
@@ -16,6 +18,8 @@ ORIGIN_DATA_STATUS_WAITING_FOR_REDOWNLOAD = "waiting_for_redownload"
 
 class TorrentTransfer(BaseModel):
     hash: str
+    # Seedbox that handles this transfer; empty for transfers created before a seedbox saw them
+    seed_box_name: str = ""
     bt_hash: str = ""
     origin_torrent_file_path: str
     bt_torrent_file_path: str = ""
@@ -37,6 +41,10 @@ class TorrentTransfer(BaseModel):
     def has_bt_torrent(self) -> bool:
         return bool(self.bt_hash and self.bt_torrent_file_path)
 
+    def mutable(self) -> "TorrentTransfer":
+        """Return a transfer that may be modified. Plain transfers already are."""
+        return self
+
     def record_failure(
         self,
         counter_field: str,
@@ -65,3 +73,59 @@ class TorrentTransfer(BaseModel):
             )
         ):
             self.last_error = ""
+
+
+def is_owned_by(transfer, seed_box_name: str, sole_seed_box: bool) -> bool:
+    """Whether a seedbox's managers should handle `transfer`.
+
+    Unassigned transfers are left alone when several seedboxes share the state, until one of them claims it.
+    """
+    if transfer.seed_box_name:
+        return transfer.seed_box_name == seed_box_name
+    return sole_seed_box
+
+
+# Enum-like status strings repeat across every record, so views share one interned copy of each.
+_INTERNED_VIEW_FIELDS = ("seed_box_name", "seedbox_bt_health", "seedbox_origin_data_status")
+
+
+class TorrentTransferView:
+    """Compact read-only transfer that StateManager keeps in memory and shares with readers.
+
+    A ``__slots__`` record instead of a pydantic model; pydantic is only used when state is
+    loaded or saved. Call ``mutable()`` for a TorrentTransfer that can be changed.
+    """
+
+    __slots__ = tuple(TorrentTransfer.model_fields)
+
+    def __init__(self, **fields):
+        for name in self.__slots__:
+            value = fields[name]
+            if name in _INTERNED_VIEW_FIELDS and isinstance(value, str):
+                value = sys.intern(value)
+            object.__setattr__(self, name, value)
+
+    @classmethod
+    def from_transfer(cls, transfer) -> "TorrentTransferView":
+        return cls(**{name: getattr(transfer, name) for name in cls.__slots__})
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is read-only; call mutable() to get a modifiable copy")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is read-only; call mutable() to get a modifiable copy")
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self.__slots__)
+        return f"{type(self).__name__}({fields})"
+
+    def has_bt_torrent(self) -> bool:
+        return bool(self.bt_hash and self.bt_torrent_file_path)
+
+    def to_dict(self) -> dict:
+        """Plain dict in the same shape as TorrentTransfer.model_dump()."""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def mutable(self) -> TorrentTransfer:
+        """Return a detached, modifiable copy to pass back to StateManager.update()."""
+        return TorrentTransfer.model_construct(**self.to_dict())
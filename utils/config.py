@@ -13,6 +13,16 @@ class SeedboxOriginDataMissingPolicy(str, Enum):
     force_recheck_and_rebuild_bt = "force_recheck_and_rebuild_bt"
 
 
+class StateBackend(str, Enum):
+    json = "json"
+    sqlite = "sqlite"
+
+
+class StateShardBy(str, Enum):
+    seed_box = "seed_box"
+    hash_prefix = "hash_prefix"
+
+
 class Transfer(BaseModel):
     original_torrent_path: str
     bt_path: str
@@ -34,6 +44,13 @@ class Transfer(BaseModel):
     home_interval: int = 30
     auto_dl_torrent_from_seedbox: bool = False
     exit_on_finish: bool = False
+    state_flush_interval: float = 0
+    state_backend: StateBackend = StateBackend.json
+    state_shard_by: Optional[StateShardBy] = None
+    local_scan_workers: int = 1
+    local_scan_batch_size: int = 200
+    local_watch: bool = False
+    local_rescan_interval: int = 3600
 
 
 class SeedBox(BaseModel):
@@ -45,6 +62,13 @@ class SeedBox(BaseModel):
     ssh_user: str
     ssh_password: str
     torrents_path: str
+    # 该盒子对应的家宽下载器名称，未设置时使用命令行 --home_dl_name
+    home_dl_name: Optional[str] = None
+    sftp_concurrency: int = 4
+    sftp_keepalive_interval: int = 30
+    sftp_idle_timeout: float = 300
+    sftp_bytes_per_second: int = 0
+    sftp_files_per_second: float = 0
 
 
 class Downloader(BaseModel):
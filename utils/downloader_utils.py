@@ -1,4 +1,5 @@
 import logging
+import threading
 from urllib import parse
 
 import qbittorrentapi
@@ -23,5 +24,16 @@ class DownloaderHelper:
             raise
 
 
+_clients = {}
+_clients_lock = threading.Lock()
+
+
 def get_downloader_client(name, url, username, password):
-    return DownloaderHelper(name, url, username, password)
+    """同一地址和账号的下载器只登录一次，多个盒子/管理器共用同一个会话"""
+    key = (url, username)
+    with _clients_lock:
+        helper = _clients.get(key)
+        if helper is None:
+            helper = DownloaderHelper(name, url, username, password)
+            _clients[key] = helper
+        return helper
@@ -0,0 +1,218 @@
+import ctypes
+import ctypes.util
+import logging
+import os
+import select
+import struct
+import sys
+import threading
+
+logger = logging.getLogger(__name__)
+
+# inotify 事件掩码，见 <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+# 文件只在写完（close）或移动进来时上报，避免读到写了一半的种子；
+# SeedBoxManager 先写 .tmp 再 rename，对应 IN_MOVED_TO
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+def _load_libc():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+    except (OSError, AttributeError):
+        return None
+    return libc
+
+
+class InotifyWatcher:
+    """
+    基于 inotify（ctypes 调用 libc）递归监视目录，收集新增、写入、移动和删除的文件路径。
+    事件溢出或目录被移走时无法确定具体变化，会要求调用方做一次全量扫描。
+    根目录本身被删除或移走后监视停止，is_running() 返回 False，调用方应退回轮询扫描。
+    """
+
+    def __init__(self, root, suffix=".torrent", on_change=None):
+        """
+        :param root: 监视的根目录
+        :param suffix: 只上报以此结尾的文件
+        :param on_change: 有新变化时在监视线程中调用，用于唤醒处理方
+        """
+        self.root = root
+        self.suffix = suffix
+        self.on_change = on_change
+        self._libc = None
+        self._fd = -1
+        self._watch_dirs = {}
+        # 在监视范围内改名的目录：IN_MOVED_TO 重新监视时内核沿用同一个 wd，随后的 IN_MOVE_SELF 不应移除它
+        self._renamed_wds = set()
+        self._changed = {}
+        self._rescan_needed = False
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._thread = None
+
+    def start(self) -> bool:
+        """开始监视；当前系统不支持 inotify 或建立监视失败时返回 False，调用方应退回轮询扫描"""
+        self._libc = _load_libc()
+        if self._libc is None:
+            logger.info("inotify is not available on this system, falling back to polling")
+            return False
+        fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            logger.warning(f"inotify_init1 failed: {os.strerror(ctypes.get_errno())}, falling back to polling")
+            return False
+        self._fd = fd
+        try:
+            self._watch_tree(self.root)
+        except OSError as e:
+            logger.warning(f"Failed to watch {self.root}: {e}, falling back to polling")
+            self.close()
+            return False
+        self._thread = threading.Thread(target=self._run, name="inotify-watcher", daemon=True)
+        self._thread.start()
+        logger.info(f"Watching {self.root} with inotify ({len(self._watch_dirs)} directories)")
+        return True
+
+    def close(self):
+        self._closed.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(5)
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive() and not self._closed.is_set()
+
+    def drain(self):
+        """取走已收集的变化，返回 (变化的文件路径集合, 是否需要全量扫描)"""
+        with self._lock:
+            changed, self._changed = self._changed, {}
+            rescan_needed, self._rescan_needed = self._rescan_needed, False
+        return set(changed), rescan_needed
+
+    def _add_watch(self, path):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), WATCH_MASK | IN_ONLYDIR)
+        if wd < 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, f"inotify_add_watch failed: {os.strerror(errno)}", path)
+        previous_path = self._watch_dirs.get(wd)
+        if previous_path is not None and previous_path != path:
+            self._renamed_wds.add(wd)
+        self._watch_dirs[wd] = path
+
+    def _watch_tree(self, path):
+        """监视 path 及其所有子目录，返回其中已有的文件（在建立监视前就写入的文件不会产生事件）"""
+        existing_files = []
+        for root, dirs, files in os.walk(path):
+            self._add_watch(root)
+            existing_files.extend(os.path.join(root, file) for file in files if file.endswith(self.suffix))
+        return existing_files
+
+    def _run(self):
+        poller = select.poll()
+        poller.register(self._fd, select.POLLIN)
+        while not self._closed.is_set():
+            try:
+                if not poller.poll(500):
+                    continue
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+            except OSError as e:
+                logger.error(f"inotify watcher stopped: {e}")
+                self._closed.set()
+                self._mark_rescan()
+                return
+            if not self._handle_events(data):
+                return
+
+    def _handle_events(self, data) -> bool:
+        """处理一批事件；根目录的监视失效时停止监视并返回 False"""
+        changed = []
+        rescan_needed = False
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, name_length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset : offset + name_length].rstrip(b"\0"))
+            offset += name_length
+
+            if mask & IN_Q_OVERFLOW:
+                logger.warning("inotify event queue overflowed, a full rescan is needed")
+                rescan_needed = True
+                continue
+            directory = self._watch_dirs.get(wd)
+            if directory == self.root and mask & (IN_MOVE_SELF | IN_DELETE_SELF | IN_IGNORED):
+                # 根目录被移走后旧路径下的新文件不会再上报，只能停止监视
+                logger.warning(f"Lost the inotify watch on {self.root}, stopping the watcher")
+                self._closed.set()
+                self._mark_rescan()
+                return False
+            if mask & IN_IGNORED:
+                self._watch_dirs.pop(wd, None)
+                self._renamed_wds.discard(wd)
+                continue
+            if directory is None:
+                continue
+            if mask & IN_MOVE_SELF:
+                if wd in self._renamed_wds:
+                    # 已由 IN_MOVED_TO 按新路径重新监视
+                    self._renamed_wds.discard(wd)
+                    continue
+                # 移出监视范围的目录仍会以旧路径上报事件，移除其监视
+                self._libc.inotify_rm_watch(self._fd, wd)
+                self._watch_dirs.pop(wd, None)
+                rescan_needed = True
+                continue
+            if mask & IN_DELETE_SELF:
+                continue
+
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    try:
+                        changed.extend(self._watch_tree(path))
+                    except OSError as e:
+                        logger.warning(f"Failed to watch new directory {path}: {e}")
+                        rescan_needed = True
+                elif mask & IN_MOVED_FROM:
+                    rescan_needed = True
+            elif name.endswith(self.suffix) and mask & (IN_CLOSE_WRITE | IN_MOVED_TO | IN_MOVED_FROM | IN_DELETE):
+                changed.append(path)
+
+        if not changed and not rescan_needed:
+            return True
+        with self._lock:
+            for path in changed:
+                self._changed[path] = None
+            self._rescan_needed = self._rescan_needed or rescan_needed
+        if self.on_change is not None:
+            self.on_change()
+        return True
+
+    def _mark_rescan(self):
+        with self._lock:
+            self._rescan_needed = True
+        if self.on_change is not None:
+            self.on_change()
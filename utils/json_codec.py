@@ -0,0 +1,38 @@
+import json
+from typing import Any, Union
+
+try:
+    import msgspec
+except ImportError:  # pragma: no cover - optional dependency
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+
+if msgspec is not None:
+    BACKEND = "msgspec"
+elif orjson is not None:
+    BACKEND = "orjson"
+else:
+    BACKEND = "json"
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    """Decode JSON with msgspec or orjson when installed, falling back to the standard library."""
+    if msgspec is not None:
+        return msgspec.json.decode(data)
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj: Any) -> bytes:
+    """Encode JSON exactly like ``json.dump`` with default options, as ASCII bytes.
+
+    State files must stay byte-compatible with earlier versions. msgspec and orjson only write compact output
+    with raw UTF-8, which can never match those bytes, so encoding always uses the standard library's C encoder;
+    only decoding is accelerated.
+    """
+    return json.dumps(obj).encode("ascii")
@@ -1,63 +1,345 @@
 from __future__ import annotations
 
-import copy
+import heapq
+import logging
+import threading
+import time
+import weakref
+from bisect import bisect_right, insort
 from types import SimpleNamespace
 
+logger = logging.getLogger(__name__)
+
+# 比任何种子 hash 都大，用于在 (completion_on, hash) 有序列表中二分查找某一完成时间的右边界
+_MAX_HASH = "\U0010ffff"
+
+# 各管理器实际读取的种子字段；快照只保存这些字段时，可省去 dlspeed、eta 等数十个字段的内存和转换开销
+TORRENT_FIELDS = ("hash", "name", "category", "state", "progress", "save_path", "completion_on", "trackers")
+
+# 共享快照两次刷新之间的最短间隔（秒），间隔内其他管理器的 refresh() 直接使用已有数据
+SHARED_REFRESH_INTERVAL = 5.0
+
+
+class TorrentRecord:
+    """只读的种子记录，快照的所有读取方共享同一个对象，无需复制。
+
+    字段按属性读取，与 qbittorrent-api 返回的对象用法一致；sync 增量更新时生成新记录替换旧记录，
+    而不是修改旧记录，仍持有旧记录的读取方看到的始终是一致的数据。
+    """
+
+    __slots__ = ("_fields",)
+
+    def __init__(self, fields: dict):
+        object.__setattr__(self, "_fields", fields)
+
+    def __getattr__(self, name):
+        # 直接读取槽位，避免对象尚未初始化（如反序列化过程中）时递归调用 __getattr__
+        fields = object.__getattribute__(self, "_fields")
+        try:
+            return fields[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is read-only")
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, _memo):
+        return self
+
+    def __reduce__(self):
+        return type(self), (self._fields,)
+
+    def __eq__(self, other):
+        return isinstance(other, TorrentRecord) and self._fields == other._fields
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={value!r}" for name, value in self._fields.items())
+        return f"{type(self).__name__}({fields})"
+
+    def to_dict(self) -> dict:
+        return dict(self._fields)
+
+    def replace(self, changes: dict) -> "TorrentRecord":
+        """返回合并了 changes 的新记录，未变化的字段值与原记录共享"""
+        return TorrentRecord({**self._fields, **changes})
+
+
+def freeze_value(value):
+    """把 API 返回的值转换为不可变形式：dict 与对象转为 TorrentRecord，list 转为 tuple，标量原样共享"""
+    if isinstance(value, TorrentRecord):
+        return value
+    if isinstance(value, dict):
+        return TorrentRecord({key: freeze_value(val) for key, val in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze_value(item) for item in value)
+    if isinstance(value, SimpleNamespace):
+        return freeze_value(vars(value))
+    return value
+
 
 class QbittorrentSnapshot:
-    def __init__(self, client):
+    def __init__(self, client, fields=None, min_refresh_interval=0):
+        """
+        :param client: qBittorrent 客户端
+        :param fields: 只保存这些种子字段（hash 总会保存），None 表示保存全部字段
+        :param min_refresh_interval: 距上次刷新不足该秒数时 refresh() 不再请求下载器，0 表示每次都刷新
+        """
         self.client = client
+        self.fields = frozenset(fields).union(("hash",)) if fields is not None else None
+        self.min_refresh_interval = min_refresh_interval
+        self._refreshed_at = None
+        # 多个管理器线程共用同一快照时，刷新与索引查询互斥
+        self._lock = threading.RLock()
+        self._subscribers = []
+        # 本次刷新中变化（新增、更新或删除）的 hash，刷新结束后分发给订阅者
+        self._changed_hashes: dict[str, None] = {}
+        self._full_update = False
         self._rid = 0
         self._supports_sync = hasattr(client, "sync_maindata")
-        self._torrents_by_hash: dict[str, SimpleNamespace] = {}
+        self._torrents_by_hash: dict[str, TorrentRecord] = {}
+        # torrents() 与 hashes() 的结果在种子列表变化前一直复用
+        self._torrents_cache: tuple[TorrentRecord, ...] | None = None
+        self._hashes_cache: frozenset[str] | None = None
+        # 增量维护的二级索引：分类 -> hash、状态 -> hash，以及每个分类下按完成时间排序的已完成种子
+        self._category_index: dict[str, dict[str, None]] = {}
+        self._state_index: dict[str, dict[str, None]] = {}
+        self._completed_index: dict[str, list[tuple[int, str]]] = {}
 
-    def refresh(self):
-        if self._supports_sync:
-            try:
-                self._refresh_from_sync()
+    def refresh(self, force=False):
+        """
+        从下载器同步种子列表。共享快照在 min_refresh_interval 内已被刷新过时直接返回，
+        force=True 时总是请求下载器（如刚添加种子后需要看到它）
+        """
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._refreshed_at is not None and now - self._refreshed_at < self.min_refresh_interval:
                 return self
-            except Exception:
-                self._supports_sync = False
+            self._changed_hashes = {}
+            self._full_update = False
+            try:
+                if self._supports_sync:
+                    try:
+                        self._refresh_from_sync()
+                    except Exception:
+                        self._supports_sync = False
+                        self._refresh_from_full_list()
+                else:
+                    self._refresh_from_full_list()
+            finally:
+                self._refreshed_at = time.monotonic()
+                changed_hashes = frozenset(self._changed_hashes)
+                full_update = self._full_update
+                self._changed_hashes = {}
+                subscribers = list(self._subscribers)
 
-        self._refresh_from_full_list()
+        if changed_hashes or full_update:
+            for callback in subscribers:
+                try:
+                    callback(changed_hashes, full_update)
+                except Exception as e:
+                    logger.error(f"Snapshot subscriber failed: {e}")
         return self
 
-    def torrents(self):
-        return [copy.deepcopy(torrent) for torrent in self._torrents_by_hash.values()]
+    def subscribe(self, callback):
+        """
+        订阅种子变化：每次刷新后以 (变化的 hash 集合, 是否为全量更新) 调用 callback，
+        集合只包含本次 sync 增量（rid 之后）中新增、更新或删除的种子；全量更新时为全部种子
+        """
+        with self._lock:
+            self._subscribers.append(callback)
 
-    def hashes(self):
-        return set(self._torrents_by_hash.keys())
+    def unsubscribe(self, callback):
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
 
-    def torrent(self, torrent_hash: str):
-        torrent = self._torrents_by_hash.get(torrent_hash)
-        return copy.deepcopy(torrent) if torrent else None
+    def merge(self, torrents) -> dict[str, TorrentRecord]:
+        """
+        把另外查询到的种子（如 torrents_info 的结果）写入快照，不必等下次刷新；
+        下次 sync 增量会照常覆盖这些记录。返回 hash -> 记录
+        """
+        merged = {}
+        with self._lock:
+            for payload in torrents:
+                torrent_hash = getattr(payload, "hash", None)
+                if not torrent_hash:
+                    continue
+                torrent = self._normalize_torrent(torrent_hash, payload)
+                existing_torrent = self._torrents_by_hash.get(torrent_hash)
+                if existing_torrent is not None:
+                    torrent = existing_torrent.replace(torrent.to_dict())
+                self._store(torrent_hash, torrent)
+                merged[torrent_hash] = torrent
+        return merged
 
-    def by_category(self, category: str):
-        return [
-            copy.deepcopy(torrent)
-            for torrent in self._torrents_by_hash.values()
-            if getattr(torrent, "category", None) == category
-        ]
+    def require_fields(self, fields):
+        """扩大字段投影以包含 fields；已保存的记录缺少新字段，因此下次刷新改为全量同步"""
+        with self._lock:
+            if self.fields is None:
+                return
+            if fields is None:
+                self.fields = None
+            elif not self.fields.issuperset(fields):
+                self.fields = self.fields.union(fields)
+            else:
+                return
+            self._rid = 0
+            self._refreshed_at = None
+
+    def torrents(self) -> tuple[TorrentRecord, ...]:
+        with self._lock:
+            if self._torrents_cache is None:
+                self._torrents_cache = tuple(self._torrents_by_hash.values())
+            return self._torrents_cache
+
+    def hashes(self) -> frozenset[str]:
+        with self._lock:
+            if self._hashes_cache is None:
+                self._hashes_cache = frozenset(self._torrents_by_hash)
+            return self._hashes_cache
+
+    def torrent(self, torrent_hash: str) -> TorrentRecord | None:
+        return self._torrents_by_hash.get(torrent_hash)
+
+    def by_category(self, category: str) -> list[TorrentRecord]:
+        with self._lock:
+            return [self._torrents_by_hash[torrent_hash] for torrent_hash in self._category_index.get(category, ())]
+
+    def by_state(self, state: str) -> list[TorrentRecord]:
+        """指定状态（如 missingFiles）的种子"""
+        with self._lock:
+            return [self._torrents_by_hash[torrent_hash] for torrent_hash in self._state_index.get(state, ())]
+
+    def completed(self, categories, completed_before=None, hashes=None) -> list[TorrentRecord]:
+        """
+        指定分类中已完成（progress == 1）的种子，按完成时间从早到晚排列
+        :param categories: 分类集合
+        :param completed_before: 只返回 completion_on 不晚于该时间戳的种子，None 表示不限
+        :param hashes: 只在这些hash中查找，None 表示全部；给定时开销只与hashes的数量有关
+        """
+        with self._lock:
+            if hashes is not None:
+                entries = []
+                for torrent_hash in hashes:
+                    torrent = self._torrents_by_hash.get(torrent_hash)
+                    if torrent is None:
+                        continue
+                    category, _, completed, completion_on = self._index_key(torrent)
+                    if not completed or category not in categories:
+                        continue
+                    if completed_before is not None and completion_on > completed_before:
+                        continue
+                    entries.append((completion_on, torrent_hash))
+                return [self._torrents_by_hash[torrent_hash] for _, torrent_hash in sorted(entries)]
+
+            streams = []
+            for category in categories:
+                entries = self._completed_index.get(category)
+                if not entries:
+                    continue
+                if completed_before is not None:
+                    entries = entries[: bisect_right(entries, (completed_before, _MAX_HASH))]
+                streams.append(entries)
+            return [self._torrents_by_hash[torrent_hash] for _, torrent_hash in heapq.merge(*streams)]
 
     def get_trackers(self, torrent_hash: str):
         torrent = self._torrents_by_hash.get(torrent_hash)
         if torrent and getattr(torrent, "trackers", None):
-            return copy.deepcopy(torrent.trackers)
+            return torrent.trackers
 
         try:
             torrents = self.client.torrents_info(torrent_hashes=torrent_hash, include_trackers=True)
         except TypeError:
             torrents = self.client.torrents_info(torrent_hashes=torrent_hash)
         if not torrents:
-            return []
+            return ()
 
-        trackers = self._normalize_value(getattr(torrents[0], "trackers", []))
-        if torrent is None:
-            torrent = self._normalize_torrent(torrent_hash, torrents[0])
-            self._torrents_by_hash[torrent_hash] = torrent
-        else:
-            torrent.trackers = trackers
-        return copy.deepcopy(trackers)
+        trackers = freeze_value(getattr(torrents[0], "trackers", None) or ())
+        with self._lock:
+            torrent = self._torrents_by_hash.get(torrent_hash)
+            if torrent is None:
+                self._store(torrent_hash, self._normalize_torrent(torrent_hash, torrents[0]))
+            else:
+                changes = self._project({"trackers": trackers})
+                if changes:
+                    self._store(torrent_hash, torrent.replace(changes))
+        return trackers
+
+    def _project(self, data: dict) -> dict:
+        if self.fields is None:
+            return data
+        return {key: value for key, value in data.items() if key in self.fields}
+
+    def _store(self, torrent_hash: str, torrent: TorrentRecord):
+        previous = self._torrents_by_hash.get(torrent_hash)
+        if previous is None:
+            self._hashes_cache = None
+            self._index(torrent_hash, torrent)
+        elif self._index_key(previous) != self._index_key(torrent):
+            self._unindex(torrent_hash, previous)
+            self._index(torrent_hash, torrent)
+        self._torrents_by_hash[torrent_hash] = torrent
+        self._torrents_cache = None
+        self._changed_hashes[torrent_hash] = None
+
+    def _remove(self, torrent_hash: str):
+        previous = self._torrents_by_hash.pop(torrent_hash, None)
+        if previous is None:
+            return
+        self._unindex(torrent_hash, previous)
+        self._torrents_cache = None
+        self._hashes_cache = None
+        self._changed_hashes[torrent_hash] = None
+
+    def _clear(self):
+        # 全量更新：订阅者收到的变化集合包含被清掉的种子
+        self._changed_hashes.update(dict.fromkeys(self._torrents_by_hash))
+        self._full_update = True
+        self._torrents_by_hash = {}
+        self._torrents_cache = None
+        self._hashes_cache = None
+        self._category_index = {}
+        self._state_index = {}
+        self._completed_index = {}
+
+    @staticmethod
+    def _index_key(torrent: TorrentRecord):
+        completed = getattr(torrent, "progress", 0) == 1
+        return (
+            getattr(torrent, "category", None),
+            getattr(torrent, "state", None),
+            completed,
+            (getattr(torrent, "completion_on", 0) or 0) if completed else 0,
+        )
+
+    def _index(self, torrent_hash: str, torrent: TorrentRecord):
+        category, state, completed, completion_on = self._index_key(torrent)
+        self._category_index.setdefault(category, {})[torrent_hash] = None
+        self._state_index.setdefault(state, {})[torrent_hash] = None
+        if completed:
+            insort(self._completed_index.setdefault(category, []), (completion_on, torrent_hash))
+
+    def _unindex(self, torrent_hash: str, torrent: TorrentRecord):
+        category, state, completed, completion_on = self._index_key(torrent)
+        for index, key in ((self._category_index, category), (self._state_index, state)):
+            members = index.get(key)
+            if members is not None:
+                members.pop(torrent_hash, None)
+                if not members:
+                    del index[key]
+        if completed:
+            entries = self._completed_index.get(category, [])
+            position = bisect_right(entries, (completion_on, torrent_hash)) - 1
+            if position >= 0 and entries[position] == (completion_on, torrent_hash):
+                del entries[position]
+            if not entries:
+                self._completed_index.pop(category, None)
 
     def _refresh_from_sync(self):
         response = self.client.sync_maindata(rid=self._rid)
@@ -66,57 +348,63 @@ class QbittorrentSnapshot:
 
         self._rid = response.get("rid", self._rid)
         if response.get("full_update"):
-            self._torrents_by_hash = {}
+            self._clear()
 
         for torrent_hash in response.get("torrents_removed", []) or []:
-            self._torrents_by_hash.pop(torrent_hash, None)
+            self._remove(torrent_hash)
 
         torrents = response.get("torrents", {}) or {}
         for torrent_hash, torrent_data in torrents.items():
-            updated_torrent = self._normalize_torrent(torrent_hash, torrent_data)
             existing_torrent = self._torrents_by_hash.get(torrent_hash)
-            if existing_torrent is not None and not response.get("full_update"):
-                for key, value in vars(updated_torrent).items():
-                    setattr(existing_torrent, key, value)
-                if not getattr(existing_torrent, "hash", None):
-                    existing_torrent.hash = torrent_hash
+            if existing_torrent is not None:
+                # 增量只包含变化的字段，只转换需要保存的这些字段，其余字段值与旧记录共享；
+                # 只有未保存字段（如 dlspeed）变化时不产生新记录
+                changes = {key: freeze_value(value) for key, value in self._project(torrent_data).items()}
+                if changes:
+                    self._store(torrent_hash, existing_torrent.replace(changes))
             else:
-                self._torrents_by_hash[torrent_hash] = updated_torrent
+                self._store(torrent_hash, self._normalize_torrent(torrent_hash, torrent_data))
 
     def _refresh_from_full_list(self):
         try:
             torrents = self.client.torrents_info(include_trackers=True)
         except TypeError:
             torrents = self.client.torrents_info()
-        self._torrents_by_hash = {}
+        self._clear()
         for torrent in torrents or []:
             torrent_hash = getattr(torrent, "hash", None)
             if not torrent_hash:
                 continue
-            self._torrents_by_hash[torrent_hash] = self._normalize_torrent(torrent_hash, torrent)
-
-    def _normalize_torrent(self, torrent_hash: str, payload):
-        torrent = self._normalize_value(payload)
-        if not isinstance(torrent, SimpleNamespace):
-            torrent = SimpleNamespace(**getattr(torrent, "__dict__", {}))
-        if not getattr(torrent, "hash", None):
-            torrent.hash = torrent_hash
-        return torrent
-
-    def _normalize_value(self, value):
-        if isinstance(value, SimpleNamespace):
-            return copy.deepcopy(value)
-        if isinstance(value, dict):
-            return SimpleNamespace(**{key: self._normalize_nested(val) for key, val in value.items()})
-        if isinstance(value, list):
-            return [self._normalize_nested(item) for item in value]
-        return copy.deepcopy(value)
-
-    def _normalize_nested(self, value):
-        if isinstance(value, dict):
-            return self._normalize_value(value)
-        if isinstance(value, list):
-            return [self._normalize_nested(item) for item in value]
-        if isinstance(value, SimpleNamespace):
-            return copy.deepcopy(value)
-        return copy.deepcopy(value)
+            self._store(torrent_hash, self._normalize_torrent(torrent_hash, torrent))
+
+    def _normalize_torrent(self, torrent_hash: str, payload) -> TorrentRecord:
+        if isinstance(payload, TorrentRecord):
+            data = payload.to_dict()
+        elif isinstance(payload, dict):
+            data = payload
+        else:
+            data = getattr(payload, "__dict__", {})
+        fields = {key: freeze_value(value) for key, value in self._project(data).items()}
+        if not fields.get("hash"):
+            fields["hash"] = torrent_hash
+        return TorrentRecord(fields)
+
+
+_shared_snapshots = weakref.WeakKeyDictionary()
+_shared_snapshots_lock = threading.Lock()
+
+
+def get_shared_snapshot(client, fields=TORRENT_FIELDS) -> QbittorrentSnapshot:
+    """
+    同一下载器客户端在进程内共用一个快照，SeedBoxManager 与 HomeManager 指向同一 WebUI、或同时运行多个盒子时，
+    在 SHARED_REFRESH_INTERVAL 内只向下载器请求一次 sync_maindata。
+    客户端由 get_downloader_client 按地址和账号复用，因此实际上每个下载器地址对应一个快照。
+    """
+    with _shared_snapshots_lock:
+        snapshot = _shared_snapshots.get(client)
+        if snapshot is None:
+            snapshot = QbittorrentSnapshot(client, fields=fields, min_refresh_interval=SHARED_REFRESH_INTERVAL)
+            _shared_snapshots[client] = snapshot
+        else:
+            snapshot.require_fields(fields)
+        return snapshot
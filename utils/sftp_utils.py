@@ -1,26 +1,56 @@
+import io
 import logging
+import queue
+import threading
+import time
+from contextlib import contextmanager
 
 import paramiko
 
+from utils.transfer_scheduler import PRIORITY_NORMAL
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+class PartialTransferError(IOError):
+    """传输中途失败，data 保存已收到的文件前缀，供续传使用"""
+
+    def __init__(self, remote_file, data, error):
+        super().__init__(f"Transfer of {remote_file} interrupted after {len(data)} bytes: {error}")
+        self.remote_file = remote_file
+        self.data = data
+
+
 class SFTPClient:
-    def __init__(self, hostname, port, username, password):
+    def __init__(self, hostname, port, username, password, max_channels=1, keepalive_interval=0, scheduler=None):
         self.hostname = hostname
         self.port = port
         self.username = username
         self.password = password
+        # 大于 0 时按该间隔 (秒) 发送 SSH keepalive，避免空闲连接被 NAT/防火墙断开
+        self.keepalive_interval = keepalive_interval
+        # 同一个 Transport 上最多复用的 SFTP 通道数，download 可被多个线程并发调用
+        self.max_channels = max(1, max_channels)
+        # 可选的 TransferScheduler，为下载排优先级并限制带宽和每秒文件数
+        self.scheduler = scheduler
         self.transport = None
         self.sftp = None
+        self._idle_channels = queue.Queue()
+        self._opened_channels = []
+        self._channel_lock = threading.Lock()
 
     def connect(self):
         """连接到 SFTP 服务器"""
         try:
             self.transport = paramiko.Transport((self.hostname, self.port))
             self.transport.connect(username=self.username, password=self.password)
+            if self.keepalive_interval > 0:
+                self.transport.set_keepalive(self.keepalive_interval)
             self.sftp = paramiko.SFTPClient.from_transport(self.transport)
+            self._opened_channels = [self.sftp]
+            self._idle_channels = queue.Queue()
+            self._idle_channels.put(self.sftp)
             logger.info("SFTP connection established.")
         except Exception as e:
             logger.error(f"Failed to connect to SFTP: {e}")
@@ -29,25 +59,258 @@ class SFTPClient:
     def upload(self, local_file, remote_file):
         """上传文件"""
         try:
-            self.sftp.put(local_file, remote_file)
+            with self._channel() as sftp:
+                sftp.put(local_file, remote_file)
             logger.info(f"Uploaded {local_file} to {remote_file}.")
         except Exception as e:
             logger.error(f"Failed to upload file: {e}")
             raise
 
-    def download(self, remote_file, local_file):
+    @contextmanager
+    def _channel(self):
+        """借用一个空闲的 SFTP 通道，不足 max_channels 时在同一个 Transport 上新开一个；出错的通道关闭后丢弃"""
+        sftp = None
+        # 队列中的 None 表示有通道被丢弃，空出的名额由被唤醒的线程重新开通道
+        while sftp is None:
+            try:
+                sftp = self._idle_channels.get_nowait()
+            except queue.Empty:
+                with self._channel_lock:
+                    if len(self._opened_channels) < self.max_channels:
+                        sftp = paramiko.SFTPClient.from_transport(self.transport)
+                        self._opened_channels.append(sftp)
+                if sftp is None:
+                    sftp = self._idle_channels.get()
+        try:
+            yield sftp
+        except BaseException:
+            # 出错后通道可能停在半截的请求上，不能再交给其他线程
+            self._discard_channel(sftp)
+            raise
+        self._idle_channels.put(sftp)
+
+    def _discard_channel(self, sftp):
+        with self._channel_lock:
+            if sftp in self._opened_channels:
+                self._opened_channels.remove(sftp)
+        try:
+            sftp.close()
+        except Exception as e:
+            logger.warning(f"Failed to close SFTP channel: {e}")
+        self._idle_channels.put(None)
+
+    def _admit(self, priority):
+        """经调度器放行后返回限速回调；未配置调度器时直接返回 None"""
+        if self.scheduler is None:
+            return None
+        self.scheduler.admit(priority)
+        return self.scheduler.progress_callback()
+
+    def download(self, remote_file, local_file, priority=PRIORITY_NORMAL):
         """下载文件"""
         try:
-            self.sftp.get(remote_file, local_file)
+            callback = self._admit(priority)
+            with self._channel() as sftp:
+                sftp.get(remote_file, local_file, callback=callback)
             logger.info(f"Downloaded {remote_file} to {local_file}.")
         except Exception as e:
             logger.error(f"Failed to download file: {e}")
             raise
 
+    def listdir_attr(self, remote_dir):
+        """一次性列出远端目录，返回 {文件名: (大小, mtime)}，用于批量下载前规划，避免逐个文件试探"""
+        try:
+            with self._channel() as sftp:
+                entries = sftp.listdir_attr(remote_dir)
+            return {entry.filename: (entry.st_size, entry.st_mtime) for entry in entries}
+        except Exception as e:
+            logger.error(f"Failed to list directory {remote_dir}: {e}")
+            raise
+
+    def is_alive(self):
+        """探测连接是否可用：Transport 仍处于活动状态，且服务器能响应一次轻量请求"""
+        if self.transport is None or not self.transport.is_active():
+            return False
+        try:
+            with self._channel() as sftp:
+                sftp.normalize(".")
+            return True
+        except Exception as e:
+            logger.warning(f"SFTP liveness probe failed: {e}")
+            return False
+
+    def fetch(self, remote_file, priority=PRIORITY_NORMAL, resume_data=b"", remote_size=None):
+        """
+        把远端文件读入内存并返回 bytes，不落临时文件。
+        resume_data 为上次中断时已收到的前缀，此时只续传剩余字节；完成后按远端文件大小校验。
+        remote_size 为目录列表中已知的文件大小，传入时不再逐个文件 stat。
+        传输中途断开时抛出 PartialTransferError，其 data 为已收到的全部前缀，可用于下次续传。
+        """
+        try:
+            callback = self._admit(priority)
+            with self._channel() as sftp:
+                if remote_size is None:
+                    remote_size = sftp.stat(remote_file).st_size
+                if len(resume_data) > remote_size:
+                    # 远端文件已变小，之前的片段作废
+                    resume_data = b""
+                buffer = io.BytesIO()
+                buffer.write(resume_data)
+                try:
+                    with sftp.open(remote_file, "rb") as remote:
+                        remote.seek(len(resume_data))
+                        # prefetch 的参数是文件总大小（结束偏移），从当前位置预取到该处
+                        remote.prefetch(remote_size)
+                        while True:
+                            chunk = remote.read(32768)
+                            if not chunk:
+                                break
+                            buffer.write(chunk)
+                            if callback is not None:
+                                callback(buffer.tell() - len(resume_data), remote_size - len(resume_data))
+                except Exception as e:
+                    if buffer.tell() > len(resume_data):
+                        raise PartialTransferError(remote_file, buffer.getvalue(), e) from e
+                    raise
+            data = buffer.getvalue()
+            if len(data) != remote_size:
+                raise PartialTransferError(
+                    remote_file, data, IOError(f"size mismatch: got {len(data)} bytes, remote has {remote_size}")
+                )
+            if resume_data:
+                logger.info(f"Resumed {remote_file} from byte {len(resume_data)}.")
+            logger.info(f"Fetched {remote_file} into memory.")
+            return data
+        except Exception as e:
+            logger.error(f"Failed to fetch file: {e}")
+            raise
+
     def close(self):
         """关闭 SFTP 连接"""
-        if self.sftp:
-            self.sftp.close()
+        for sftp in self._opened_channels:
+            sftp.close()
+        self._opened_channels = []
         if self.transport:
             self.transport.close()
         logger.info("SFTP connection closed.")
+
+
+class SFTPSessionManager:
+    """长期复用的 SFTP 会话：复用已握手的连接，使用前探活，失效时透明重连，空闲超时后自动关闭"""
+
+    def __init__(self, client_factory, idle_timeout=300, connect_retries=3, retry_backoff=5):
+        """
+        :param client_factory: 无参可调用对象，返回一个尚未连接的 SFTPClient
+        :param idle_timeout: 会话空闲多少秒后关闭；0 表示每次用完立即关闭
+        :param connect_retries: 建立连接的最大尝试次数
+        :param retry_backoff: 首次重试前等待的秒数，之后按指数递增
+        """
+        self.client_factory = client_factory
+        self.idle_timeout = idle_timeout
+        self.connect_retries = connect_retries
+        self.retry_backoff = retry_backoff
+        self._client = None
+        self._in_use = 0
+        self._idle_timer = None
+        self._lock = threading.Lock()
+        self._connect_lock = threading.Lock()
+
+    @contextmanager
+    def session(self):
+        """借出一个已连接的 SFTPClient，用完后保持连接以供下次复用"""
+        # 探活和重连（含重试等待）只持有 _connect_lock，不阻塞其他线程归还会话、空闲关闭和 close
+        with self._connect_lock:
+            with self._lock:
+                self._cancel_idle_timer()
+                client = self._client
+                # 先计入使用中，探活和重连期间空闲计时器不会关闭会话
+                self._in_use += 1
+            try:
+                if client is not None and not client.is_alive():
+                    logger.info("Cached SFTP session is no longer alive, reconnecting.")
+                    with self._lock:
+                        if self._client is client:
+                            self._close_client()
+                    client = None
+                if client is None:
+                    client = self._connect()
+                    with self._lock:
+                        self._client = client
+            except BaseException:
+                self._release()
+                raise
+        try:
+            yield client
+        finally:
+            self._release()
+
+    def _release(self):
+        with self._lock:
+            self._in_use -= 1
+            if self._in_use == 0:
+                if self.idle_timeout > 0:
+                    self._schedule_idle_close()
+                else:
+                    self._close_client()
+
+    def _connect(self):
+        for attempt in range(1, self.connect_retries + 1):
+            client = self.client_factory()
+            try:
+                client.connect()
+                return client
+            except Exception as e:
+                # 失败的尝试可能已建立 Transport（例如认证失败），关闭后再重试
+                self._close_failed_client(client)
+                if attempt == self.connect_retries:
+                    logger.error(f"SFTP connection failed after {self.connect_retries} attempts, giving up.")
+                    raise
+                wait = self.retry_backoff * (2 ** (attempt - 1))
+                logger.warning(
+                    f"SFTP connection attempt {attempt}/{self.connect_retries} failed: {e}. Retrying in {wait}s..."
+                )
+                time.sleep(wait)
+
+    @staticmethod
+    def _close_failed_client(client):
+        try:
+            client.close()
+        except Exception as e:
+            logger.warning(f"Failed to close SFTP session after a failed connection attempt: {e}")
+
+    def _schedule_idle_close(self):
+        self._cancel_idle_timer()
+        timer = threading.Timer(self.idle_timeout, lambda: self._close_if_idle(timer))
+        timer.daemon = True
+        self._idle_timer = timer
+        timer.start()
+
+    def _cancel_idle_timer(self):
+        if self._idle_timer is not None:
+            self._idle_timer.cancel()
+            self._idle_timer = None
+
+    def _close_if_idle(self, timer):
+        with self._lock:
+            # A timer that fired while the session was being borrowed again must not close it.
+            if self._idle_timer is not timer or self._in_use:
+                return
+            self._idle_timer = None
+            if self._client is not None:
+                logger.info("Closing idle SFTP session.")
+                self._close_client()
+
+    def _close_client(self):
+        client, self._client = self._client, None
+        if client is None:
+            return
+        try:
+            client.close()
+        except Exception as e:
+            logger.warning(f"Failed to close SFTP session: {e}")
+
+    def close(self):
+        """关闭缓存的会话"""
+        with self._lock:
+            self._cancel_idle_timer()
+            self._close_client()
@@ -6,7 +6,9 @@ import logging
 import math
 import os
 import re
+import threading
 import time
+from collections import OrderedDict
 from dataclasses import dataclass
 from pathlib import PurePosixPath
 
@@ -133,13 +135,7 @@ class TorrentFile:
             else:
                 with open(torrent_file, "rb") as f:
                     data = f.read()
-                try:
-                    self.torrent_data = bencodepy.decode(data)
-                except Exception as e:
-                    trailing_error = _detect_trailing_bencode_data(str(torrent_file), data, e)
-                    if trailing_error:
-                        raise trailing_error
-                    raise
+                self.torrent_data = self._decode(data, str(torrent_file))
         except FileNotFoundError:
             raise FileNotFoundError(f"种子文件 {torrent_file} 不存在")
         except TorrentTrailingDataError:
@@ -152,6 +148,29 @@ class TorrentFile:
 
         self._extract_info()
 
+    @staticmethod
+    def _decode(data: bytes, file_path: str) -> dict:
+        try:
+            return bencodepy.decode(data)
+        except Exception as e:
+            trailing_error = _detect_trailing_bencode_data(file_path, data, e)
+            if trailing_error:
+                raise trailing_error
+            raise
+
+    @classmethod
+    def from_bytes(cls, data: bytes, file_path: str) -> "TorrentFile":
+        """从内存中的种子内容解析，不经过磁盘；file_path 记录该种子最终保存的位置"""
+        try:
+            torrent_data = cls._decode(data, file_path)
+        except TorrentTrailingDataError:
+            raise
+        except Exception as e:
+            raise Exception(f"无法读取种子: {e}")
+        torrent_file = cls(torrent_data)
+        torrent_file.file_path = file_path
+        return torrent_file
+
     def _extract_info(self):
         # 读取 info 字典
         info_dict = self.torrent_data.get(b"info", {})
@@ -291,19 +310,70 @@ class TorrentFile:
         self.torrent_data[b"info"][b"private"] = 1 if private else 0
         self._is_info_hash_calculated = False
 
+    def to_bytes(self) -> bytes:
+        return bencodepy.encode(self.torrent_data)
+
     def save(self, save_path):
         try:
             dir_path = os.path.dirname(save_path)
             if dir_path and not os.path.exists(dir_path):
                 os.makedirs(dir_path)
             with open(save_path, "wb") as f:
-                f.write(bencodepy.encode(self.torrent_data))
+                f.write(self.to_bytes())
                 return True
         except Exception as e:
             logging.error(f"保存种子文件失败: {e}")
             return False
 
 
+class TorrentFileCache:
+    """
+    已解析种子的缓存，按文件路径索引；文件的 mtime 和大小变化后缓存自动失效。
+    用于把刚下载并解析过的种子直接交给后续环节，避免同一份内容被重复解码。
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, tuple[int, int, TorrentFile]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, file_path: str, torrent_file: TorrentFile):
+        """缓存已写入 file_path 的种子解析结果"""
+        try:
+            file_stat = os.stat(file_path)
+        except OSError:
+            return
+        with self._lock:
+            self._entries[file_path] = (file_stat.st_mtime_ns, file_stat.st_size, torrent_file)
+            self._entries.move_to_end(file_path)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, file_path: str) -> TorrentFile | None:
+        with self._lock:
+            entry = self._entries.get(file_path)
+        if entry is None:
+            return None
+        try:
+            file_stat = os.stat(file_path)
+        except OSError:
+            file_stat = None
+        if file_stat is None or (file_stat.st_mtime_ns, file_stat.st_size) != entry[:2]:
+            with self._lock:
+                if self._entries.get(file_path) is entry:
+                    del self._entries[file_path]
+            return None
+        return entry[2]
+
+    def pop(self, file_path: str) -> TorrentFile | None:
+        """取出并移除缓存项，用于只需消费一次的场景"""
+        torrent_file = self.get(file_path)
+        if torrent_file is not None:
+            with self._lock:
+                self._entries.pop(file_path, None)
+        return torrent_file
+
+
 def export_as_torrent(
     torrent_data,
     bt_announce_list,
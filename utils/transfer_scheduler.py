@@ -0,0 +1,81 @@
+import heapq
+import itertools
+import threading
+import time
+
+# 优先级数值越小越先调度
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 10
+
+
+class TokenBucket:
+    """令牌桶限速器：每秒补充 rate 个令牌，最多积攒 capacity 个；rate <= 0 表示不限速"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, amount=1):
+        """取走 amount 个令牌，令牌不足时阻塞到补足为止。单次请求可超过 capacity，超出部分按速率等待"""
+        if self.rate <= 0 or amount <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # 先记账再等待，令牌可暂时为负，后来者会顺延等待，保证整体速率不超限
+            self._tokens -= amount
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+
+class TransferScheduler:
+    """
+    SFTP 传输调度器：按优先级放行文件，并用令牌桶限制每秒文件数和每秒字节数，
+    让批量拉取种子不至于挤占盒子与本地之间的 BT 传输带宽。
+    """
+
+    def __init__(self, bytes_per_second=0, files_per_second=0):
+        """
+        :param bytes_per_second: 每秒最多传输的字节数，0 表示不限
+        :param files_per_second: 每秒最多开始传输的文件数，0 表示不限
+        """
+        self.bytes = TokenBucket(bytes_per_second)
+        self.files = TokenBucket(files_per_second)
+        self._waiting = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+
+    def admit(self, priority=PRIORITY_NORMAL):
+        """等待轮到本次传输：同时等待的请求中优先级高的先放行，同优先级按到达顺序"""
+        ticket = (priority, next(self._sequence))
+        with self._condition:
+            heapq.heappush(self._waiting, ticket)
+            while self._waiting[0] != ticket:
+                self._condition.wait()
+        try:
+            self.files.acquire(1)
+        finally:
+            with self._condition:
+                heapq.heappop(self._waiting)
+                self._condition.notify_all()
+
+    def throttle(self, transferred_bytes):
+        """传输过程中按已传输字节数限速"""
+        self.bytes.acquire(transferred_bytes)
+
+    def progress_callback(self):
+        """返回可传给 paramiko get/getfo 的 callback，按增量字节限速；不限速时返回 None"""
+        if self.bytes.rate <= 0:
+            return None
+        last = [0]
+
+        def callback(transferred, _total):
+            self.throttle(transferred - last[0])
+            last[0] = transferred
+
+        return callback
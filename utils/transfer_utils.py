@@ -19,7 +19,7 @@ def load_transfer_file(file_path: str) -> Optional[Dict[str, "TorrentTransfer"]]
 
     if os.path.exists(file_path):
         try:
-            with open(file_path, "r") as f:
+            with open(file_path, "r", encoding="utf-8") as f:
                 transfer_status_list: List[dict] = json.load(f)
 
             # 将字典转换为 TorrentTransfer 的实例
@@ -38,4 +38,33 @@ def load_transfer_file(file_path: str) -> Optional[Dict[str, "TorrentTransfer"]]
     else:
         logger.warning(f"Transfer file does not exist: {file_path}")
 
+    _replay_transfer_journal(f"{file_path}.journal", transfer_status_dict)
     return transfer_status_dict
+
+
+def _replay_transfer_journal(journal_path: str, transfer_status_dict: Dict[str, "TorrentTransfer"]):
+    """
+    将 StateManager 追加写入的 journal 重放到快照数据之上。
+
+    :param journal_path: 每行一条 JSON 变更记录的 journal 文件路径
+    :param transfer_status_dict: 从快照加载得到的字典，会被原地更新
+    """
+    if not os.path.exists(journal_path):
+        return
+
+    try:
+        with open(journal_path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                    if entry.get("op") == "update":
+                        transfer = TorrentTransfer(**entry["transfer"])
+                        transfer_status_dict[transfer.hash] = transfer
+                    elif entry.get("op") == "delete":
+                        transfer_status_dict.pop(entry["hash"], None)
+                except Exception as e:
+                    logger.error(f"Skipping invalid journal entry in {journal_path}: {line.strip()} - {str(e)}")
+    except Exception as e:
+        logger.error(f"Unexpected error while reading journal: {journal_path} - {str(e)}")
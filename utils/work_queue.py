@@ -0,0 +1,66 @@
+import threading
+from typing import Dict, Iterable, Optional, Set
+
+
+class WorkQueue:
+    """Wake-up signal between pipeline stages that also carries the hashes the next stage should look at.
+
+    It is a drop-in replacement for the ``threading.Event`` triggers: ``set()`` without hashes asks for a full
+    pass, while ``put()`` queues specific transfers for a targeted pass.
+    """
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._lock = threading.Lock()
+        # Dict used as an insertion-ordered set, so targeted passes handle work in arrival order.
+        self._hashes: Dict[str, None] = {}
+        self._full_pass = False
+
+    def put(self, hashes: Iterable[str]):
+        """Queue transfers, by origin hash, for the next pass of the consuming stage."""
+        with self._lock:
+            for info_hash in hashes:
+                self._hashes[info_hash] = None
+        self._event.set()
+
+    def set(self):
+        """Request a full pass."""
+        with self._lock:
+            self._full_pass = True
+        self._event.set()
+
+    def is_set(self) -> bool:
+        return self._event.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._event.wait(timeout)
+
+    def clear(self):
+        """Reset the wake-up flag. Queued hashes stay until drained."""
+        self._event.clear()
+
+    def drain(self) -> Optional[Set[str]]:
+        """Take all queued hashes. Returns None when a full pass was requested."""
+        with self._lock:
+            self._event.clear()
+            hashes, self._hashes = self._hashes, {}
+            full_pass, self._full_pass = self._full_pass, False
+        return None if full_pass else set(hashes)
+
+
+def notify(trigger, hashes: Iterable[str]):
+    """Hand hashes to the next stage. A plain ``threading.Event`` trigger is just woken up for a full pass.
+
+    A list of triggers fans the hashes out, e.g. to the managers of every seedbox.
+    """
+    if trigger is None:
+        return
+    if isinstance(trigger, (list, tuple)):
+        hashes = list(hashes)
+        for single_trigger in trigger:
+            notify(single_trigger, hashes)
+        return
+    if isinstance(trigger, WorkQueue):
+        trigger.put(hashes)
+    else:
+        trigger.set()